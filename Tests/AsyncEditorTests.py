@@ -0,0 +1,69 @@
+from VideoEditor import async_editor
+from VideoEditor.video_editor import Point, TimeInterval
+from VideoEditor.utils import get_video_parameters, get_video_duration
+from VideoEditor.encoding_profile import get_profile
+import unittest
+import asyncio
+import shutil
+import tempfile
+import os
+
+
+class TestAsyncEditor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.video_path = os.path.join(project_directory, 'resources', 'shrek_dancing.mp4')
+        self.path_to_save = os.path.join(self.tmpdir, 'result.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    async def test_crop(self):
+        await async_editor.crop_and_save(self.video_path, self.path_to_save,
+                                         Point((0, 0)), Point((320, 240)))
+        self.assertEqual((320, 240), get_video_parameters(self.path_to_save)[:2])
+
+    async def test_progress(self):
+        render = async_editor.trim_and_save_video(self.video_path, TimeInterval(2, 6),
+                                                  self.path_to_save, profile=get_profile('draft'))
+        progress = [progress async for progress in render]
+        self.assertTrue(progress[-1].is_end)
+        self.assertEqual(1.0, progress[-1].fraction)
+        self.assertAlmostEqual(4, get_video_duration(self.path_to_save), delta=0.2)
+
+    async def test_concurrent_renders(self):
+        paths = [os.path.join(self.tmpdir, 'speed{}.mp4'.format(index)) for index in range(3)]
+        draft = get_profile('draft')
+        await asyncio.gather(*[
+            async_editor.set_video_speed_and_save(self.video_path, 2, path, profile=draft)
+            for path in paths
+        ])
+        for path in paths:
+            self.assertAlmostEqual(get_video_duration(self.video_path) / 2,
+                                   get_video_duration(path), delta=0.3)
+
+    async def test_cancel_removes_partial_result(self):
+        task = asyncio.ensure_future(async_editor.set_video_speed_and_save(
+            self.video_path, 0.5, self.path_to_save))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertFalse(os.path.exists(self.path_to_save))
+
+    async def test_render_runs_once(self):
+        render = async_editor.crop_and_save(self.video_path, self.path_to_save,
+                                            Point((0, 0)), Point((32, 32)))
+        await render
+        with self.assertRaises(RuntimeError):
+            await render
+
+    async def test_incorrect_crop_boundary(self):
+        with self.assertRaises(ValueError):
+            await async_editor.crop_and_save(self.video_path, self.path_to_save,
+                                             Point((0, 0)), Point((10000, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+from VideoEditor.batch import load_jobs, prepare_arguments, run_batch, OPERATIONS
+from VideoEditor.video_editor import TimeInterval, Point
+from VideoEditor.utils import Usage
+from VideoEditor.encoding_profile import PROFILES
+from video_editor_parser import Parser
+from unittest import mock
+import multiprocessing
+import contextlib
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import json
+import io
+import os
+
+
+def crash_worker(**arguments):
+    """Operation killing the worker process"""
+    os._exit(1)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .output(ffmpeg.input('testsrc=duration=2:size=160x120:rate=10', f='lavfi'),
+                 ffmpeg.input('sine=duration=2', f='lavfi'),
+                 self.video_path)
+         .run(capture_stdout=True, capture_stderr=True))
+        self.jobs = [
+            {'operation': 'speed', 'video_path': self.video_path, 'speed': 2,
+             'path_to_save': os.path.join(self.tmpdir, 'fast.mp4')},
+            {'operation': 'speed', 'video_path': os.path.join(self.tmpdir, 'missing.mp4'), 'speed': 2,
+             'path_to_save': os.path.join(self.tmpdir, 'missing_fast.mp4')}
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_jobs(self, name: str, text: str) -> str:
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def test_json_and_json_lines_are_loaded(self):
+        list_path = self.write_jobs('jobs.json', json.dumps(self.jobs, indent=2))
+        lines_path = self.write_jobs('jobs.jsonl', '\n'.join(map(json.dumps, self.jobs)) + '\n\n')
+        self.assertEqual(self.jobs, load_jobs(list_path))
+        self.assertEqual(self.jobs, load_jobs(lines_path))
+
+    def test_unknown_operation(self):
+        path = self.write_jobs('jobs.jsonl', json.dumps({'operation': 'blur', 'video_path': self.video_path}))
+        with self.assertRaises(ValueError):
+            load_jobs(path)
+
+    def test_arguments_are_converted(self):
+        func, arguments = prepare_arguments({
+            'operation': 'trim', 'video_path': self.video_path,
+            'time_interval': ['00:00:01', 90], 'profile': 'draft'
+        })
+        self.assertIs(OPERATIONS['trim'], func)
+        self.assertIsInstance(arguments['time_interval'], TimeInterval)
+        self.assertEqual((1, 90), (arguments['time_interval'].begin, arguments['time_interval'].end))
+        self.assertEqual(PROFILES['draft'], arguments['profile'])
+        self.assertEqual(Usage.SILENT, arguments['mode'])
+
+        _, arguments = prepare_arguments({
+            'operation': 'insert', 'insert_time_in_seconds': '00:01:05'
+        })
+        self.assertEqual(65, arguments['insert_time_in_seconds'])
+
+        _, arguments = prepare_arguments({
+            'operation': 'crop', 'point1': [10, 20], 'point2': [30, 40]
+        })
+        self.assertIsInstance(arguments['point1'], Point)
+        self.assertEqual((10, 20, 30, 40), (arguments['point1'].x, arguments['point1'].y,
+                                            arguments['point2'].x, arguments['point2'].y))
+
+    def test_failed_job_does_not_stop_batch(self):
+        results = run_batch(self.jobs, workers=2)
+        self.assertEqual([0, 1], [result.index for result in results])
+        self.assertTrue(results[0].is_success)
+        self.assertIsNone(results[0].error)
+        self.assertTrue(os.path.exists(self.jobs[0]['path_to_save']))
+
+        self.assertFalse(results[1].is_success)
+        self.assertIn('missing.mp4', results[1].error)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                         'the workers get the patched operations by fork')
+    def test_crashed_worker(self):
+        jobs = [self.jobs[0], {'operation': 'crash'},
+                dict(self.jobs[0], speed=4, path_to_save=os.path.join(self.tmpdir, 'faster.mp4'))]
+        with mock.patch.dict(OPERATIONS, crash=crash_worker):
+            results = run_batch(jobs, workers=1)
+        self.assertEqual([0, 1, 2], [result.index for result in results])
+        self.assertEqual([True, False, False], [result.is_success for result in results])
+        self.assertIn('crashed', results[1].error)
+
+    def test_cli_exit_code_of_failed_batch(self):
+        path = self.write_jobs('jobs.json', json.dumps(self.jobs))
+        parser = Parser()
+        args = parser.parse_args(['batch', '-j', path, '-w', '1'])
+        with contextlib.redirect_stdout(io.StringIO()) as stdout, \
+                self.assertRaises(SystemExit) as context:
+            args.func(args)
+        self.assertEqual(1, context.exception.code)
+        self.assertIn('1 succeeded, 1 failed', stdout.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+from benchmarks.suite import \
+    (BenchmarkResult, generate_media, run_suite, compare, save_results, load_results, main)
+import contextlib
+import unittest
+import tempfile
+import shutil
+import io
+import os
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_media_is_deterministic(self):
+        paths = []
+        for name in ('first', 'second'):
+            directory = os.path.join(self.tmpdir, name)
+            os.mkdir(directory)
+            paths.append(generate_media(directory, 64, 48, 1).main_path)
+        with open(paths[0], 'rb') as first, open(paths[1], 'rb') as second:
+            self.assertEqual(first.read(), second.read())
+
+    def test_compare_with_tolerance(self):
+        baseline = [BenchmarkResult('trim', '320x240_4s', 1.0, 0.5, 1000),
+                    BenchmarkResult('crop', '320x240_4s', 1.0, 0.5, 1000)]
+        results = [BenchmarkResult('trim', '320x240_4s', 1.2, 0.5, 1000),
+                   BenchmarkResult('crop', '320x240_4s', 1.3, 0.5, 1500),
+                   BenchmarkResult('speed', '320x240_4s', 9.0, 9.0, 9000)]
+        regressions = compare(results, baseline, tolerance=0.25)
+        self.assertEqual([('crop', 'wall_time'), ('crop', 'output_size')],
+                         [(regression.operation, regression.metric) for regression in regressions])
+        self.assertAlmostEqual(1.5, regressions[1].ratio)
+
+    def test_run_and_reload(self):
+        results = run_suite([(64, 48)], [2], ['crop', 'thumbnail'], repeats=1)
+        self.assertEqual([('crop', '64x48_2s'), ('thumbnail', '64x48_2s')],
+                         [(result.operation, result.case) for result in results])
+        self.assertTrue(all(result.output_size > 0 for result in results))
+        path = os.path.join(self.tmpdir, 'results.json')
+        save_results(results, path)
+        self.assertEqual(results, load_results(path))
+        self.assertEqual([], compare(results, load_results(path)))
+
+    def test_missing_baseline_is_error(self):
+        baseline_path = os.path.join(self.tmpdir, 'baseline.json')
+        arguments = ['--quick', '--operations', 'thumbnail', '--repeats', '1', '--baseline', baseline_path]
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(2, main(arguments))
+            self.assertEqual(0, main(arguments + ['--no-baseline']))
+            self.assertEqual(0, main(arguments + ['--save-baseline']))
+        self.assertEqual(['thumbnail'], [result.operation for result in load_results(baseline_path)])
+
+
+if __name__ == '__main__':
+    unittest.main()
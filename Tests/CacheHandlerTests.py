@@ -0,0 +1,160 @@
+from gui.cache_handler import CacheHandler
+from gui.utils import OperationType
+from VideoEditor.render_cache import RenderCache
+from VideoEditor.proxy import make_job, CURRENT_VIDEO
+from VideoEditor.video_editor import set_video_speed_and_save
+from VideoEditor.progress_bar import gui_progress_view
+from VideoEditor.render_control import CancellationToken, RenderCancelledError, cancellation_scope
+from VideoEditor.utils import get_video_duration
+from contextlib import contextmanager
+from pathlib import Path
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import json
+import os
+
+VIDEO_DURATION = 4
+
+
+@contextmanager
+def hidden_progress_view(duration: float):
+    """The GUI renders of the tests show no progress bar"""
+    yield lambda event: None
+
+
+class TestCacheHandler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .output(ffmpeg.input('testsrc=duration={}:size=160x120:rate=10'.format(VIDEO_DURATION), f='lavfi'),
+                 ffmpeg.input('sine=duration={}'.format(VIDEO_DURATION), f='lavfi'),
+                 self.video_path)
+         .run(capture_stdout=True, capture_stderr=True))
+
+        self.renders = RenderCache(os.path.join(self.tmpdir, 'renders'))
+        # Every state but the current one is evicted
+        self.handler = CacheHandler(max_bytes=1, renders=self.renders)
+        self.handler.BASE_PATH_TO_SAVE = Path(self.tmpdir) / 'cache'
+        os.makedirs(self.handler.BASE_PATH_TO_SAVE)
+
+        progress_view = gui_progress_view(hidden_progress_view)
+        progress_view.__enter__()
+        self.addCleanup(progress_view.__exit__, None, None, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def open_video(self):
+        scale = self.handler.open_video(self.video_path)
+        self.handler.record_open(self.video_path, scale)
+        self.handler.update_current_index(OperationType.INCREASE)
+
+    def speed_up(self, speed: float):
+        handler = self.handler
+        job = make_job(set_video_speed_and_save, CURRENT_VIDEO, speed, None)
+        handler.prepare_cache_folder(handler.current_index + 1)
+        handler.render_next_state(job, lambda: set_video_speed_and_save(
+            handler.get_current_path_to_look(), speed,
+            handler.get_current_path_to_save(), is_overwrite=True
+        ))
+        handler.record_operation(job)
+        handler.update_current_index(OperationType.INCREASE)
+
+    def get_cached_indexes(self) -> list[int]:
+        return sorted(index for index, _ in self.handler._get_cached_states())
+
+    def assertCurrentDuration(self, duration: float):
+        self.assertAlmostEqual(duration, get_video_duration(self.handler.get_current_path_to_look()), delta=0.2)
+
+    def test_current_state_is_not_evicted(self):
+        self.open_video()
+        self.speed_up(2)
+        self.speed_up(2)
+        self.assertEqual([3], self.get_cached_indexes())
+        self.assertEqual([], self.handler.evict())
+        self.assertEqual([3], self.get_cached_indexes())
+        self.assertCurrentDuration(VIDEO_DURATION / 4)
+
+    def test_evicted_states_are_rendered_again(self):
+        self.open_video()
+        self.speed_up(2)
+        self.speed_up(2)
+        # The results are rendered again rather than taken from the render cache
+        self.renders.clear()
+
+        self.handler.undo()
+        self.assertEqual(2, self.handler.current_index)
+        self.assertEqual([2], self.get_cached_indexes())
+        self.assertCurrentDuration(VIDEO_DURATION / 2)
+
+        self.renders.clear()
+        self.handler.redo()
+        self.assertEqual(3, self.handler.current_index)
+        self.assertEqual([3], self.get_cached_indexes())
+        self.assertCurrentDuration(VIDEO_DURATION / 4)
+
+    def test_restoring_is_separate_from_going_to_state(self):
+        self.open_video()
+        self.speed_up(2)
+        self.speed_up(2)
+        self.renders.clear()
+        index = self.handler.get_undo_index()
+
+        # The restore runs in the render queue, it can be cancelled
+        token = CancellationToken()
+        token.cancel()
+        with cancellation_scope(token), self.assertRaises(RenderCancelledError):
+            self.handler.restore_state(index)
+        self.assertEqual(3, self.handler.current_index)
+
+        self.handler.restore_state(index)
+        self.assertEqual(3, self.handler.current_index)
+        self.handler.set_current_state(index)
+        self.assertEqual([2], self.get_cached_indexes())
+        self.assertCurrentDuration(VIDEO_DURATION / 2)
+        self.assertEqual(3, self.handler.get_redo_index())
+
+    def test_saved_video_is_not_linked_to_cache(self):
+        self.open_video()
+        self.speed_up(2)
+        state_path = self.handler.get_current_path_to_look()
+        cached_path = self.renders.get_key_path(self.handler.get_state_key(self.handler.current_index))
+        with open(state_path, 'rb') as state:
+            content = state.read()
+
+        output_path = os.path.join(self.tmpdir, 'saved.mp4')
+        self.handler.save_from_cache(output_path)
+        # Overwritten in place, like ffmpeg -y does
+        with open(output_path, 'r+b') as output:
+            output.write(b'\0' * 1024)
+        for path in (state_path, cached_path):
+            with open(path, 'rb') as video:
+                self.assertEqual(content, video.read())
+
+    def test_history_of_older_versions_is_restored(self):
+        operations = [
+            {'operation': 'open', 'video_path': self.video_path, 'scale': [1.0, 1.0]},
+            make_job(set_video_speed_and_save, CURRENT_VIDEO, 2, None)
+        ]
+        with open(self.handler._get_history_path(), 'w', encoding='utf-8') as file:
+            json.dump(operations, file)
+        for index in (1, 2):
+            shutil.copyfile(self.video_path, self.handler._get_state_path(index))
+
+        self.assertFalse(self.handler.is_empty())
+        self.handler.restore_history()
+        self.assertEqual(2, self.handler.current_index)
+        self.assertEqual(operations, self.handler.operations)
+
+    def test_later_states_are_removed_with_gaps(self):
+        for index in (1, 3, 5):
+            Path(self.handler._get_state_path(index)).touch()
+        self.handler.prepare_cache_folder(2)
+        self.assertEqual([1], self.get_cached_indexes())
+
+
+if __name__ == '__main__':
+    unittest.main()
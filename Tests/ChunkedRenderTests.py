@@ -0,0 +1,101 @@
+from VideoEditor.chunked_render import plan_chunks, fix_start_pts, render_in_chunks
+from VideoEditor.video_editor import Usage, open_videos, save_video
+from VideoEditor.render_control import \
+    CancellationToken, RenderCancelledError, RenderTimeoutError, cancellation_scope
+from VideoEditor.utils import get_video_duration
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import os
+
+# Long enough for three chunks
+CHUNKED_VIDEO_DURATION = 40
+
+
+class TestPlanChunks(unittest.TestCase):
+    def setUp(self):
+        self.keyframes = [0, 4, 8, 12, 16, 20, 24, 28, 32, 36]
+
+    def test_chunks_start_at_nearest_keyframes(self):
+        self.assertEqual(
+            [(0, 12), (12, 28), (28, 40)],
+            plan_chunks(self.keyframes, 40, 3)
+        )
+
+    def test_short_video_is_one_chunk(self):
+        self.assertEqual([(0, 15)], plan_chunks(self.keyframes, 15, 4))
+
+    def test_close_keyframes_are_skipped(self):
+        self.assertEqual([(0, 30), (30, 60)], plan_chunks([0, 1, 30], 60, 6))
+
+
+class TestFixStartPts(unittest.TestCase):
+    def test_start_of_trim(self):
+        self.assertEqual(
+            '[0:v]trim=end=30:start=2[s0];[s0]setpts=PTS-(2)/TB[s1]',
+            fix_start_pts('[0:v]trim=end=30:start=2[s0];[s0]setpts=PTS-STARTPTS[s1]')
+        )
+
+    def test_source_starts_at_zero(self):
+        self.assertEqual(
+            '[0:a]asetpts=PTS-(0)/TB[s0]',
+            fix_start_pts('[0:a]asetpts=PTS-STARTPTS[s0]')
+        )
+
+    def test_graph_without_start_is_not_changed(self):
+        graph = '[0:v]setpts=0.5*PTS[s0];[s0]crop=640:360:0:0[s1]'
+        self.assertEqual(graph, fix_start_pts(graph))
+
+    def test_unknown_start(self):
+        self.assertIsNone(
+            fix_start_pts('[0:v]select=gt(scene\\,0.4)[s0];[s0]setpts=PTS-STARTPTS[s1]')
+        )
+
+
+
+class TestRenderInChunks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .output(ffmpeg.input('testsrc=duration={}:size=160x120:rate=10'
+                              .format(CHUNKED_VIDEO_DURATION), f='lavfi'),
+                 ffmpeg.input('sine=duration={}'.format(CHUNKED_VIDEO_DURATION), f='lavfi'),
+                 self.video_path, g=50)
+         .run(capture_stdout=True, capture_stderr=True))
+        self.output_path = os.path.join(self.tmpdir, 'result.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_output(self) -> ffmpeg.nodes.OutputStream:
+        video = open_videos(self.video_path)
+        return ffmpeg.output(video.video.filter('hflip'), video.audio, self.output_path)
+
+    def test_progress_of_chunks(self):
+        events = []
+        self.assertTrue(render_in_chunks(self.get_output(), self.output_path, 3, sinks=[events.append]))
+        self.assertAlmostEqual(CHUNKED_VIDEO_DURATION, get_video_duration(self.output_path), delta=0.2)
+
+        out_times = [event.out_time for event in events if event.out_time is not None]
+        self.assertEqual(sorted(out_times), out_times)
+        self.assertTrue(events[-1].is_end)
+        self.assertAlmostEqual(CHUNKED_VIDEO_DURATION, events[-1].out_time, delta=0.2)
+
+    def test_control_of_chunks(self):
+        token = CancellationToken()
+        token.cancel()
+        with cancellation_scope(token), self.assertRaises(RenderCancelledError):
+            render_in_chunks(self.get_output(), self.output_path, 3)
+        self.assertFalse(os.path.exists(self.output_path))
+
+        video = open_videos(self.video_path)
+        with self.assertRaises(RenderTimeoutError):
+            save_video(video.video.filter('hflip'), self.output_path, chunks=3,
+                       mode=Usage.SILENT, timeout=0.01)
+        self.assertFalse(os.path.exists(self.output_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+from VideoEditor.encoding_profile import EncodingProfile, PROFILES, get_profile
+from VideoEditor.video_editor import \
+    Usage, TimeInterval, trim_and_save_video, cut_part_and_save_video, merge_videos_and_save
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import os
+
+
+def get_x264_settings(video_path: str) -> bytes:
+    """Options written by x264 into the stream"""
+    with open(video_path, 'rb') as video:
+        data = video.read()
+    start = data.index(b'x264 - core')
+    return data[start:data.index(b'\0', start)]
+
+
+class TestEncodingProfile(unittest.TestCase):
+    def test_output_kwargs_skip_unset_options(self):
+        profile = EncodingProfile(preset='fast', bitrate='4M', gop_size=50)
+        self.assertEqual(
+            {'vcodec': 'libx264', 'preset': 'fast', 'b:v': '4M', 'g': 50},
+            profile.get_output_kwargs()
+        )
+
+    def test_crf_and_bitrate_together(self):
+        self.assertRaises(ValueError, EncodingProfile, crf=23, bitrate='4M')
+
+    def test_named_profiles(self):
+        self.assertEqual({'draft', 'balanced', 'archive'}, set(PROFILES))
+        self.assertIs(PROFILES['draft'], get_profile('draft'))
+        self.assertRaises(ValueError, get_profile, 'fastest')
+
+    def test_profile_in_ffmpeg_command(self):
+        args = (ffmpeg
+                .input('in.mp4')
+                .output('out.mp4', **get_profile('draft').get_output_kwargs())
+                .compile())
+        self.assertEqual('ultrafast', args[args.index('-preset') + 1])
+        self.assertEqual('28', args[args.index('-crf') + 1])
+        self.assertEqual('out.mp4', args[-1])
+
+
+
+class TestProfileOfOperations(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Encoded with the defaults of x264 (medium, crf 23), a keyframe every second
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .output(ffmpeg.input('testsrc=duration=4:size=160x120:rate=10', f='lavfi'),
+                 ffmpeg.input('sine=duration=4', f='lavfi'),
+                 self.video_path, vcodec='libx264', g=10)
+         .run(capture_stdout=True, capture_stderr=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertDraftEncoded(self, video_path: str):
+        settings = get_x264_settings(video_path)
+        self.assertIn(b'crf=28.0', settings)
+        # ultrafast turns CABAC off
+        self.assertIn(b'cabac=0', settings)
+
+    def test_trim_and_cut_with_profile(self):
+        # Without the profile the smart cut would copy the GOPs of the source
+        for func in (trim_and_save_video, cut_part_and_save_video):
+            output_path = os.path.join(self.tmpdir, func.__name__ + '.mp4')
+            func(self.video_path, TimeInterval(1.5, 3), output_path,
+                 mode=Usage.SILENT, profile=get_profile('draft'))
+            self.assertDraftEncoded(output_path)
+
+    def test_compatible_merge_with_profile(self):
+        output_path = os.path.join(self.tmpdir, 'merged.mp4')
+        merge_videos_and_save([self.video_path, self.video_path], output_path,
+                              mode=Usage.SILENT, profile=get_profile('draft'))
+        self.assertDraftEncoded(output_path)
+
+if __name__ == "__main__":
+    unittest.main()
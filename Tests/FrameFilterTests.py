@@ -0,0 +1,91 @@
+from VideoEditor.frame_filter import FrameFilter, run_frame_filter, load_function
+from VideoEditor.frames import FrameReader
+from VideoEditor.video_editor import EditPipeline, TimeInterval, save_video, open_videos
+from VideoEditor.utils import get_information_about_stream, get_video_duration
+import numpy as np
+import unittest
+import tempfile
+import random
+import shutil
+import ffmpeg
+import time
+import os
+
+
+def shuffle_finish(frames: np.ndarray) -> np.ndarray:
+    """Batches finish in random order"""
+    time.sleep(random.random() / 20)
+    return frames // 4
+
+
+def invert_in_place(frames: np.ndarray) -> None:
+    np.subtract(255, frames, out=frames)
+
+
+class FrameCollector:
+    def __init__(self):
+        self.frames = []
+        self.frame_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def write(self, frame: np.ndarray) -> None:
+        self.frames.append(frame.copy())
+        self.frame_count += 1
+
+
+class TestFrameFilter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Luma of the frame is 16 + 4 * its number
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .output(ffmpeg.input('nullsrc=size=64x48:rate=10:duration=4', f='lavfi')
+                 .filter('geq', lum='16+N*4', cb=128, cr=128),
+                 ffmpeg.input('sine=duration=4', f='lavfi'),
+                 self.video_path, vcodec='libx264', pix_fmt='yuv420p', crf=0)
+         .run(capture_stdout=True, capture_stderr=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_order_is_kept(self):
+        collector = FrameCollector()
+        frame_filter = FrameFilter(shuffle_finish, workers=3, batch_frames=2, pix_fmt='gray')
+        count = run_frame_filter(FrameReader(self.video_path, pix_fmt='gray'),
+                                 lambda reader: collector, frame_filter)
+        self.assertEqual(40, count)
+        with FrameReader(self.video_path, pix_fmt='gray') as reader:
+            expected = [frame // 4 for frame in reader]
+        for frame, expected_frame in zip(collector.frames, expected):
+            np.testing.assert_array_equal(expected_frame, frame)
+
+    def test_save_video_with_filter(self):
+        output_path = os.path.join(self.tmpdir, 'inverted.mp4')
+        save_video(open_videos(self.video_path), output_path,
+                   frame_filter=FrameFilter(invert_in_place, workers=2))
+        with FrameReader(output_path, pix_fmt='gray') as reader:
+            frames = [frame.mean() for frame in reader]
+        self.assertEqual(40, len(frames))
+        self.assertGreater(frames[0], frames[-1] + 100)
+        self.assertEqual('aac', get_information_about_stream(output_path, 'audio')['codec_name'])
+
+    def test_pipeline_with_filter(self):
+        output_path = os.path.join(self.tmpdir, 'trimmed.mp4')
+        (EditPipeline(self.video_path)
+         .trim(TimeInterval(1, 3))
+         .save(output_path, frame_filter=FrameFilter(invert_in_place, workers=2)))
+        self.assertAlmostEqual(2, get_video_duration(output_path), delta=0.1)
+
+    def test_load_function(self):
+        self.assertIs(np.invert, load_function('numpy:invert'))
+        self.assertRaises(ValueError, load_function, 'numpy.invert')
+        self.assertRaises(ValueError, FrameFilter, np.invert, batch_frames=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
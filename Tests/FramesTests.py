@@ -0,0 +1,73 @@
+from VideoEditor.frames import FrameReader, FrameWriter, get_frame_size
+from VideoEditor.video_editor import TimeInterval
+from VideoEditor.utils import get_information_about_stream, get_video_duration
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import os
+
+
+class TestFrames(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Luma of the frame is 16 + 4 * its number
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .output(ffmpeg.input('nullsrc=size=64x48:rate=10:duration=5', f='lavfi')
+                 .filter('geq', lum='16+N*4', cb=128, cr=128),
+                 ffmpeg.input('sine=duration=5', f='lavfi'),
+                 self.video_path, vcodec='libx264', pix_fmt='yuv420p', crf=0)
+         .run(capture_stdout=True, capture_stderr=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_interval(self):
+        with FrameReader(self.video_path, TimeInterval(1, 3), pix_fmt='gray') as reader:
+            frames = [frame.copy() for frame in reader]
+        self.assertEqual(20, len(frames))
+        self.assertEqual((48, 64), frames[0].shape)
+        # gray is full range, the luma of the video is limited range
+        numbers = [round((frame.mean() * 219 / 255) / 4) for frame in frames]
+        self.assertEqual(list(range(10, 30)), numbers)
+
+    def test_ring_of_buffers(self):
+        with FrameReader(self.video_path, width=32, ring_size=2) as reader:
+            first, second, third = reader.read(), reader.read(), reader.read()
+            self.assertEqual((24, 32, 3), first.shape)
+            self.assertFalse(np.shares_memory(first, second))
+            self.assertTrue(np.shares_memory(first, third))
+
+    def test_scaled_size(self):
+        self.assertEqual((32, 24), get_frame_size(self.video_path, width=32))
+        self.assertEqual((64, 48), get_frame_size(self.video_path))
+        with FrameReader(self.video_path, width=16, height=16, fps=2) as reader:
+            self.assertEqual(10, sum(1 for _ in reader))
+
+    def test_read_and_write(self):
+        output_path = os.path.join(self.tmpdir, 'inverted.mp4')
+        interval = TimeInterval(1, 4)
+        with FrameReader(self.video_path, interval) as reader, \
+                FrameWriter(output_path, reader.width, reader.height, reader.fps,
+                            audio_path=self.video_path, time_interval=interval) as writer:
+            for frame in reader:
+                writer.write(255 - frame)
+        self.assertEqual(30, writer.frame_count)
+        self.assertAlmostEqual(3, get_video_duration(output_path), delta=0.1)
+        self.assertEqual('aac', get_information_about_stream(output_path, 'audio')['codec_name'])
+
+    def test_failed_write_removes_result(self):
+        output_path = os.path.join(self.tmpdir, 'broken.mp4')
+        writer = FrameWriter(output_path, 64, 48, 10)
+        self.assertRaises(ValueError, writer.write, np.zeros((48, 64), dtype=np.uint8))
+        with self.assertRaises(RuntimeError):
+            with writer:
+                writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+                raise RuntimeError
+        self.assertFalse(os.path.exists(output_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+from VideoEditor.merge_plan import \
+    (StreamParameters, TRANSITION_DURATION, get_target_parameters, plan_input_filters,
+     plan_merge, parse_ratio)
+from VideoEditor.video_editor import merge_videos, open_videos, merge_videos_and_save
+from VideoEditor.utils import Usage, get_video_duration
+from fractions import Fraction
+import contextlib
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import re
+import io
+import os
+
+HD = StreamParameters(1280, 720, Fraction(25), Fraction(1), 'yuv420p')
+
+
+class TestMergePlan(unittest.TestCase):
+    def test_identical_video_has_no_filters(self):
+        target = get_target_parameters(HD)
+        self.assertEqual([], plan_input_filters(HD, target))
+        self.assertEqual(target, get_target_parameters(HD, 1280, 720, 25, '1:1'))
+
+    def test_only_changed_parameters_are_filtered(self):
+        target = get_target_parameters(HD)
+        other_rate = HD._replace(fps=parse_ratio('30000/1001'))
+        self.assertEqual([('fps', {'fps': '25/1'})], plan_input_filters(other_rate, target))
+        other_format = HD._replace(pix_fmt='yuv444p')
+        self.assertEqual([('format', {'pix_fmts': 'yuv420p'})],
+                         plan_input_filters(other_format, target))
+        other_size = HD._replace(width=640, height=360, pix_fmt='yuv444p')
+        self.assertEqual(['scale', 'format', 'setsar'],
+                         [name for name, _ in plan_input_filters(other_size, target)])
+
+    def test_unknown_and_unsafe_videos(self):
+        self.assertEqual(['scale', 'format', 'setsar', 'fps'],
+                         [name for name, _ in plan_input_filters(None, get_target_parameters(HD))])
+        self.assertEqual([[], []], plan_merge([None, None], None))
+
+    def test_explicit_transitions(self):
+        plan = plan_merge([HD, HD, HD], get_target_parameters(HD), [4, 6, 8], TRANSITION_DURATION)
+        self.assertEqual([[('fade', {'t': 'out', 'st': 3.75, 'd': 0.25})],
+                          [('fade', {'t': 'in', 'st': 0.25, 'd': 0.25}),
+                           ('fade', {'t': 'out', 'st': 5.75, 'd': 0.25})],
+                          [('fade', {'t': 'in', 'st': 0.25, 'd': 0.25})]], plan)
+        self.assertEqual([[], [], []], plan_merge([HD, HD, HD], get_target_parameters(HD), [4, 6, 8]))
+
+    def test_merge_graph_of_same_videos(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for name in ('first.mp4', 'second.mp4'):
+                paths.append(os.path.join(tmpdir, name))
+                (ffmpeg
+                 .output(ffmpeg.input('testsrc=duration=1:size=64x48:rate=10', f='lavfi'),
+                         ffmpeg.input('sine=duration=1', f='lavfi'), paths[-1])
+                 .run(capture_stdout=True, capture_stderr=True))
+            merged = merge_videos(open_videos(paths))
+            graph = ' '.join(ffmpeg.output(merged[0], merged[1], 'out.mp4').compile())
+            self.assertIn('concat', graph)
+            for name in ('scale', 'setsar', 'fps', 'format', 'fade'):
+                self.assertNotIn(name + '=', graph)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_ntsc_rate_is_kept(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for name, rate in (('first.mp4', '30000/1001'), ('second.mp4', '30000/1001'),
+                               ('third.mp4', '25')):
+                paths.append(os.path.join(tmpdir, name))
+                (ffmpeg
+                 .output(ffmpeg.input('testsrc=duration=1:size=64x48:rate={}'.format(rate), f='lavfi'),
+                         ffmpeg.input('sine=duration=1', f='lavfi'), paths[-1])
+                 .run(capture_stdout=True, capture_stderr=True))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                merge_videos_and_save(paths, os.path.join(tmpdir, 'merged.mp4'), is_dry_run=True)
+            fps_filters = re.findall(r'\[(\d+):v\][^;]*?fps=fps=([\d/]+)', output.getvalue())
+            # Only the 25 fps video is converted, to the exact rate of the first one
+            self.assertEqual([('2', '30000/1001')], fps_filters)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_same_videos_are_stream_copied(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for name in ('first.mp4', 'second.mp4'):
+                paths.append(os.path.join(tmpdir, name))
+                (ffmpeg
+                 .output(ffmpeg.input('testsrc=duration=1:size=64x48:rate=10', f='lavfi'),
+                         ffmpeg.input('sine=duration=1', f='lavfi'), paths[-1])
+                 .run(capture_stdout=True, capture_stderr=True))
+            merged_path = os.path.join(tmpdir, 'merged.mp4')
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                merge_videos_and_save(paths, merged_path, is_dry_run=True)
+            self.assertIn('Merge path: stream copy', output.getvalue())
+            self.assertIn('-c copy', output.getvalue())
+            self.assertFalse(os.path.exists(merged_path))
+
+            # The printed command reads the list after the dry run
+            list_path = re.search(r'-i (\S+)', output.getvalue()).group(1)
+            with open(list_path, encoding='utf-8') as concat_list:
+                self.assertEqual(["file '{}'".format(path) for path in paths],
+                                 concat_list.read().splitlines())
+
+            merge_videos_and_save(paths, merged_path, mode=Usage.SILENT)
+            self.assertAlmostEqual(2, get_video_duration(merged_path), delta=0.2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
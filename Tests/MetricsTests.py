@@ -0,0 +1,85 @@
+from VideoEditor.metrics import \
+    (MetricsRecorder, MetricsSample, OperationMetrics, JsonLinesWriter,
+     PrometheusWriter, summarize)
+from VideoEditor.progress_bar import ProgressEvent, progress_events
+from VideoEditor.video_editor import Usage, save_video
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import json
+import os
+
+
+def make_sample(operation, fps, is_end=False):
+    return MetricsSample(0.0, operation, 10, fps, 2.0, 100.0, 1000, 1.0, is_end)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_summarize_runs(self):
+        metrics = [
+            OperationMetrics('trim', 1.5, [make_sample('trim', fps) for fps in range(1, 11)]
+                             + [make_sample('trim', None, is_end=True)]),
+            OperationMetrics('crop', 1.0, []),
+            OperationMetrics('trim', 0.5, [make_sample('trim', fps) for fps in range(11, 21)]
+                             + [make_sample('trim', None, is_end=True)]),
+        ]
+        trim, crop = summarize(metrics)
+        self.assertEqual(('trim', 2, 2.0, 2, 20, 2000), trim[:6])
+        self.assertEqual(10.5, trim.mean_fps)
+        self.assertEqual(19, trim.p95_fps)
+        self.assertEqual(2.0, trim.mean_speed)
+        self.assertEqual(('crop', 1, 1.0, 0, 0, 0, None, None, None), tuple(crop))
+
+    def test_operation_attribution(self):
+        recorder = MetricsRecorder()
+        event = ProgressEvent(1, 25.0, 40000, 1.0, 50.0, 500, False)
+        recorder(event)
+        with recorder.operation('speed'):
+            recorder(event)
+            recorder(event._replace(is_end=True))
+        self.assertEqual(1, len(recorder.metrics))
+        self.assertEqual(['speed', 'speed'],
+                         [sample.operation for sample in recorder.metrics[0].samples])
+        self.assertEqual(1, recorder.summarize()[0].renders)
+
+    def test_json_lines_of_render(self):
+        path = os.path.join(self.tmpdir, 'metrics.jsonl')
+        recorder = MetricsRecorder([JsonLinesWriter(path)])
+        with progress_events.subscribed(recorder), recorder.operation('render_test'):
+            save_video(ffmpeg.input('testsrc=duration=1:size=64x64:rate=10', f='lavfi'),
+                       os.path.join(self.tmpdir, 'result.mp4'), mode=Usage.SILENT)
+        with open(path, encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual('sample', records[0]['type'])
+        self.assertTrue(records[-2]['is_end'])
+        summary = records[-1]
+        self.assertEqual(('summary', 'render_test', 1, 10),
+                         (summary['type'], summary['operation'], summary['renders'], summary['frames']))
+        self.assertGreater(summary['bytes_written'], 0)
+
+    def test_prometheus_text(self):
+        path = os.path.join(self.tmpdir, 'metrics.prom')
+        writer = PrometheusWriter(path)
+        writer.write_sample(make_sample('trim', 30.0))
+        for _ in range(2):
+            writer.write_summary(summarize([OperationMetrics(
+                'trim', 1.25, [make_sample('trim', 30.0, is_end=True)])])[0])
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertIn('# TYPE video_editor_render_fps gauge', lines)
+        self.assertIn('video_editor_render_fps{operation="trim"} 30.0', lines)
+        self.assertIn('video_editor_operations_total{operation="trim"} 2', lines)
+        self.assertIn('video_editor_operation_wall_seconds_total{operation="trim"} 2.5', lines)
+        self.assertIn('video_editor_operation_p95_fps{operation="trim"} 30.0', lines)
+        self.assertEqual(['metrics.prom'], os.listdir(self.tmpdir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+from VideoEditor.mp4_reader import read_mp4_metadata, Mp4ParseError
+from fractions import Fraction
+import unittest
+import shutil
+import tempfile
+import os
+
+
+class TestMp4Reader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        current_file_path = os.path.abspath(__file__)
+        project_directory = os.path.dirname(os.path.dirname(current_file_path))
+        self.video_directory = project_directory + os.sep + 'resources' + os.sep
+
+    def test_read_metadata(self):
+        metadata = read_mp4_metadata(self.video_directory + 'shower.mp4')
+        self.assertAlmostEqual(10.22, metadata.duration, delta=0.01)
+        self.assertEqual((720, 1280), (metadata.width, metadata.height))
+        self.assertAlmostEqual(29.88, float(Fraction(metadata.frame_rate)), delta=0.01)
+
+    def test_keyframes(self):
+        for file_name in os.listdir(self.video_directory):
+            metadata = read_mp4_metadata(self.video_directory + file_name)
+            self.assertEqual(0, metadata.keyframes[0])
+            self.assertEqual(sorted(metadata.keyframes), metadata.keyframes)
+            self.assertLess(metadata.keyframes[-1], metadata.duration)
+
+    def test_not_mp4_file(self):
+        path = os.path.join(self.tmpdir, 'not_video.mp4')
+        with open(path, 'wb') as file:
+            file.write(b'definitely not a video file')
+        self.assertRaises(Mp4ParseError, read_mp4_metadata, path)
+
+    def test_nonexistent_file(self):
+        self.assertRaises(IOError, read_mp4_metadata, self.tmpdir + 'asdf.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+from VideoEditor.probe_cache import ProbeCache
+import unittest
+import shutil
+import tempfile
+import os
+
+
+class TestProbeCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmpdir, 'video.mp4')
+        with open(self.file_path, 'wb') as file:
+            file.write(b'content')
+        self.computed = []
+
+    def compute(self, path: str) -> dict:
+        self.computed.append(path)
+        return {'path': path, 'call': len(self.computed)}
+
+    def test_probe_once(self):
+        cache = ProbeCache()
+        first = cache.get(self.file_path, 'probe', self.compute)
+        second = cache.get(self.file_path, 'probe', self.compute)
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(self.computed))
+        self.assertEqual(1, cache.stats()['hits'])
+        self.assertEqual(1, cache.stats()['misses'])
+
+    def test_changed_file_is_probed_again(self):
+        cache = ProbeCache()
+        cache.get(self.file_path, 'probe', self.compute)
+        with open(self.file_path, 'ab') as file:
+            file.write(b'more content')
+        cache.get(self.file_path, 'probe', self.compute)
+        self.assertEqual(2, len(self.computed))
+
+    def test_lru_eviction(self):
+        cache = ProbeCache(max_size=1)
+        cache.get(self.file_path, 'probe', self.compute)
+        cache.get(self.file_path, 'keyframes', self.compute)
+        cache.get(self.file_path, 'probe', self.compute)
+        self.assertEqual(3, len(self.computed))
+        self.assertEqual(1, cache.stats()['size'])
+
+    def test_disk_store_between_instances(self):
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        ProbeCache(cache_dir=cache_dir).get(self.file_path, 'probe', self.compute)
+        other_cache = ProbeCache(cache_dir=cache_dir)
+        value = other_cache.get(self.file_path, 'probe', self.compute)
+        self.assertEqual(1, len(self.computed))
+        self.assertEqual(1, value['call'])
+        self.assertEqual(1, other_cache.stats()['hits'])
+
+    def test_missing_file_is_not_cached(self):
+        cache = ProbeCache()
+        missing_path = os.path.join(self.tmpdir, 'missing.mp4')
+        cache.get(missing_path, 'probe', self.compute)
+        cache.get(missing_path, 'probe', self.compute)
+        self.assertEqual(2, len(self.computed))
+        self.assertEqual(0, cache.stats()['misses'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
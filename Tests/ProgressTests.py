@@ -0,0 +1,78 @@
+from VideoEditor.progress_bar import \
+    ProgressParser, ProgressEvent, read_progress, progress_events, gui_progress_view
+from VideoEditor.video_editor import Usage, save_video
+import contextlib
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import queue
+import io
+import os
+
+PROGRESS_BLOCK = [
+    'frame=50', 'fps=25.00', 'stream_0_0_q=28.0', 'bitrate= 120.5kbits/s',
+    'total_size=30000', 'out_time_us=2000000', 'out_time_ms=2000000',
+    'out_time=00:00:02.000000', 'dup_frames=0', 'drop_frames=0', 'speed=1.5x',
+]
+
+
+class TestProgress(unittest.TestCase):
+    def test_parse_block(self):
+        parser = ProgressParser()
+        for line in PROGRESS_BLOCK:
+            self.assertIsNone(parser.feed(line))
+        event = parser.feed('progress=continue')
+        self.assertEqual(ProgressEvent(50, 25.0, 2000000, 1.5, 120.5, 30000, False), event)
+        self.assertEqual(2.0, event.out_time)
+
+    def test_not_available_values(self):
+        parser = ProgressParser()
+        for line in ['frame=0', 'bitrate=N/A', 'out_time_us=N/A', 'speed=N/A']:
+            parser.feed(line)
+        event = parser.feed('progress=end')
+        self.assertEqual(ProgressEvent(0, None, None, None, None, None, True), event)
+        self.assertIsNone(event.out_time)
+
+    def test_read_progress(self):
+        stream = io.BytesIO('\n'.join([*PROGRESS_BLOCK, 'progress=continue',
+                                       *PROGRESS_BLOCK, 'progress=end', '']).encode())
+        events = queue.Queue()
+        read_progress(stream, events).join()
+        self.assertEqual([False, True, None],
+                         [event and event.is_end for event in [events.get() for _ in range(3)]])
+
+    def test_subscribed_sink(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            received = []
+            with progress_events.subscribed(received.append):
+                save_video(ffmpeg.input('testsrc=duration=1:size=64x64:rate=10', f='lavfi'),
+                           os.path.join(tmpdir, 'result.mp4'), mode=Usage.SILENT)
+            self.assertTrue(received[-1].is_end)
+            self.assertEqual(10, received[-1].frame)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+    def test_gui_progress_view(self):
+        tmpdir = tempfile.mkdtemp()
+        received = []
+
+        @contextlib.contextmanager
+        def view(duration: float):
+            received.append(duration)
+            yield received.append
+
+        try:
+            # The view of the thread is shown instead of the PySimpleGUI bar
+            with gui_progress_view(view):
+                save_video(ffmpeg.input('testsrc=duration=1:size=64x64:rate=10', f='lavfi'),
+                           os.path.join(tmpdir, 'result.mp4'), duration=1, mode=Usage.GUI)
+            self.assertEqual(1, received[0])
+            self.assertTrue(received[-1].is_end)
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+from VideoEditor.proxy import make_proxy, make_job, scale_job, replay_operations, CURRENT_VIDEO
+from VideoEditor.video_editor import \
+    (Usage, TimeInterval, Point, trim_and_save_video, crop_and_save,
+     overlay_video_on_another_and_save)
+from VideoEditor.utils import get_video_parameters, get_video_duration
+import unittest
+import shutil
+import tempfile
+import os
+
+
+class TestProxy(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.video_path = os.path.join(project_directory, 'resources', 'shrek_dancing.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_make_job(self):
+        self.assertEqual(
+            {'operation': 'trim', 'video_path': CURRENT_VIDEO, 'time_interval': [2, 6]},
+            make_job(trim_and_save_video, CURRENT_VIDEO, TimeInterval(2, 6), None)
+        )
+        self.assertEqual(
+            {'operation': 'crop', 'video_path': CURRENT_VIDEO,
+             'point1': [0, 10], 'point2': [100, 50]},
+            make_job(crop_and_save, CURRENT_VIDEO, None, Point((0, 10)), Point((100, 50)))
+        )
+
+    def test_scale_job(self):
+        crop = make_job(crop_and_save, CURRENT_VIDEO, None, Point((10, 20)), Point((100, 50)))
+        self.assertEqual(
+            {**crop, 'point1': [20, 30], 'point2': [200, 75]},
+            scale_job(crop, (2.0, 1.5))
+        )
+        overlay = make_job(overlay_video_on_another_and_save, CURRENT_VIDEO, 'a.png', None, 5, 7)
+        self.assertEqual({**overlay, 'x_shift': 15, 'y_shift': 7}, scale_job(overlay, (3.0, 1.0)))
+
+    def test_make_proxy(self):
+        proxy_path = os.path.join(self.tmpdir, 'proxy.mp4')
+        scale = make_proxy(self.video_path, proxy_path, max_height=360, mode=Usage.SILENT)
+        self.assertEqual((640, 360), get_video_parameters(proxy_path)[:2])
+        self.assertEqual((2.0, 2.0), scale)
+
+    def test_replay_on_original(self):
+        path_to_save = os.path.join(self.tmpdir, 'result.mp4')
+        jobs = [
+            make_job(trim_and_save_video, CURRENT_VIDEO, TimeInterval(2, 6), None),
+            make_job(crop_and_save, CURRENT_VIDEO, None, Point((0, 0)), Point((320, 180))),
+        ]
+        replay_operations(self.video_path, jobs, path_to_save, (2.0, 2.0), mode=Usage.SILENT)
+        self.assertEqual((640, 360), get_video_parameters(path_to_save)[:2])
+        self.assertAlmostEqual(4, get_video_duration(path_to_save), delta=0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+from VideoEditor.render_cache import RenderCache, get_render_key, get_content_identity, normalize_job
+from VideoEditor.video_editor import trim_and_save_video, TimeInterval
+from VideoEditor.encoding_profile import PROFILES
+from VideoEditor.proxy import make_job, CURRENT_VIDEO
+import unittest
+import tempfile
+import shutil
+import os
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = RenderCache(os.path.join(self.tmpdir, 'cache'))
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        with open(self.video_path, 'wb') as file:
+            file.write(os.urandom(3 * 1024 * 1024))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_equal_jobs_have_equal_keys(self):
+        job = make_job(trim_and_save_video, CURRENT_VIDEO, TimeInterval(1, 3), None)
+        explicit = make_job(trim_and_save_video, CURRENT_VIDEO, TimeInterval(1.0, 3.0), None,
+                            is_overwrite=True, is_smart=True)
+        self.assertEqual(normalize_job(job), normalize_job(explicit))
+        self.assertEqual(get_render_key('parent', job), get_render_key('parent', explicit))
+        self.assertNotEqual(get_render_key('parent', job), get_render_key('other', job))
+        self.assertNotEqual(get_render_key('parent', job),
+                            get_render_key('parent', job, PROFILES['draft']))
+        self.assertEqual(get_render_key('parent', dict(job, profile='draft')),
+                         get_render_key('parent', job, PROFILES['draft']))
+
+    def test_files_are_keyed_by_content(self):
+        copy_path = os.path.join(self.tmpdir, 'copy.mp4')
+        shutil.copyfile(self.video_path, copy_path)
+        self.assertEqual(get_content_identity(self.video_path), get_content_identity(copy_path))
+        job = {'operation': 'open', 'video_path': self.video_path}
+        self.assertEqual(get_render_key(None, job), get_render_key(None, dict(job, video_path=copy_path)))
+
+        with open(copy_path, 'r+b') as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b'\0' if file.read(1) != b'\0' else b'\1')
+        self.assertNotEqual(get_content_identity(self.video_path), get_content_identity(copy_path))
+
+    def test_same_size_files_differing_between_samples(self):
+        video_path = os.path.join(self.tmpdir, 'long.mp4')
+        with open(video_path, 'wb') as file:
+            file.write(os.urandom(8 * 1024 * 1024))
+        edited_path = os.path.join(self.tmpdir, 'edited.mp4')
+        shutil.copyfile(video_path, edited_path)
+        # Neither at the beginning, nor in the middle, nor at the end
+        with open(edited_path, 'r+b') as file:
+            file.seek(2 * 1024 * 1024)
+            file.write(b'\0' if file.read(1) != b'\0' else b'\1')
+        self.assertEqual(os.path.getsize(video_path), os.path.getsize(edited_path))
+        self.assertNotEqual(get_content_identity(video_path), get_content_identity(edited_path))
+
+    def test_fetch_and_store(self):
+        output_path = os.path.join(self.tmpdir, 'result.mp4')
+        self.assertFalse(self.cache.fetch('key', output_path))
+        self.cache.store('key', self.video_path)
+        self.assertTrue(self.cache.contains('key'))
+        self.assertTrue(self.cache.fetch('key', output_path))
+        with open(output_path, 'rb') as output, open(self.video_path, 'rb') as video:
+            self.assertEqual(video.read(), output.read())
+        self.assertEqual({'hits': 1, 'misses': 1, 'hit_rate': 0.5}, self.cache.stats())
+
+    def test_least_recently_used_are_evicted(self):
+        self.cache.max_bytes = 7 * 1024 * 1024
+        for key in ('first', 'second', 'third', 'fourth'):
+            # Every result is another file, the links of one file share the time of the last use
+            video_path = os.path.join(self.tmpdir, key + '.mp4')
+            shutil.copyfile(self.video_path, video_path)
+            self.cache.store(key, video_path)
+            if key != 'fourth':
+                os.utime(self.cache.get_key_path(key), ns=(0, len(key) * 10 ** 9))
+        self.assertFalse(self.cache.contains('first'))
+        self.assertFalse(self.cache.contains('third'))
+        self.assertTrue(self.cache.contains('second'))
+        self.assertTrue(self.cache.contains('fourth'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+from VideoEditor.video_editor import Usage, save_video
+from VideoEditor.render_control import \
+    (CancellationToken, RenderCancelledError, RenderTimeoutError, RenderStalledError,
+     cancellation_scope, get_scope_token)
+from VideoEditor.utils import get_video_duration
+from VideoEditor.smart_cut import Segment, render_segments
+from VideoEditor.proxy import make_media_proxy
+import unittest
+import threading
+import tempfile
+import shutil
+import ffmpeg
+import os
+
+
+class TestRenderControl(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.tmpdir, 'result.mp4')
+        # Read in real time, so the render takes a minute
+        self.slow_video = ffmpeg.input('testsrc=duration=60:size=160x120:rate=10',
+                                       f='lavfi', re=None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_timeout(self):
+        with self.assertRaises(RenderTimeoutError):
+            save_video(self.slow_video, self.output_path, mode=Usage.SILENT, timeout=1)
+        self.assertFalse(os.path.exists(self.output_path))
+
+    def test_cancel(self):
+        token = CancellationToken()
+        timer = threading.Timer(1, token.cancel)
+        timer.start()
+        try:
+            with self.assertRaises(RenderCancelledError):
+                save_video(self.slow_video, self.output_path, mode=Usage.SILENT,
+                           cancel_token=token)
+        finally:
+            timer.cancel()
+        self.assertFalse(os.path.exists(self.output_path))
+
+    def test_cancellation_scope(self):
+        token = CancellationToken()
+        timer = threading.Timer(1, token.cancel)
+        timer.start()
+        try:
+            with cancellation_scope(token), self.assertRaises(RenderCancelledError):
+                # The token is not given, the scope of the thread cancels the render
+                save_video(self.slow_video, self.output_path, mode=Usage.SILENT)
+        finally:
+            timer.cancel()
+        self.assertIsNone(get_scope_token())
+        self.assertFalse(os.path.exists(self.output_path))
+
+    def test_cancellation_scope_of_helper_renders(self):
+        # Nobody writes into the pipe, so only the cancellation ends the renders
+        fifo_path = os.path.join(self.tmpdir, 'input.fifo')
+        os.mkfifo(fifo_path)
+        token = CancellationToken()
+        token.cancel()
+        with cancellation_scope(token):
+            with self.assertRaises(RenderCancelledError):
+                make_media_proxy(fifo_path, self.output_path, (2.0, 2.0))
+            with self.assertRaises(RenderCancelledError):
+                render_segments(fifo_path, [Segment(0, 1, False)], self.tmpdir,
+                                {'vcodec': 'libx264', 'bsf:v': 'h264_mp4toannexb'})
+        self.assertFalse(os.path.exists(self.output_path))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'part0.ts')))
+
+    def test_stall(self):
+        # Nobody writes into the pipe, so ffmpeg waits for input forever
+        fifo_path = os.path.join(self.tmpdir, 'input.fifo')
+        os.mkfifo(fifo_path)
+        with self.assertRaises(RenderStalledError):
+            save_video(ffmpeg.input(fifo_path, f='mpegts'), self.output_path,
+                       mode=Usage.SILENT, stall_timeout=1)
+        self.assertFalse(os.path.exists(self.output_path))
+
+    def test_finished_render(self):
+        video = ffmpeg.input('testsrc=duration=2:size=160x120:rate=10', f='lavfi')
+        save_video(video, self.output_path, duration=2, mode=Usage.CONSOLE,
+                   timeout=60, stall_timeout=10)
+        self.assertAlmostEqual(2, get_video_duration(self.output_path), delta=0.2)
+
+    def test_failed_render(self):
+        video = ffmpeg.input(os.path.join(self.tmpdir, 'missing.mp4'))
+        with self.assertRaises(ffmpeg.Error):
+            save_video(video, self.output_path, mode=Usage.SILENT, timeout=60)
+        self.assertFalse(os.path.exists(self.output_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
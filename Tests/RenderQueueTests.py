@@ -0,0 +1,109 @@
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from gui.render_queue import RenderQueue, RenderTask
+from VideoEditor.render_control import get_scope_token
+from VideoEditor.video_editor import Usage, set_video_speed_and_save
+from PyQt6.QtCore import QCoreApplication, QEventLoop, QTimer
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import time
+
+# Seconds a test waits for the queue to finish its tasks
+QUEUE_TIMEOUT = 60
+
+
+class TestRenderQueue(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.application = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.queue = RenderQueue()
+        self.events = []
+        self.queue.started.connect(lambda name: self.events.append(('started', name)))
+
+    def tearDown(self):
+        self.queue.cancel()
+        self.queue.wait()
+        shutil.rmtree(self.tmpdir)
+
+    def wait_until_idle(self):
+        loop = QEventLoop()
+        self.queue.idle.connect(loop.quit)
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(loop.quit)
+        timer.start(QUEUE_TIMEOUT * 1000)
+        loop.exec()
+        self.queue.idle.disconnect(loop.quit)
+        self.assertTrue(timer.isActive(), 'The queue did not finish in time')
+        self.assertFalse(self.queue.is_busy())
+
+    def make_task(self, name: str, result: object = None, error: Exception = None) -> RenderTask:
+        def render():
+            if error is not None:
+                raise error
+            return result
+
+        return RenderTask(
+            name, render,
+            lambda value: self.events.append(('finished', name, value)),
+            lambda exception: self.events.append(('failed', name, str(exception)))
+        )
+
+    def test_tasks_run_in_order(self):
+        for index in range(3):
+            self.queue.submit(self.make_task('task{}'.format(index), index))
+        self.assertEqual(2, self.queue.get_pending_count())
+        self.wait_until_idle()
+        self.assertEqual([
+            ('started', 'task0'), ('finished', 'task0', 0),
+            ('started', 'task1'), ('finished', 'task1', 1),
+            ('started', 'task2'), ('finished', 'task2', 2),
+        ], self.events)
+
+    def test_failure_drops_queued_tasks(self):
+        self.queue.submit(self.make_task('first', 1))
+        self.queue.submit(self.make_task('broken', error=ValueError('wrong speed')))
+        self.queue.submit(self.make_task('dropped', 3))
+        self.wait_until_idle()
+        self.assertEqual([
+            ('started', 'first'), ('finished', 'first', 1),
+            ('started', 'broken'), ('failed', 'broken', 'wrong speed'),
+        ], self.events)
+
+        # The queue accepts new tasks after the failure
+        self.queue.submit(self.make_task('next', 4))
+        self.wait_until_idle()
+        self.assertEqual(('finished', 'next', 4), self.events[-1])
+
+    def test_cancel_stops_running_render(self):
+        video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .output(ffmpeg.input('testsrc=duration=2:size=160x120:rate=10', f='lavfi'),
+                 ffmpeg.input('sine=duration=2', f='lavfi'), video_path)
+         .run(capture_stdout=True, capture_stderr=True))
+        output_path = os.path.join(self.tmpdir, 'slow.mp4')
+
+        def render():
+            # The operation takes no token, the token of the scope stops it
+            while not get_scope_token().is_cancelled:
+                time.sleep(0.01)
+            set_video_speed_and_save(video_path, 0.5, output_path, mode=Usage.SILENT)
+
+        self.queue.submit(RenderTask('slow', render,
+                                     lambda value: self.events.append(('finished',)),
+                                     lambda exception: self.events.append(('failed',))))
+        self.queue.submit(self.make_task('dropped'))
+        self.queue.cancel()
+        self.wait_until_idle()
+        self.assertEqual([('started', 'slow')], self.events)
+        self.assertFalse(os.path.exists(output_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
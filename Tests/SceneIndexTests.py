@@ -0,0 +1,68 @@
+from VideoEditor.scene_index import \
+    (detect_scenes, load_scene_cuts, get_sidecar_path, get_scene_scores, snap_interval,
+     snap_to_scenes)
+from VideoEditor.video_editor import TimeInterval
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import os
+
+
+class TestSceneIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # A moving test pattern, a still color and another pattern: cuts at 3.2 and 7.2 s
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        scenes = [ffmpeg.input('testsrc=size=160x120:rate=25:duration=3.2', f='lavfi'),
+                  ffmpeg.input('color=c=red:size=160x120:rate=25:duration=4', f='lavfi'),
+                  ffmpeg.input('testsrc2=size=160x120:rate=25:duration=3', f='lavfi')]
+        (ffmpeg
+         .concat(*scenes)
+         .output(self.video_path, pix_fmt='yuv420p')
+         .run(capture_stdout=True, capture_stderr=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_scores(self):
+        frames = np.zeros((3, 4, 4), dtype=np.uint8)
+        frames[2] = 255
+        np.testing.assert_allclose([0, 1], get_scene_scores(frames))
+
+    def test_hard_cuts(self):
+        self.assertEqual([3.2, 7.2], detect_scenes(self.video_path))
+        # Batches smaller than the video give the same cuts
+        self.assertEqual([3.2, 7.2], detect_scenes(self.video_path, batch_frames=7))
+        # The first scene is too short, so its cut is ignored too
+        self.assertEqual([7.2], detect_scenes(self.video_path, min_scene_length=4))
+
+    def test_sidecar_reuse(self):
+        sidecar_path = get_sidecar_path(self.video_path)
+        self.assertEqual([3.2, 7.2], load_scene_cuts(self.video_path))
+        built_at = os.stat(sidecar_path).st_mtime_ns
+        load_scene_cuts(self.video_path)
+        self.assertEqual(built_at, os.stat(sidecar_path).st_mtime_ns)
+        load_scene_cuts(self.video_path, threshold=0.5)
+        self.assertNotEqual(built_at, os.stat(sidecar_path).st_mtime_ns)
+
+    def test_snap_interval(self):
+        cuts = [3.2, 7.2]
+        kept = snap_interval(TimeInterval(2, 8), cuts)
+        self.assertEqual((4, 7), (kept.begin, kept.end))
+        removed = snap_interval(TimeInterval(2, 8), cuts, is_kept=False)
+        self.assertEqual((3, 8), (removed.begin, removed.end))
+        far = snap_interval(TimeInterval(0, 8), cuts, max_distance=0.5)
+        self.assertEqual((0, 8), (far.begin, far.end))
+        # Both boundaries at the same cut leave the interval as it is
+        same = snap_interval(TimeInterval(3, 4), cuts)
+        self.assertEqual((3, 4), (same.begin, same.end))
+
+    def test_snap_to_scenes(self):
+        time_interval = snap_to_scenes(self.video_path, TimeInterval(1, 6))
+        self.assertEqual((1, 7), (time_interval.begin, time_interval.end))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+from VideoEditor.smart_cut import Segment, plan_segments
+import unittest
+
+
+class TestSmartCut(unittest.TestCase):
+    def setUp(self):
+        self.keyframes = [0, 2, 4, 6, 8]
+        self.video_duration = 9.5
+
+    def test_partial_gops_at_edges(self):
+        self.assertEqual(
+            [Segment(1, 2, False), Segment(2, 6, True), Segment(6, 7, False)],
+            plan_segments(self.keyframes, 1, 7, self.video_duration)
+        )
+
+    def test_interval_on_keyframes(self):
+        self.assertEqual(
+            [Segment(2, 6, True)],
+            plan_segments(self.keyframes, 2, 6, self.video_duration)
+        )
+
+    def test_end_of_video_is_boundary(self):
+        self.assertEqual(
+            [Segment(7, 8, False), Segment(8, self.video_duration, True)],
+            plan_segments(self.keyframes, 7, self.video_duration, self.video_duration)
+        )
+
+    def test_inside_one_gop(self):
+        self.assertEqual(
+            [Segment(4.5, 5.5, False)],
+            plan_segments(self.keyframes, 4.5, 5.5, self.video_duration)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,19 @@
+from benchmarks.startup import \
+    STARTUP_BUDGET, measure_imports, measure_startup, get_heavy_imports
+import unittest
+
+
+class TestStartup(unittest.TestCase):
+    def test_cli_does_not_import_gui(self):
+        self.assertEqual([], get_heavy_imports(measure_imports('video_editor_parser')))
+
+    def test_library_does_not_import_gui(self):
+        self.assertEqual([], get_heavy_imports(measure_imports('VideoEditor.batch')))
+
+    def test_cli_startup_budget(self):
+        startup, _ = measure_startup('video_editor_parser', repeats=3)
+        self.assertLess(startup, STARTUP_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
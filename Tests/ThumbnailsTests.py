@@ -0,0 +1,80 @@
+from VideoEditor.thumbnails import \
+    (ThumbnailCache, extract_thumbnails, extract_filmstrip, make_sprite_sheet,
+     get_interval_timestamps)
+from VideoEditor.utils import get_information_about_stream
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import os
+
+
+def get_frame_number(image_path: str) -> int:
+    out, _ = (ffmpeg
+              .input(image_path)
+              .filter('scale', 1, 1)
+              .output('pipe:', f='rawvideo', pix_fmt='gray')
+              .run(capture_stdout=True, capture_stderr=True))
+    # gray is full range, the luma of the video is limited range
+    return round(out[0] * 219 / 255 / 4)
+
+
+class TestThumbnails(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ThumbnailCache(os.path.join(self.tmpdir, 'cache'))
+        # Luma of the frame is 16 + 4 * its number, a keyframe every second
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .input('nullsrc=size=64x48:rate=10:duration=5', f='lavfi')
+         .filter('geq', lum='16+N*4', cb=128, cr=128)
+         .output(self.video_path, vcodec='libx264', pix_fmt='yuv420p', g=10, crf=0)
+         .run(capture_stdout=True, capture_stderr=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertFrames(self, expected: list[int], paths: list[str]):
+        self.assertEqual(expected, list(map(get_frame_number, paths)))
+
+    def test_frames_at_timestamps(self):
+        paths = extract_thumbnails(self.video_path, [0, 1.25, 1.27, 3.5], width=32, cache=self.cache)
+        self.assertEqual(4, len(paths))
+        self.assertFrames([0, 13, 13, 35], paths)
+        self.assertEqual({'hits': 0, 'misses': 4, 'hit_rate': 0.0}, self.cache.stats())
+
+    def test_keyframes_only(self):
+        paths = extract_thumbnails(self.video_path, [1.25, 3.5], width=32,
+                                   is_keyframe_only=True, cache=self.cache)
+        self.assertFrames([10, 30], paths)
+
+    def test_cache_hits_and_eviction(self):
+        first = extract_thumbnails(self.video_path, [1, 2], cache=self.cache)
+        self.assertEqual(first, extract_thumbnails(self.video_path, [2, 1], cache=self.cache)[::-1])
+        self.assertEqual(2, self.cache.stats()['hits'])
+
+        self.cache.max_bytes = os.path.getsize(first[0])
+        extract_thumbnails(self.video_path, [3], cache=self.cache)
+        self.assertEqual(1, len(os.listdir(self.cache.cache_dir)))
+        self.assertIsNone(self.cache.lookup(self.video_path, 1, 160))
+
+    def test_filmstrip_sprite_sheet(self):
+        output_dir = os.path.join(self.tmpdir, 'strip')
+        paths = extract_filmstrip(self.video_path, count=5, width=32, output_dir=output_dir, cache=None)
+        self.assertEqual(['thumbnail_{:04d}.jpg'.format(index) for index in range(5)],
+                         sorted(os.listdir(output_dir)))
+        self.assertFrames([5, 15, 25, 35, 45], paths)
+
+        sprite_path = os.path.join(self.tmpdir, 'sprite.jpg')
+        self.assertEqual((3, 2), make_sprite_sheet(paths, sprite_path, columns=3))
+        sprite = get_information_about_stream(sprite_path, 'video')
+        self.assertEqual((96, 48), (sprite['width'], sprite['height']))
+
+    def test_interval_timestamps(self):
+        self.assertEqual([0, 2, 4], get_interval_timestamps(5, interval=2))
+        self.assertEqual([1.25, 3.75], get_interval_timestamps(5, count=2))
+        self.assertRaises(ValueError, get_interval_timestamps, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
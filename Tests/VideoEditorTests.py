@@ -1,8 +1,10 @@
 from VideoEditor.video_editor import \
     (Usage, TimeInterval, Point, open_videos, merge_videos_and_save,
      insert_video_and_save, trim_and_save_video, cut_part_and_save_video,
-     set_video_speed_and_save, overlay_video_on_another_and_save, crop_and_save)
-from VideoEditor.utils import get_video_duration
+     set_video_speed_and_save, overlay_video_on_another_and_save, crop_and_save,
+     EditPipeline, copy_video)
+from VideoEditor.utils import get_video_duration, get_information_about_stream
+from VideoEditor.encoding_profile import get_profile
 from typing import Callable
 import unittest
 import ffmpeg
@@ -226,6 +228,17 @@ class TestVideoEditor(unittest.TestCase):
             point2=Point((200, 200))
         )
 
+    def test_crop_with_draft_profile(self):
+        input_path = self.video_paths[0]
+        self.base_check_duration_test(
+            crop_and_save,
+            get_video_duration(input_path),
+            input_path,
+            point1=Point((100, 100)),
+            point2=Point((200, 200)),
+            profile=get_profile('draft')
+        )
+
     def test_incorrect_path_to_crop(self):
         self.base_raise_exception_test(
             crop_and_save,
@@ -251,6 +264,33 @@ class TestVideoEditor(unittest.TestCase):
             point2=Point((200, 200))
         )
 
+    def test_pipeline(self):
+        pipeline = (EditPipeline(self.video_paths[0])
+                    .trim(TimeInterval(2, 10))
+                    .set_speed(2)
+                    .crop(Point((100, 100)), Point((200, 200))))
+        self.base_check_duration_test(pipeline.save, 4.0)
+
+    def test_incorrect_pipeline_trim(self):
+        pipeline = EditPipeline(self.video_paths[0]).set_speed(2).trim(TimeInterval(2, 10000000))
+        self.base_raise_exception_test(pipeline.save, ValueError)
+
+    def test_copy_video(self):
+        output_file = os.path.join(self.tmpdir, 'copy.mp4')
+        copy_video(self.video_paths[0], output_file)
+        with open(self.video_paths[0], 'rb') as video, open(output_file, 'rb') as copy:
+            self.assertEqual(video.read(), copy.read())
+        self.assertRaises(FileExistsError, copy_video, self.video_paths[0], output_file, is_overwrite=False)
+
+        # Another container is remuxed, the streams are not encoded again
+        remuxed_file = os.path.join(self.tmpdir, 'copy.mkv')
+        copy_video(self.video_paths[0], remuxed_file, mode=Usage.SILENT)
+        for stream_type in ('video', 'audio'):
+            self.assertEqual(
+                get_information_about_stream(self.video_paths[0], stream_type)['codec_name'],
+                get_information_about_stream(remuxed_file, stream_type)['codec_name']
+            )
+
     def base_raise_exception_test(self, func: Callable, error, *args, **kwargs):
         output_file = self.tmpdir + 'failed_{}.mp4'.format(func.__name__)
         self.assertRaises(
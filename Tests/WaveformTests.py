@@ -0,0 +1,67 @@
+from VideoEditor.waveform import \
+    (BLOCK_SIZE, LEVEL_FACTOR, build_waveform, load_waveform, get_sidecar_paths)
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import ffmpeg
+import os
+
+
+class TestWaveform(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # A second of silence and two seconds of a tone at half of the full scale
+        self.video_path = os.path.join(self.tmpdir, 'video.mp4')
+        (ffmpeg
+         .input("aevalsrc='if(lt(t,1),0,0.5*sin(2*PI*440*t))':s=22050:d=3", f='lavfi')
+         .output(self.video_path, acodec='aac', audio_bitrate='192k')
+         .run(capture_stdout=True, capture_stderr=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pyramid_levels(self):
+        waveform = build_waveform(self.video_path)
+        self.assertIsInstance(waveform.peaks, np.memmap)
+        self.assertAlmostEqual(3, waveform.duration, delta=0.1)
+        self.assertEqual(1, waveform.levels[-1][1])
+        for level in range(1, len(waveform.levels)):
+            finer, coarser = waveform.get_level(level - 1), waveform.get_level(level)
+            self.assertEqual(-(-len(finer) // LEVEL_FACTOR), len(coarser))
+            self.assertEqual(finer[:LEVEL_FACTOR, 0].min(), coarser[0, 0])
+            self.assertEqual(finer[(len(coarser) - 1) * LEVEL_FACTOR:, 1].max(), coarser[-1, 1])
+
+    def test_peaks_of_range(self):
+        waveform = build_waveform(self.video_path)
+        silence = waveform.get_peaks(0.1, 0.9, 100)
+        tone = waveform.get_peaks(1.5, 2.5, 100)
+        self.assertEqual((100, 2), tone.shape)
+        self.assertLess(np.abs(silence).max(), 500)
+        self.assertTrue(np.all(np.abs(tone[:, 1] - 16384) < 2000))
+        self.assertTrue(np.all(np.abs(tone[:, 0] + 16384) < 2000))
+        # Zoomed in further than the finest level
+        self.assertEqual((50, 2), waveform.get_peaks(2.0, 2.001, 50).shape)
+
+    def test_small_chunks_give_same_peaks(self):
+        default = build_waveform(self.video_path)
+        chunked = build_waveform(self.video_path, os.path.join(self.tmpdir, 'chunked.npy'),
+                                 chunk_samples=BLOCK_SIZE * 3)
+        self.assertEqual(default.levels, chunked.levels)
+        np.testing.assert_array_equal(default.peaks, chunked.peaks)
+
+    def test_sidecar_reuse(self):
+        sidecar_path, _ = get_sidecar_paths(self.video_path)
+        load_waveform(self.video_path)
+        built_at = os.stat(sidecar_path).st_mtime_ns
+        load_waveform(self.video_path)
+        self.assertEqual(built_at, os.stat(sidecar_path).st_mtime_ns)
+
+        stat = os.stat(self.video_path)
+        os.utime(self.video_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        load_waveform(self.video_path)
+        self.assertNotEqual(built_at, os.stat(sidecar_path).st_mtime_ns)
+
+
+if __name__ == '__main__':
+    unittest.main()
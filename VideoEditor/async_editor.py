@@ -0,0 +1,329 @@
+from .video_editor import \
+    (TimeInterval, Point, open_videos, merge_videos, trim_video, make_output,
+     prepare_output_path, build_insert, build_cut, build_speed_change,
+     build_overlay, build_crop)
+from .utils import check_paths_correctness, get_mp4_metadata
+from .probe_cache import probe_cache
+from .progress_bar import ProgressParser, progress_events
+from .encoding_profile import EncodingProfile
+from . import utils
+from collections import namedtuple
+from typing import Awaitable, Callable, Union
+import asyncio
+import ffmpeg
+import json
+import os
+
+
+class Progress(namedtuple('Progress', ['out_time', 'duration', 'speed', 'is_end'])):
+    """
+    Progress of the render
+    :param out_time: seconds of the result already rendered
+    :param duration: expected duration of the result, None if unknown
+    :param speed: render speed relative to real time, None if not reported yet
+    :param is_end: whether it is the last progress of the render
+    """
+
+    @property
+    def fraction(self) -> float:
+        if self.is_end:
+            return 1.0
+        if not self.duration:
+            return 0.0
+        return min(self.out_time / self.duration, 1.0)
+
+
+class Render:
+    """
+    ffmpeg run started on the event loop. Awaiting the render waits until the
+    result is saved, iterating over it yields the progress on the way:
+
+        render = crop_and_save(video_path, path_to_save, point1, point2)
+        async for progress in render:
+            print(progress.fraction)
+
+    A render runs once. Cancelling the awaiting task (or calling cancel) kills
+    ffmpeg and removes the partial result
+    """
+
+    def __init__(self,
+                 prepare: Callable[[], Awaitable[tuple]],
+                 path_to_save: str,
+                 is_overwrite: bool = False,
+                 profile: EncodingProfile = None):
+        """
+        :param prepare: coroutine function returning the graph to render and
+         the duration of the result
+        :param path_to_save: the absolute path to the result video
+        :param is_overwrite: overwrites the video even if there is already a video in the save path
+        :param profile: settings of the video encoder, by default the ffmpeg defaults
+        """
+        self.path_to_save = prepare_output_path(path_to_save)
+        self.is_overwrite = is_overwrite
+        self.profile = profile
+        self._prepare = prepare
+        self._process = None
+        self._is_started = False
+        self._is_cancelled = False
+
+    def __aiter__(self):
+        return self._run()
+
+    def __await__(self):
+        return self._wait().__await__()
+
+    def cancel(self) -> None:
+        self._is_cancelled = True
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+
+    async def _wait(self) -> None:
+        async for _ in self:
+            pass
+
+    async def _run(self):
+        if self._is_started:
+            raise RuntimeError('The render of {} is already started'.format(self.path_to_save))
+        self._is_started = True
+        video, duration = await self._prepare()
+        if self._is_cancelled:
+            raise asyncio.CancelledError()
+        args = (make_output(video, self.path_to_save, self.profile)
+                .global_args('-progress', 'pipe:1', '-nostats')
+                .compile(overwrite_output=self.is_overwrite))
+        is_existing = os.path.exists(self.path_to_save)
+        self._process = await asyncio.create_subprocess_exec(
+            *args, stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        # stderr is read all the time, so ffmpeg never waits for a full pipe
+        stderr = asyncio.ensure_future(self._process.stderr.read())
+        is_saved = False
+        try:
+            parser = ProgressParser()
+            async for line in self._process.stdout:
+                event = parser.feed(line.decode(errors='replace'))
+                if event is not None:
+                    progress_events.emit(event)
+                    yield Progress(event.out_time or 0.0, duration, event.speed, event.is_end)
+            return_code = await self._process.wait()
+            error = await stderr
+            if self._is_cancelled:
+                raise asyncio.CancelledError()
+            if return_code != 0:
+                raise ffmpeg.Error('ffmpeg', b'', error)
+            is_saved = True
+        finally:
+            if not is_saved:
+                await self._stop(stderr, self.is_overwrite or not is_existing)
+
+    async def _stop(self, stderr: asyncio.Future, is_partial_result: bool) -> None:
+        if self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        stderr.cancel()
+        if is_partial_result and os.path.exists(self.path_to_save):
+            os.remove(self.path_to_save)
+
+
+async def probe(path: str) -> dict:
+    """
+    ffmpeg.probe of the file without blocking the event loop. Results are
+    shared with the cache of the synchronous helpers
+    """
+    cached = probe_cache.lookup(path, 'probe')
+    if cached is not None:
+        return cached
+    process = await asyncio.create_subprocess_exec(
+        'ffprobe', '-show_format', '-show_streams', '-of', 'json', path,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        out, error = await process.communicate()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        raise ffmpeg.Error('ffprobe', out, error)
+    result = json.loads(out.decode('utf-8'))
+    probe_cache.put(path, 'probe', result)
+    return result
+
+
+async def get_video_duration(path: str) -> float:
+    if get_mp4_metadata(path) is None:
+        await probe(path)
+    return utils.get_video_duration(path)
+
+
+async def get_video_parameters(path: str) -> tuple[int, int, int, str]:
+    if get_mp4_metadata(path) is None:
+        await probe(path)
+    return utils.get_video_parameters(path)
+
+
+async def get_information_about_stream(path: str, stream_name: str) -> dict:
+    await probe(path)
+    return utils.get_information_about_stream(path, stream_name)
+
+
+async def _probe_inputs(paths: list[str], is_stream_needed: bool = False) -> None:
+    """
+    Probe the inputs concurrently, so building of the graph takes all
+    metadata from the cache and does not block the event loop
+    """
+    check_paths_correctness(paths, {'mp4', 'png', 'jpg'})
+    await asyncio.gather(*[probe(path) for path in paths
+                           if is_stream_needed or get_mp4_metadata(path) is None])
+
+
+def merge_videos_and_save(
+        videos_paths: list[str],
+        path_to_save: str,
+        width: int = None,
+        height: int = None,
+        sar: str = None,
+        fps: int = None,
+        is_overwrite: bool = False,
+        profile: EncodingProfile = None
+) -> Render:
+    """
+    Counterpart of video_editor.merge_videos_and_save, the videos are always
+    merged through the filter graph
+    """
+    if len(videos_paths) < 2:
+        raise ValueError(
+            'You can merge only two or more videos, but you got {}'
+            .format(len(videos_paths))
+        )
+
+    async def prepare():
+        await _probe_inputs(videos_paths, is_stream_needed=True)
+        result_video_duration = sum(map(utils.get_video_duration, videos_paths))
+        # The parameters which are not given are the exact ones of the first video
+        return merge_videos(open_videos(videos_paths), width, height, fps, sar), result_video_duration
+
+    return Render(prepare, path_to_save, is_overwrite, profile)
+
+
+def insert_video_and_save(
+        main_video_path: str,
+        insert_paths: Union[str, list[str]],
+        insert_time_in_seconds: int,
+        path_to_save: str,
+        is_overwrite: bool = False,
+        profile: EncodingProfile = None
+) -> Render:
+    """Counterpart of video_editor.insert_video_and_save"""
+    if isinstance(insert_paths, str):
+        insert_paths = [insert_paths]
+    if insert_time_in_seconds == 0:
+        return merge_videos_and_save([*insert_paths, main_video_path], path_to_save,
+                                     is_overwrite=is_overwrite, profile=profile)
+
+    async def prepare():
+        await _probe_inputs([main_video_path, *insert_paths], is_stream_needed=True)
+        main_video_duration = utils.get_video_duration(main_video_path)
+        if main_video_duration < insert_time_in_seconds:
+            raise ValueError('Time to insert ({}) beyond video duration({})'
+                             .format(insert_time_in_seconds, main_video_duration))
+        return build_insert(main_video_path, insert_paths,
+                            insert_time_in_seconds, main_video_duration)
+
+    return Render(prepare, path_to_save, is_overwrite, profile)
+
+
+def trim_and_save_video(
+        video_path: str,
+        time_interval: TimeInterval,
+        path_to_save: str,
+        is_overwrite: bool = False,
+        profile: EncodingProfile = None
+) -> Render:
+    """
+    Counterpart of video_editor.trim_and_save_video, the video is always
+    re-encoded
+    """
+    async def prepare():
+        await _probe_inputs([video_path])
+        video_duration = utils.get_video_duration(video_path)
+        if not time_interval.in_range(video_duration):
+            raise ValueError('Time to trim ({}) beyond video duration({})'
+                             .format(time_interval.end, video_duration))
+        trimmed = trim_video(open_videos(video_path), time_interval.begin, time_interval.end)
+        return trimmed, time_interval.get_duration_in_seconds()
+
+    return Render(prepare, path_to_save, is_overwrite, profile)
+
+
+def cut_part_and_save_video(
+        video_path: str,
+        time_interval: TimeInterval,
+        path_to_save: str,
+        is_overwrite: bool = False,
+        profile: EncodingProfile = None
+) -> Render:
+    """
+    Counterpart of video_editor.cut_part_and_save_video, the video is always
+    re-encoded
+    """
+    async def prepare():
+        await _probe_inputs([video_path])
+        video_duration = utils.get_video_duration(video_path)
+        if not time_interval.in_range(video_duration):
+            raise ValueError('Time to cut beyond video duration')
+        result_video_duration = video_duration - time_interval.get_duration_in_seconds()
+        return build_cut(video_path, time_interval), result_video_duration
+
+    return Render(prepare, path_to_save, is_overwrite, profile)
+
+
+def set_video_speed_and_save(
+        video_path: str,
+        speed: Union[int, float, str],
+        path_to_save: str,
+        is_overwrite: bool = False,
+        time_interval: TimeInterval = None,
+        profile: EncodingProfile = None
+) -> Render:
+    """Counterpart of video_editor.set_video_speed_and_save"""
+    async def prepare():
+        await _probe_inputs([video_path])
+        return build_speed_change(video_path, speed, time_interval)
+
+    return Render(prepare, path_to_save, is_overwrite, profile)
+
+
+def overlay_video_on_another_and_save(
+        main_video_path: str,
+        overlay_path: str,
+        path_to_save: str,
+        x_shift: int = 0,
+        y_shift: int = 0,
+        is_overwrite: bool = False,
+        profile: EncodingProfile = None
+) -> Render:
+    """Counterpart of video_editor.overlay_video_on_another_and_save"""
+    async def prepare():
+        await _probe_inputs([main_video_path, overlay_path], is_stream_needed=True)
+        return build_overlay(main_video_path, overlay_path, x_shift, y_shift)
+
+    return Render(prepare, path_to_save, is_overwrite, profile)
+
+
+def crop_and_save(
+        video_path: str,
+        path_to_save: str,
+        point1: Point,
+        point2: Point,
+        is_overwrite: bool = False,
+        profile: EncodingProfile = None
+) -> Render:
+    """Counterpart of video_editor.crop_and_save"""
+    async def prepare():
+        await _probe_inputs([video_path])
+        return build_crop(video_path, point1, point2)
+
+    return Render(prepare, path_to_save, is_overwrite, profile)
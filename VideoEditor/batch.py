@@ -0,0 +1,156 @@
+from .video_editor import \
+    (merge_videos_and_save, insert_video_and_save, trim_and_save_video,
+     cut_part_and_save_video, set_video_speed_and_save,
+     overlay_video_on_another_and_save, crop_and_save, TimeInterval, Point)
+from .utils import Usage, convert_time_to_seconds
+from .encoding_profile import get_profile
+from .progress_bar import progress_events
+from .metrics import MetricsRecorder, OperationSummary, summarize, get_writer
+from collections import namedtuple
+from typing import Callable, Union
+import ffmpeg
+import json
+import time
+import os
+
+OPERATIONS = {
+    'merge': merge_videos_and_save,
+    'insert': insert_video_and_save,
+    'trim': trim_and_save_video,
+    'cut': cut_part_and_save_video,
+    'speed': set_video_speed_and_save,
+    'overlay': overlay_video_on_another_and_save,
+    'crop': crop_and_save,
+}
+
+JobResult = namedtuple('JobResult', ['index', 'operation', 'is_success', 'elapsed', 'error', 'metrics'],
+                       defaults=[None])
+
+
+def load_jobs(path: str) -> list[dict]:
+    """
+    Read jobs from JSON file with a list of jobs or from JSON-lines file with
+    a job on every line. Job is an object with the name of the operation and
+    the arguments of its function, for example:
+    {"operation": "trim", "video_path": "in.mp4", "path_to_save": "out.mp4",
+     "time_interval": ["00:00:02", "00:00:10"], "profile": "draft"}
+    """
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+    if text.lstrip().startswith('['):
+        jobs = json.loads(text)
+    else:
+        jobs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for index, job in enumerate(jobs):
+        if not isinstance(job, dict) or job.get('operation') not in OPERATIONS:
+            raise ValueError('Job {} has no known operation, available: {}'
+                             .format(index, ', '.join(OPERATIONS)))
+    return jobs
+
+
+def _convert_time(value: Union[int, str]) -> int:
+    return convert_time_to_seconds(value) if isinstance(value, str) else value
+
+
+def prepare_arguments(job: dict) -> tuple[Callable, dict]:
+    """Function of the job operation and its arguments converted from JSON values"""
+    arguments = {key: value for key, value in job.items() if key != 'operation'}
+    if 'time_interval' in arguments and arguments['time_interval'] is not None:
+        arguments['time_interval'] = TimeInterval(*map(_convert_time, arguments['time_interval']))
+    if 'insert_time_in_seconds' in arguments:
+        arguments['insert_time_in_seconds'] = _convert_time(arguments['insert_time_in_seconds'])
+    for key in ('point1', 'point2'):
+        if key in arguments:
+            arguments[key] = Point(tuple(arguments[key]))
+    if isinstance(arguments.get('profile'), str):
+        arguments['profile'] = get_profile(arguments['profile'])
+    arguments['mode'] = Usage.SILENT
+    return OPERATIONS[job['operation']], arguments
+
+
+def run_job(index: int, job: dict) -> JobResult:
+    """Run the job and record the throughput of its renders into the result"""
+    start = time.perf_counter()
+    recorder = MetricsRecorder()
+    error = None
+    try:
+        with progress_events.subscribed(recorder), recorder.operation(job.get('operation')):
+            func, arguments = prepare_arguments(job)
+            func(**arguments)
+    except ffmpeg.Error as e:
+        lines = e.stderr.decode(errors='replace').strip().splitlines()[-1:] if e.stderr else []
+        error = ' '.join(['ffmpeg error', *lines])
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+    return JobResult(index, job.get('operation'), error is None,
+                     time.perf_counter() - start, error, recorder.metrics[0])
+
+
+def run_batch(jobs: list[dict],
+              workers: int = None,
+              on_result: Callable[[JobResult], None] = None,
+              metrics_path: str = None) -> list[JobResult]:
+    """
+    Run jobs on a pool of processes
+    :param jobs: jobs in the format of load_jobs
+    :param workers: number of processes, by default the number of CPUs
+    :param on_result: function called with the result of every job when it finishes
+    :param metrics_path: file to write the throughput samples and the summary
+     of every job to when it finishes, in the Prometheus text format for .prom
+     files and in JSON lines otherwise
+    :return: results of the jobs in the order of the jobs
+    """
+    # multiprocessing is loaded only by the batch command, not by every CLI start
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    workers = workers or os.cpu_count() or 1
+    writer = get_writer(metrics_path) if metrics_path is not None else None
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(jobs), 1))) as executor:
+        futures = {executor.submit(run_job, index, job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                # A crashed worker breaks the pool, the jobs which have not
+                # finished yet fail and the finished ones are kept
+                result = JobResult(index, jobs[index].get('operation'), False, 0.0,
+                                   'worker process crashed: {}'.format(e))
+            results.append(result)
+            if writer is not None and result.metrics is not None:
+                # The workers only record, so the file has a single writer
+                for sample in result.metrics.samples:
+                    writer.write_sample(sample)
+                writer.write_summary(summarize([result.metrics])[0])
+            if on_result is not None:
+                on_result(result)
+    return sorted(results, key=lambda result: result.index)
+
+
+def print_result(result: JobResult) -> None:
+    status = 'OK' if result.is_success else 'FAILED'
+    line = '[{}] job {} ({}) {:.2f}s'.format(status, result.index, result.operation, result.elapsed)
+    print(line if result.is_success else '{}: {}'.format(line, result.error), flush=True)
+
+
+def print_summary(results: list[JobResult], wall_time: float) -> None:
+    failed = [result for result in results if not result.is_success]
+    print('{} jobs, {} succeeded, {} failed, total job time {:.2f}s, wall time {:.2f}s'
+          .format(len(results), len(results) - len(failed), len(failed),
+                  sum(result.elapsed for result in results), wall_time))
+    for result in failed:
+        print('  job {} ({}): {}'.format(result.index, result.operation, result.error))
+    summaries = summarize([result.metrics for result in results if result.metrics is not None])
+    for summary in summaries:
+        print('  {}: {} jobs, {:.2f}s, {} frames, {}'
+              .format(summary.operation, summary.count, summary.wall_time, summary.frames,
+                      _format_throughput(summary)))
+
+
+def _format_throughput(summary: OperationSummary) -> str:
+    if summary.mean_fps is None:
+        return 'no throughput reported'
+    speed = '' if summary.mean_speed is None else ', {:.2f}x realtime'.format(summary.mean_speed)
+    return 'mean {:.1f} fps, p95 {:.1f} fps{}'.format(summary.mean_fps, summary.p95_fps, speed)
@@ -0,0 +1,413 @@
+from .utils import get_keyframes, get_video_duration, write_concat_list
+from .progress_bar import ProgressEvent, ProgressSink, read_progress, progress_events
+from .render_control import \
+    (CancellationToken, POLL_INTERVAL, run_with_control, check_render_limits, get_scope_token)
+from ffmpeg.nodes import get_stream_spec_nodes, InputNode, FilterNode
+from ffmpeg.dag import topo_sort
+from fractions import Fraction
+import subprocess
+import tempfile
+import queue
+import re
+import ffmpeg
+import time
+import sys
+import os
+
+# Chunks shorter than this are not worth a separate ffmpeg process
+MIN_CHUNK_DURATION = 10
+
+_EMPTY_OUTPUT_WARNING = b'Output file is empty'
+
+# MOV chunks get the constant frame rate of the MP4 output and can hold PCM audio
+_CHUNK_EXTENSION = '.mov'
+
+# The source is read a bit after the end of the chunk, so the chunk is cut
+# by output timestamps and not by the end of the input
+_INPUT_MARGIN = 1
+
+_FILTER_PATTERN = re.compile(r'^((?:\[[^\]]+\])+)(\w+)(?:=(.*?))?((?:\[[^\]]+\])*)$')
+
+
+def get_chunkable_source(out: ffmpeg.nodes.OutputStream) -> str:
+    """
+    The source video of the graph if the graph can be rendered in chunks:
+    it reads one video without seeking and does not concatenate several
+    parts. None otherwise
+    """
+    nodes, _ = topo_sort(get_stream_spec_nodes(out))
+    sources = set()
+    for node in nodes:
+        if isinstance(node, InputNode):
+            if set(node.kwargs) != {'filename'}:
+                return None
+            sources.add(node.kwargs['filename'])
+        elif isinstance(node, FilterNode) and node.name == 'concat' \
+                and node.kwargs.get('n', 1) > 1:
+            return None
+    return sources.pop() if len(sources) == 1 else None
+
+
+def plan_chunks(keyframes: list[float], video_duration: float, chunks: int) -> list[tuple[float, float]]:
+    """
+    Split the video into at most the given number of chunks starting at keyframes
+    :return: start and end of every chunk in seconds
+    """
+    chunks = min(chunks, int(video_duration // MIN_CHUNK_DURATION))
+    boundaries = [0]
+    for index in range(1, chunks):
+        target = video_duration * index / chunks
+        nearest = min(keyframes, key=lambda keyframe: abs(keyframe - target), default=0)
+        if nearest - boundaries[-1] >= MIN_CHUNK_DURATION / 2:
+            boundaries.append(nearest)
+    boundaries.append(video_duration)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def fix_start_pts(filter_complex: str) -> str:
+    """
+    Replace STARTPTS of setpts filters with the start of the whole render:
+    a chunk starts in the middle of the video, so its first frame is not the
+    first frame of the whole render. setpts may follow trim (its start is
+    known) or read the source directly (the start is zero)
+    :return: the changed filter graph or None if the start is unknown
+    """
+    filters = filter_complex.split(';')
+    producers = {}
+    for index, description in enumerate(filters):
+        match = _FILTER_PATTERN.match(description)
+        if match is None:
+            return None
+        for label in re.findall(r'\[([^\]]+)\]', match.group(4)):
+            producers[label] = index
+
+    for index, description in enumerate(filters):
+        inputs, name, arguments, outputs = _FILTER_PATTERN.match(description).groups()
+        if name not in ('setpts', 'asetpts') or 'STARTPTS' not in (arguments or ''):
+            continue
+        label = inputs[1:-1]
+        if label not in producers:
+            start = 0
+        else:
+            _, producer, producer_arguments, _ = \
+                _FILTER_PATTERN.match(filters[producers[label]]).groups()
+            if producer not in ('trim', 'atrim'):
+                return None
+            options = dict(option.split('=', 1)
+                           for option in (producer_arguments or '').split(':') if '=' in option)
+            if set(options) - {'start', 'end', 'duration'}:
+                return None
+            start = options.get('start', 0)
+        filters[index] = '{}{}={}{}'.format(
+            inputs, name, arguments.replace('STARTPTS', '({})/TB'.format(start)), outputs
+        )
+    return ';'.join(filters)
+
+
+def _get_chunk_args(args: list[str], source: str, output_path: str,
+                    start: float, duration: float, output_args: list[str]) -> list[str]:
+    """
+    Command of the whole render changed to read the part of the source and to
+    write into another output. Input timestamps are kept (-copyts), so
+    time-dependent filters (trim, fade, setpts with fixed start) see the same
+    times as in the whole render
+    :param output_args: options and path of the new output
+    """
+    chunk_args = [args[0], '-copyts']
+    for index, arg in enumerate(args[1:], start=1):
+        if arg == '-i' and args[index + 1] == source:
+            chunk_args.extend(['-ss', str(start)])
+            if duration is not None:
+                chunk_args.extend(['-t', str(duration)])
+        if args[index - 1] == '-filter_complex':
+            arg = fix_start_pts(arg)
+        if arg == output_path and index == len(args) - 1 - args[::-1].index(output_path):
+            chunk_args.extend(output_args)
+            continue
+        chunk_args.append(arg)
+    return chunk_args
+
+
+class _ChunkWatch:
+    """
+    Cancellation, timeout and stall checks of the whole chunked render. The
+    progress of the chunks rendered at the same time is reported to the sinks
+    and to progress_events as the progress of one render
+    """
+
+    def __init__(
+            self,
+            cancel_token: CancellationToken,
+            timeout: float,
+            stall_timeout: float,
+            sinks: list[ProgressSink]
+    ):
+        self.cancel_token = cancel_token if cancel_token is not None else get_scope_token()
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.sinks = sinks
+        # Duration of an output frame, found with the cut points. ffmpeg
+        # reports no usable output time for chunks with -copyts, so the
+        # output time is counted by the frames
+        self.frame_duration = None
+        self.start = self.last_advance = time.monotonic()
+        self._written = None
+        self.out_time_us = None
+
+    def restart_stall_check(self) -> None:
+        """The next step of the render starts, its output starts from zero"""
+        self.last_advance = time.monotonic()
+        self._written = None
+
+    def get_remaining_time(self) -> float:
+        if self.timeout is None:
+            return None
+        return max(self.timeout - (time.monotonic() - self.start), 0)
+
+    def check(self) -> None:
+        check_render_limits(self.cancel_token, self.timeout, self.stall_timeout,
+                            self.start, self.last_advance)
+
+    def update(self, events: list[ProgressEvent], is_reported: bool) -> None:
+        """
+        :param events: the last progress of every process, None if it has not started yet
+        :param is_reported: report the progress to the sinks, otherwise it is only checked
+        """
+        started = [event for event in events if event is not None]
+        frames = sum(event.frame or 0 for event in started)
+        total_size = sum(event.total_size or 0 for event in started)
+        if (frames, total_size) != self._written:
+            self._written = (frames, total_size)
+            self.last_advance = time.monotonic()
+        if not is_reported or not started:
+            return
+
+        if self.frame_duration is not None:
+            self.out_time_us = round(frames * self.frame_duration * 1_000_000)
+        running = [event for event in started if not event.is_end]
+        self._emit(ProgressEvent(
+            frame=frames,
+            fps=sum(event.fps or 0 for event in running),
+            out_time_us=self.out_time_us,
+            speed=sum(event.speed or 0 for event in running),
+            bitrate=None,
+            total_size=total_size,
+            is_end=False
+        ))
+
+    def end(self) -> None:
+        self._emit(ProgressEvent(None, None, self.out_time_us, None, None, None, True))
+
+    def _emit(self, event: ProgressEvent) -> None:
+        for sink in self.sinks:
+            sink(event)
+        progress_events.emit(event)
+
+
+def _run_in_parallel(commands: list[list[str]], log_paths: list[str], workers: int,
+                     watch: _ChunkWatch, is_reported: bool = False) -> None:
+    """
+    Run ffmpeg processes, at most the given number at the same time. The logs
+    go to files, so the processes never wait for a full pipe. The progress of
+    the processes is read from their stdout and checked by the watch
+    :param is_reported: report the progress to the sinks of the watch
+    """
+    pending = list(enumerate(zip(commands, log_paths)))
+    running = {}
+    last_events = [None] * len(commands)
+
+    def read_events(index: int, events: queue.Queue) -> None:
+        while not events.empty():
+            event = events.get_nowait()
+            if event is not None:
+                last_events[index] = event
+
+    watch.restart_stall_check()
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                index, (command, log_path) = pending.pop(0)
+                with open(log_path, 'wb') as log:
+                    process = subprocess.Popen([command[0], '-progress', 'pipe:1', *command[1:]],
+                                               stdin=subprocess.DEVNULL,
+                                               stdout=subprocess.PIPE, stderr=log)
+                events = queue.Queue()
+                running[process] = (index, log_path, events, read_progress(process.stdout, events))
+            for process in list(running):
+                index, log_path, events, reader = running[process]
+                if process.poll() is not None:
+                    # ffmpeg closes the progress pipe on exit
+                    reader.join()
+                    process.stdout.close()
+                    del running[process]
+                    if process.returncode != 0:
+                        with open(log_path, 'rb') as log:
+                            raise ffmpeg.Error('ffmpeg', b'', log.read())
+                read_events(index, events)
+            watch.update(last_events, is_reported)
+            watch.check()
+            time.sleep(POLL_INTERVAL / 2)
+    finally:
+        for process, (_, _, _, reader) in running.items():
+            process.kill()
+            process.wait()
+            reader.join()
+            process.stdout.close()
+
+
+def _read_first_frame(framemd5_path: str) -> tuple[int, Fraction]:
+    """
+    Timestamp and time base of the first video frame in framemd5 file, None if
+    there are no frames
+    """
+    time_bases = {}
+    video_streams = set()
+    with open(framemd5_path) as file:
+        for line in file:
+            if line.startswith('#tb '):
+                stream, time_base = line[4:].split(':')
+                time_bases[stream] = Fraction(time_base.strip())
+            elif line.startswith('#media_type ') and line.split(':')[1].strip() == 'video':
+                video_streams.add(line[12:].split(':')[0])
+            elif not line.startswith('#'):
+                stream, _, pts = [value.strip() for value in line.split(',')[:3]]
+                if stream in video_streams:
+                    return int(pts), time_bases[stream]
+    return None
+
+
+def _find_cut_points(args: list[str], source: str, output_path: str,
+                     starts: list[float], tmpdir: str, workers: int,
+                     watch: _ChunkWatch) -> list[tuple]:
+    """
+    Render the first frame from every start of the chunks. A chunk has to end
+    exactly where the next chunk starts, otherwise the frame rate conversion
+    at the end of the chunk repeats frames of the next one
+    :return: for every start the output time of its first frame and its
+     number in the output, None if no frames are rendered after the start
+    """
+    modes = ['passthrough', 'cfr']
+    framemd5_paths = {
+        (index, mode): os.path.join(tmpdir, 'cut{}_{}.framemd5'.format(index, mode))
+        for index in range(len(starts)) for mode in modes
+    }
+    commands = [
+        _get_chunk_args(args, source, output_path, starts[index], None,
+                        ['-frames:v', '1', '-fps_mode', mode, '-vcodec', 'rawvideo',
+                         '-acodec', 'pcm_s16le', '-f', 'framemd5', path])
+        for (index, mode), path in framemd5_paths.items()
+    ]
+    _run_in_parallel(commands, [path + '.log' for path in framemd5_paths.values()], workers, watch)
+
+    cut_points = []
+    for index in range(len(starts)):
+        first_frames = [_read_first_frame(framemd5_paths[index, mode]) for mode in modes]
+        if None in first_frames:
+            cut_points.append(None)
+            continue
+        pts, time_base = first_frames[0]
+        cut_time = pts * time_base
+        # Constant frame rate output has time base 1 / frame rate and puts
+        # the first frame into the nearest slot
+        frame_number = int(cut_time / first_frames[1][1] + Fraction(1, 2))
+        watch.frame_duration = first_frames[1][1]
+        cut_points.append((float(cut_time), frame_number))
+    return cut_points
+
+
+def render_in_chunks(
+        out: ffmpeg.nodes.OutputStream,
+        output_path: str,
+        chunks: int,
+        is_overwrite: bool = False,
+        workers: int = None,
+        cancel_token: CancellationToken = None,
+        timeout: float = None,
+        stall_timeout: float = None,
+        sinks: list[ProgressSink] = ()
+) -> bool:
+    """
+    Render the graph in chunks split at keyframes of the source video, every
+    chunk in a separate ffmpeg process, and join the chunks without re-encoding
+    the video. Audio of the chunks is kept as PCM and encoded once while
+    joining, so there are no gaps of encoder delay between the chunks
+    :param out: the output of the graph
+    :param output_path: the path of the output
+    :param chunks: the maximum number of chunks
+    :param is_overwrite: overwrites the video even if there is already a video in the save path
+    :param workers: the number of ffmpeg processes running at the same time, by
+     default the number of chunks
+    :param cancel_token: the token cancelling the render, by default the
+     token of the cancellation scope
+    :param timeout: the maximum duration of the whole render in seconds
+    :param stall_timeout: the maximum time in seconds without new output
+     frames of any chunk (see run_with_control)
+    :param sinks: functions receiving the progress of the chunks as the
+     progress of one render
+    :return: False if the graph can not be rendered in chunks and nothing was saved
+    """
+    source = get_chunkable_source(out)
+    if source is None:
+        return False
+    args = out.compile(overwrite_output=True)
+    if '-filter_complex' in args and fix_start_pts(args[args.index('-filter_complex') + 1]) is None:
+        return False
+    chunk_intervals = plan_chunks(get_keyframes(source), get_video_duration(source), chunks)
+    if len(chunk_intervals) < 2:
+        return False
+
+    workers = workers or len(chunk_intervals)
+    watch = _ChunkWatch(cancel_token, timeout, stall_timeout, sinks)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        starts = [start for start, _ in chunk_intervals]
+        cut_points = _find_cut_points(args, source, output_path, starts, tmpdir, workers, watch)
+        if None in cut_points[1:]:
+            starts = starts[:cut_points.index(None, 1)]
+            if len(starts) < 2:
+                return False
+        ends = [end for _, end in chunk_intervals]
+
+        chunk_paths = [os.path.join(tmpdir, 'chunk{}{}'.format(index, _CHUNK_EXTENSION))
+                       for index in range(len(starts))]
+        commands = []
+        for index, (start, chunk_path) in enumerate(zip(starts, chunk_paths)):
+            if index == len(starts) - 1:
+                commands.append(_get_chunk_args(args, source, output_path, start, None,
+                                                ['-acodec', 'pcm_s16le', chunk_path]))
+                continue
+            cut_time, frame_number = cut_points[index + 1]
+            output_args = ['-to', str(cut_time), '-acodec', 'pcm_s16le', chunk_path]
+            if cut_points[index] is not None:
+                # The frame just before the cut may fall into the slot of the
+                # first frame of the next chunk
+                frame_count = frame_number - cut_points[index][1]
+                output_args = ['-frames:v', str(frame_count), *output_args]
+            commands.append(_get_chunk_args(args, source, output_path, start,
+                                            ends[index] - start + _INPUT_MARGIN, output_args))
+        log_paths = [path + '.log' for path in chunk_paths]
+        _run_in_parallel(commands, log_paths, workers, watch, is_reported=True)
+
+        not_empty_paths = []
+        for chunk_path, log_path in zip(chunk_paths, log_paths):
+            with open(log_path, 'rb') as log:
+                if _EMPTY_OUTPUT_WARNING not in log.read():
+                    not_empty_paths.append(chunk_path)
+        # Chunks keep the timestamps of the whole render, so the offset of the
+        # next chunk is the difference of start times, not the chunk duration
+        # (video and audio of a chunk do not end at the same time)
+        start_times = [float(ffmpeg.probe(path)['format']['start_time']) for path in not_empty_paths]
+        concat_list_path = write_concat_list(
+            not_empty_paths, os.path.join(tmpdir, 'chunks.txt'),
+            [next_start - start for start, next_start in zip(start_times, start_times[1:])]
+        )
+        out = (ffmpeg
+               .input(concat_list_path, f='concat', safe=0)
+               .output(output_path, vcodec='copy', acodec='aac'))
+        try:
+            run_with_control(out, is_overwrite, watch.cancel_token,
+                             watch.get_remaining_time(), stall_timeout)
+        except ffmpeg.Error as e:
+            print(e.stderr.decode(), file=sys.stderr)
+            raise e
+    watch.end()
+    return True
@@ -0,0 +1,53 @@
+from collections import namedtuple
+
+
+class EncodingProfile(namedtuple(
+    'EncodingProfile',
+    ['vcodec', 'preset', 'crf', 'bitrate', 'threads', 'gop_size', 'pix_fmt'],
+    defaults=['libx264', None, None, None, None, None, None]
+)):
+    """
+    Settings of the video encoder. Options set to None are left to ffmpeg
+    :param vcodec: ffmpeg video encoder
+    :param preset: encoder preset, speed against compression
+    :param crf: constant quality, can not be set together with bitrate
+    :param bitrate: target bitrate, for example '4M'
+    :param threads: number of encoder threads, 0 means automatic
+    :param gop_size: maximum distance between keyframes in frames
+    :param pix_fmt: pixel format of the result
+    """
+
+    def __new__(cls, *args, **kwargs):
+        profile = super().__new__(cls, *args, **kwargs)
+        if profile.crf is not None and profile.bitrate is not None:
+            raise ValueError('Encoding profile can have either crf or bitrate, not both')
+        return profile
+
+    def get_output_kwargs(self) -> dict:
+        """Options of ffmpeg output for the encoder"""
+        options = {
+            'vcodec': self.vcodec,
+            'preset': self.preset,
+            'crf': self.crf,
+            'b:v': self.bitrate,
+            'threads': self.threads,
+            'g': self.gop_size,
+            'pix_fmt': self.pix_fmt,
+        }
+        return {key: value for key, value in options.items() if value is not None}
+
+
+PROFILES = {
+    # Fast preview of intermediate edits
+    'draft': EncodingProfile(preset='ultrafast', crf=28, threads=0, pix_fmt='yuv420p'),
+    'balanced': EncodingProfile(preset='medium', crf=23, threads=0, pix_fmt='yuv420p'),
+    # Final export: visually lossless, keyframes at most 250 frames apart for seeking
+    'archive': EncodingProfile(preset='slow', crf=18, threads=0, gop_size=250, pix_fmt='yuv420p'),
+}
+
+
+def get_profile(name: str) -> EncodingProfile:
+    if name not in PROFILES:
+        raise ValueError('Unknown encoding profile {}, available: {}'
+                         .format(name, ', '.join(PROFILES)))
+    return PROFILES[name]
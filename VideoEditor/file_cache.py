@@ -0,0 +1,91 @@
+from .utils import link_or_copy
+import threading
+import shutil
+import os
+
+
+class FileCache:
+    """
+    On-disk cache of files named by their keys. The modification time of a
+    file is its last use, when the files take more than max_bytes the least
+    recently used ones are removed
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, suffix: str = ''):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_key_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def lookup_key(self, key: str):
+        """Path of the cached file, None if there is no file with the key"""
+        path = self.get_key_path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put_file(self, key: str, file_path: str, is_linked: bool = False) -> str:
+        """
+        Copy the file into the cache, call evict after the puts
+        :param is_linked: hard link the file instead of copying when both are
+         on the same file system, the file should not be changed in place then
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.get_key_path(key)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        if is_linked:
+            link_or_copy(file_path, temp_path)
+        else:
+            shutil.copyfile(file_path, temp_path)
+        os.replace(temp_path, path)
+        return path
+
+    def evict(self, keep: set[str] = frozenset()) -> None:
+        """Remove the least recently used files above the size limit"""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        files = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
@@ -0,0 +1,172 @@
+from .frames import FrameReader, FrameWriter, check_pixel_format
+from .encoding_profile import EncodingProfile
+from .video_editor import FilterableStream
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from typing import Union
+import numpy as np
+import ffmpeg
+import importlib
+import os
+
+# Frames sent to a worker at once
+BATCH_FRAMES = 8
+# Batches in flight per worker: one filtered, one waiting in the queue
+SLOTS_PER_WORKER = 2
+
+# Shared memory blocks attached by a worker process, by name
+_attached_blocks = {}
+
+
+class FrameFilter(namedtuple(
+    'FrameFilter',
+    ['function', 'workers', 'batch_frames', 'pix_fmt'],
+    defaults=[None, BATCH_FRAMES, 'rgb24']
+)):
+    """
+    Python function applied to the decoded frames in a pool of processes
+    :param function: takes a batch of frames, an array (N, height, width,
+     channels) of uint8, and returns the filtered batch of the same shape or
+     changes it in place and returns None. It runs in other processes, so it
+     should be importable: a function of a module, not a lambda
+    :param workers: number of the worker processes, by default the number of CPUs
+    :param batch_frames: frames sent to a worker at once
+    :param pix_fmt: format of the frames, one of PIXEL_FORMATS
+    """
+
+    def __new__(cls, *args, **kwargs):
+        frame_filter = super().__new__(cls, *args, **kwargs)
+        if frame_filter.batch_frames < 1:
+            raise ValueError('Batch should have at least one frame, but given {}'
+                             .format(frame_filter.batch_frames))
+        check_pixel_format(frame_filter.pix_fmt)
+        return frame_filter
+
+    def get_workers(self) -> int:
+        return self.workers or os.cpu_count() or 1
+
+
+def load_function(name: str) -> callable:
+    """Function by its name 'package.module:function'"""
+    module_name, _, function_name = name.partition(':')
+    if not module_name or not function_name:
+        raise ValueError('Frame filter should be given as module:function, but given {}'.format(name))
+    function = getattr(importlib.import_module(module_name), function_name)
+    if not callable(function):
+        raise ValueError('{} is not a function'.format(name))
+    return function
+
+
+def _start_worker() -> None:
+    pass
+
+
+def _filter_batch(function: callable, name: str, shape: tuple[int, ...], count: int) -> None:
+    """Run the function in a worker on the frames of the shared memory block"""
+    if name not in _attached_blocks:
+        _attached_blocks[name] = shared_memory.SharedMemory(name)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=_attached_blocks[name].buf)[:count]
+    result = function(frames)
+    if result is not None and result is not frames:
+        frames[...] = result
+
+
+def filter_and_save(
+        video: Union[ffmpeg.Stream, ffmpeg.nodes.Node, FilterableStream],
+        output_path: str,
+        frame_filter: FrameFilter,
+        is_overwrite: bool = False,
+        profile: EncodingProfile = None
+) -> int:
+    """
+    Render the video stream of the graph to raw frames, filter them and
+    encode them with the audio stream of the graph. The graph runs in two
+    ffmpeg processes: one decodes the video, the other the audio
+    :return: number of the frames
+    """
+    if isinstance(video, ffmpeg.Stream):
+        video_stream, audio_stream = video.video, video.audio
+    elif isinstance(video, FilterableStream):
+        video_stream, audio_stream = video.video, video.audio
+    elif isinstance(video, ffmpeg.nodes.Node):
+        video_stream, audio_stream = video[0], video[1]
+    else:
+        raise ValueError(f'{type(video)} can not save')
+
+    def make_writer(reader: FrameReader) -> FrameWriter:
+        return FrameWriter(output_path, reader.width, reader.height, reader.fps, frame_filter.pix_fmt,
+                           is_overwrite=is_overwrite, profile=profile, audio_stream=audio_stream)
+
+    return run_frame_filter(FrameReader(video_stream, pix_fmt=frame_filter.pix_fmt),
+                            make_writer, frame_filter)
+
+
+def run_frame_filter(reader: FrameReader, writer_factory: callable, frame_filter: FrameFilter) -> int:
+    """
+    Filter all frames of the reader and write them in their order. The reader
+    reads the batches straight into blocks of shared memory, the workers
+    filter them in place and the writer writes them without copying. Up to
+    SLOTS_PER_WORKER batches per worker are in flight, so the reading, the
+    filtering and the writing overlap
+    :param reader: reader of the frames, not opened yet
+    :param writer_factory: makes the writer of the frames from the opened
+     reader, the size of the frames of a stream is known only then
+    :param frame_filter: the function and the parameters of the pool
+    :return: number of the frames
+    """
+    workers = frame_filter.get_workers()
+    # The workers share the resource tracker of this process, their own ones
+    # would remove the shared memory when they exit
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(workers) as pool:
+        # The workers start before the pipes of ffmpeg are opened, forked
+        # processes would hold the pipes open otherwise
+        pool.submit(_start_worker).result()
+        blocks = []
+        slots = []
+        try:
+            with reader:
+                shape = (frame_filter.batch_frames, *reader.shape)
+                for _ in range(workers * SLOTS_PER_WORKER):
+                    blocks.append(shared_memory.SharedMemory(create=True, size=int(np.prod(shape))))
+                    slots.append(np.ndarray(shape, dtype=np.uint8, buffer=blocks[-1].buf))
+                with writer_factory(reader) as writer:
+                    _run_batches(reader, writer, pool, frame_filter.function, blocks, slots)
+                return writer.frame_count
+        finally:
+            slots.clear()
+            for block in blocks:
+                try:
+                    block.close()
+                except BufferError:
+                    # A traceback still refers to a frame, the memory is
+                    # unmapped when it is collected
+                    pass
+                block.unlink()
+
+
+def _run_batches(reader: FrameReader, writer: FrameWriter, pool: ProcessPoolExecutor,
+                 function: callable, blocks: list, slots: list[np.ndarray]) -> None:
+    free = deque(range(len(slots)))
+    pending = deque()
+    is_finished = False
+    while not is_finished or pending:
+        while free and not is_finished:
+            slot = free.popleft()
+            count = 0
+            while count < len(slots[slot]) and reader.read_into(slots[slot][count]):
+                count += 1
+            is_finished = count < len(slots[slot])
+            if count:
+                pending.append((slot, count, pool.submit(
+                    _filter_batch, function, blocks[slot].name, slots[slot].shape, count)))
+            else:
+                free.append(slot)
+        if pending:
+            # The oldest batch is written first, so the order is kept
+            slot, count, future = pending.popleft()
+            future.result()
+            for frame in slots[slot][:count]:
+                writer.write(frame)
+            free.append(slot)
@@ -0,0 +1,358 @@
+from .utils import check_paths_correctness, get_information_about_stream, read_chunk
+from .merge_plan import parse_ratio
+from .encoding_profile import EncodingProfile
+from .video_editor import TimeInterval, prepare_output_path
+from fractions import Fraction
+from typing import Iterator, Union
+import numpy as np
+import collections
+import subprocess
+import threading
+import tempfile
+import ffmpeg
+import re
+import os
+
+# Bytes per pixel of the packed formats the frames can have
+PIXEL_FORMATS = {'rgb24': 3, 'bgr24': 3, 'rgba': 4, 'bgra': 4, 'gray': 1}
+# Frames a reader keeps before it reuses the buffer of a frame
+RING_SIZE = 4
+# Last lines of the log of ffmpeg kept for its errors
+LOG_LINES = 50
+
+
+def check_pixel_format(pix_fmt: str) -> None:
+    if pix_fmt not in PIXEL_FORMATS:
+        raise ValueError('Pixel format {} is not one of {}'.format(pix_fmt, ', '.join(PIXEL_FORMATS)))
+
+
+def get_frame_shape(width: int, height: int, pix_fmt: str) -> tuple[int, ...]:
+    """Shape of a frame array, gray frames have no channel axis"""
+    check_pixel_format(pix_fmt)
+    channels = PIXEL_FORMATS[pix_fmt]
+    return (height, width) if channels == 1 else (height, width, channels)
+
+
+def get_frame_size(video_path: str, width: int = None, height: int = None) -> tuple[int, int]:
+    """
+    Size of the frames of the video scaled to the width and the height. When
+    only one of them is set, the other keeps the aspect ratio and is even
+    """
+    if width is not None and height is not None:
+        return width, height
+    information = get_information_about_stream(video_path, 'video')
+    source_width, source_height = int(information['width']), int(information['height'])
+    if width is not None:
+        return width, max(round(source_height * width / source_width / 2) * 2, 2)
+    if height is not None:
+        return max(round(source_width * height / source_height / 2) * 2, 2), height
+    return source_width, source_height
+
+
+class FrameReader:
+    """
+    Decoded frames of the first video stream as NumPy arrays. The frames are
+    read from the rawvideo pipe of ffmpeg straight into a preallocated ring
+    of ring_size buffers, so nothing is allocated per frame. A frame stays
+    valid until ring_size more frames are read, copy it to keep it longer.
+
+    with FrameReader(path, TimeInterval(10, 20), width=640) as reader:
+        for frame in reader:
+            ...
+    """
+
+    def __init__(
+            self,
+            video: Union[str, ffmpeg.nodes.FilterableStream],
+            time_interval: TimeInterval = None,
+            width: int = None,
+            height: int = None,
+            fps: Union[int, str, Fraction] = None,
+            pix_fmt: str = 'rgb24',
+            ring_size: int = RING_SIZE,
+            **kwargs
+    ):
+        """
+        :param video: the absolute path to the video or a video stream of a
+         filter graph. The size and the frame rate of a stream are known only
+         after open, they are read from the log of ffmpeg
+        :param time_interval: read only the frames of this interval of the file
+        :param width: width of the frames, by default the width of the video
+        :param height: height of the frames, by default the height of the video
+        :param fps: frame rate of the frames, by default every decoded frame is read
+        :param pix_fmt: one of PIXEL_FORMATS
+        :param ring_size: number of the reused buffers
+        :param kwargs: options of the ffmpeg input of the file as in open_videos
+        """
+        if ring_size < 1:
+            raise ValueError('Ring of the frames should have at least one buffer, but given {}'
+                             .format(ring_size))
+        check_pixel_format(pix_fmt)
+        self.width, self.height, self.fps = width, height, parse_ratio(fps)
+        self.pix_fmt = pix_fmt
+        self.frame_count = 0
+        self._ring_size = ring_size
+
+        if isinstance(video, str):
+            check_paths_correctness(video)
+            self.width, self.height = get_frame_size(video, width, height)
+            if fps is None:
+                self.fps = parse_ratio(get_information_about_stream(video, 'video')['avg_frame_rate'])
+            if time_interval is not None:
+                kwargs.update(ss=time_interval.begin, t=time_interval.get_duration_in_seconds())
+            video = ffmpeg.input(video, **kwargs).video
+        elif time_interval is not None or kwargs:
+            raise ValueError('Time interval and input options are only for files, '
+                             'trim the stream in its graph instead')
+
+        output_kwargs = {'f': 'rawvideo', 'pix_fmt': pix_fmt}
+        if fps is not None:
+            video = video.filter('fps', str(self.fps))
+        elif self.fps is not None:
+            output_kwargs['fps_mode'] = 'passthrough'
+        # Otherwise the frames of a stream get the constant frame rate of its log
+        if self.width is not None and self.height is not None:
+            video = video.filter('scale', self.width, self.height)
+        # The header of the output is logged at the info level
+        is_header_needed = self.width is None or self.height is None or self.fps is None
+        self._args = (video
+                      .output('pipe:', **output_kwargs)
+                      .global_args('-hide_banner', '-nostats', '-nostdin',
+                                   '-v', 'info' if is_header_needed else 'error')
+                      .compile())
+        self._ring = None
+        self._buffers = None
+        self._process = None
+        self._log = collections.deque(maxlen=LOG_LINES)
+        self._log_reader = None
+        self._header = threading.Event()
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return get_frame_shape(self.width, self.height, self.pix_fmt)
+
+    def __enter__(self) -> 'FrameReader':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """Start ffmpeg, for a stream wait until its size is known"""
+        if self._process is not None:
+            return
+        self._header.clear()
+        self._log.clear()
+        self._process = subprocess.Popen(self._args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._log_reader = threading.Thread(target=self._read_log, daemon=True)
+        self._log_reader.start()
+        if self.width is None or self.height is None or self.fps is None:
+            self._header.wait()
+            if self.width is None or self.height is None:
+                self._finish()
+                raise ValueError('Size of the frames is unknown:\n{}'.format(''.join(self._log)))
+        if self._ring is None:
+            self._ring = np.empty((self._ring_size, *self.shape), dtype=np.uint8)
+            self._buffers = [memoryview(frame).cast('B') for frame in self._ring]
+
+    def _read_log(self) -> None:
+        """Keep the end of the log for errors and take the size from the output header"""
+        is_output = False
+        for line in self._process.stderr:
+            text = line.decode(errors='replace')
+            self._log.append(text)
+            if text.startswith('Output #0'):
+                is_output = True
+            elif is_output and not self._header.is_set() and 'Video: rawvideo' in text:
+                size = re.search(r', (\d+)x(\d+)\b', text)
+                if size is not None and (self.width is None or self.height is None):
+                    self.width, self.height = int(size.group(1)), int(size.group(2))
+                rate = re.search(r', ([\d.]+) fps\b', text)
+                if rate is not None and self.fps is None:
+                    self.fps = _parse_logged_fps(rate.group(1))
+                self._header.set()
+        self._header.set()
+
+    def read_into(self, frame: np.ndarray) -> bool:
+        """
+        Read the next frame into the contiguous array of the frame shape
+        :return: False after the last frame
+        """
+        self.open()
+        buffer = memoryview(frame).cast('B')
+        if read_chunk(self._process.stdout, buffer) < len(buffer):
+            self._finish()
+            return False
+        self.frame_count += 1
+        return True
+
+    def read(self) -> Union[np.ndarray, None]:
+        """The next frame in the ring, None after the last one"""
+        self.open()
+        frame = self._ring[self.frame_count % len(self._ring)]
+        return frame if self.read_into(frame) else None
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while (frame := self.read()) is not None:
+            yield frame
+
+    def _finish(self) -> None:
+        """Wait for ffmpeg after the last frame and raise its error"""
+        returncode = self._process.wait()
+        self._log_reader.join()
+        if returncode != 0:
+            error = ''.join(self._log).encode()
+            self.close()
+            raise ffmpeg.Error('ffmpeg', b'', error)
+
+    def close(self) -> None:
+        """Stop ffmpeg if the frames are not read to the end"""
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._log_reader.join()
+        self._process.stdout.close()
+        self._process.stderr.close()
+        self._process = None
+
+
+def _parse_logged_fps(value: str) -> Fraction:
+    """Frame rate rounded in the log of ffmpeg, 29.97 is 30000/1001"""
+    rate = float(value.removesuffix('k')) * (1000 if value.endswith('k') else 1)
+    ntsc_rate = round(rate * 1.001)
+    if rate != int(rate) and abs(ntsc_rate / 1.001 - rate) < 0.005:
+        return Fraction(ntsc_rate * 1000, 1001)
+    return Fraction(rate).limit_denominator(1000)
+
+
+class FrameWriter:
+    """
+    Encoder of frames given as NumPy arrays, they are written to the stdin of
+    ffmpeg without copying. The audio of a video, for example of the one the
+    frames were read from, can be added to the result.
+
+    with FrameWriter(output, reader.width, reader.height, reader.fps,
+                     audio_path=path, time_interval=interval) as writer:
+        for frame in reader:
+            writer.write(frame)
+    """
+
+    def __init__(
+            self,
+            output_path: str,
+            width: int,
+            height: int,
+            fps: Union[int, str, Fraction],
+            pix_fmt: str = 'rgb24',
+            audio_path: str = None,
+            time_interval: TimeInterval = None,
+            is_overwrite: bool = False,
+            profile: EncodingProfile = None,
+            audio_stream: ffmpeg.nodes.FilterableStream = None
+    ):
+        """
+        :param output_path: the absolute path to the result video
+        :param width: width of the frames
+        :param height: height of the frames
+        :param fps: frame rate of the result
+        :param pix_fmt: one of PIXEL_FORMATS, the format of the frames
+        :param audio_path: the absolute path to the video whose audio is added
+        :param time_interval: only the audio of this interval is added
+        :param is_overwrite: overwrites the video even if there is already a video in the save path
+        :param profile: settings of the video encoder, by default the ffmpeg
+         defaults with yuv420p pixels
+        :param audio_stream: audio stream of a filter graph added instead of audio_path
+        """
+        self.output_path = prepare_output_path(output_path)
+        self.shape = get_frame_shape(width, height, pix_fmt)
+        self.frame_count = 0
+        self._is_partial_result = is_overwrite or not os.path.exists(self.output_path)
+
+        streams = [ffmpeg.input('pipe:', f='rawvideo', pix_fmt=pix_fmt,
+                                s='{}x{}'.format(width, height), framerate=str(parse_ratio(fps)))]
+        if audio_stream is not None:
+            streams.append(audio_stream)
+        elif audio_path is not None:
+            check_paths_correctness(audio_path)
+            audio_kwargs = {}
+            if time_interval is not None:
+                audio_kwargs.update(ss=time_interval.begin, t=time_interval.get_duration_in_seconds())
+            streams.append(ffmpeg.input(audio_path, **audio_kwargs).audio)
+        output_kwargs = {'pix_fmt': 'yuv420p'}
+        if profile is not None:
+            output_kwargs.update(profile.get_output_kwargs())
+        # Without -n ffmpeg would ask about overwriting on stdin, where the frames are
+        self._args = (ffmpeg
+                      .output(*streams, self.output_path, **output_kwargs)
+                      .global_args('-v', 'error', *(() if is_overwrite else ('-n',)))
+                      .compile(overwrite_output=is_overwrite))
+        self._process = None
+        self._log = None
+
+    def __enter__(self) -> 'FrameWriter':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self) -> None:
+        if self._process is not None:
+            return
+        self._log = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(self._args, stdin=subprocess.PIPE,
+                                         stdout=subprocess.DEVNULL, stderr=self._log)
+
+    def write(self, frame: np.ndarray) -> None:
+        if frame.shape != self.shape or frame.dtype != np.uint8:
+            raise ValueError('Frame of shape {} and type {} instead of {} uint8'
+                             .format(frame.shape, frame.dtype, self.shape))
+        self.open()
+        try:
+            self._process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+        except BrokenPipeError:
+            # ffmpeg has stopped, its error explains why
+            self.close()
+            raise
+        self.frame_count += 1
+
+    def close(self) -> None:
+        """Finish the video, the partial result is removed if ffmpeg fails"""
+        if self._process is None:
+            return
+        self._close_stdin()
+        returncode = self._process.wait()
+        self._log.seek(0)
+        error = self._log.read()
+        self._log.close()
+        self._process = None
+        if returncode != 0:
+            self._remove_partial_result()
+            raise ffmpeg.Error('ffmpeg', b'', error)
+
+    def abort(self) -> None:
+        """Stop ffmpeg and remove the partial result"""
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.wait()
+        self._close_stdin()
+        self._log.close()
+        self._process = None
+        self._remove_partial_result()
+
+    def _close_stdin(self) -> None:
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def _remove_partial_result(self) -> None:
+        if self._is_partial_result and os.path.exists(self.output_path):
+            os.remove(self.output_path)
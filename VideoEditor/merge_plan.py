@@ -0,0 +1,142 @@
+from .utils import get_information_about_stream
+from collections import namedtuple
+from fractions import Fraction
+from typing import Union
+import ffmpeg
+
+# Length of the fades between the merged videos when transitions are requested
+TRANSITION_DURATION = 0.25
+
+
+class StreamParameters(namedtuple('StreamParameters', ['width', 'height', 'fps', 'sar', 'pix_fmt'])):
+    """
+    Parameters of a video stream which the merge makes equal. None is unknown
+    :param width: width of the frame
+    :param height: height of the frame
+    :param fps: frame rate as Fraction
+    :param sar: sample aspect ratio as Fraction
+    :param pix_fmt: name of the pixel format
+    """
+    pass
+
+
+def parse_ratio(value: Union[str, int, float, Fraction, None]) -> Union[Fraction, None]:
+    """Fraction of 'num/den', 'num:den' or a number, None for unknown (0/0) values"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        numerator, _, denominator = value.replace(':', '/').partition('/')
+        if int(denominator or 1) == 0:
+            return None
+        return Fraction(int(numerator), int(denominator or 1))
+    return Fraction(value)
+
+
+def _parse_sar(value) -> Fraction:
+    # ffmpeg reports an unset SAR as 0:1 and treats it as square pixels
+    sar = parse_ratio(value)
+    return Fraction(1) if not sar else sar
+
+
+def probe_stream_parameters(video: ffmpeg.nodes.Stream) -> Union[StreamParameters, None]:
+    """
+    Parameters of the video stream if it is read directly from a file, None
+    for filtered streams and special inputs, whose parameters are unknown
+    """
+    node = getattr(video, 'node', None)
+    if not isinstance(node, ffmpeg.nodes.InputNode) or 'f' in node.kwargs \
+            or not isinstance(node.kwargs.get('filename'), str):
+        return None
+    stream = get_information_about_stream(node.kwargs['filename'], 'video')
+    return StreamParameters(
+        width=int(stream['width']),
+        height=int(stream['height']),
+        fps=parse_ratio(stream.get('avg_frame_rate')),
+        sar=_parse_sar(stream.get('sample_aspect_ratio')),
+        pix_fmt=stream.get('pix_fmt'),
+    )
+
+
+def get_target_parameters(
+        first: Union[StreamParameters, None],
+        width: int = None,
+        height: int = None,
+        fps: Union[int, str] = None,
+        sar: str = None
+) -> StreamParameters:
+    """
+    Parameters of the merged video: the given ones and the parameters of the
+    first video for the rest. The pixel format is always the one of the first
+    video, so the other videos are converted once to it
+    """
+    first = first or StreamParameters(None, None, None, None, None)
+    return StreamParameters(
+        width=first.width if width is None else width,
+        height=first.height if height is None else height,
+        fps=first.fps if fps is None else parse_ratio(fps),
+        sar=first.sar if sar is None else _parse_sar(sar),
+        pix_fmt=first.pix_fmt,
+    )
+
+
+def plan_input_filters(
+        parameters: Union[StreamParameters, None],
+        target: Union[StreamParameters, None],
+        duration: float = None,
+        is_first: bool = False,
+        is_last: bool = False,
+        transition_duration: float = 0
+) -> list[tuple[str, dict]]:
+    """
+    Filters bringing one video to the parameters of the merged video. Filters
+    which would not change the stream are left out
+    :param parameters: parameters of the video, None if unknown (every
+     normalizing filter is added then)
+    :param target: parameters of the merged video, None to keep the video as
+     it is (the unsafe merge of parts of one video)
+    :param duration: duration of the video, needed for the fade out
+    :param is_first: the video has no fade in
+    :param is_last: the video has no fade out
+    :param transition_duration: length of the fades, 0 for no fades
+    :return: names and arguments of the filters in the order of application
+    """
+    filters = []
+    if target is not None:
+        known = parameters or StreamParameters(None, None, None, None, None)
+        is_scaled = (target.width, target.height) != (known.width, known.height) \
+            and None not in (target.width, target.height)
+        if is_scaled:
+            filters.append(('scale', {'w': target.width, 'h': target.height}))
+        if target.pix_fmt is not None and known.pix_fmt != target.pix_fmt:
+            # Together with scale it is one pass of swscale, not a second conversion
+            filters.append(('format', {'pix_fmts': target.pix_fmt}))
+        # scale changes SAR to keep the display aspect, so it is always set back
+        if target.sar is not None and (is_scaled or known.sar != target.sar):
+            filters.append(('setsar', {'sar': '{}/{}'.format(target.sar.numerator,
+                                                             target.sar.denominator)}))
+        if target.fps is not None and known.fps != target.fps:
+            filters.append(('fps', {'fps': '{}/{}'.format(target.fps.numerator,
+                                                          target.fps.denominator)}))
+    if transition_duration > 0:
+        if not is_first:
+            filters.append(('fade', {'t': 'in', 'st': transition_duration, 'd': transition_duration}))
+        if not is_last:
+            filters.append(('fade', {'t': 'out', 'st': duration - transition_duration,
+                                     'd': transition_duration}))
+    return filters
+
+
+def plan_merge(
+        parameters: list[Union[StreamParameters, None]],
+        target: Union[StreamParameters, None],
+        durations: list[float] = None,
+        transition_duration: float = 0
+) -> list[list[tuple[str, dict]]]:
+    """Filters of every merged video, see plan_input_filters"""
+    last = len(parameters) - 1
+    return [
+        plan_input_filters(video_parameters, target,
+                           None if durations is None else durations[index],
+                           index == 0, index == last, transition_duration)
+        for index, video_parameters in enumerate(parameters)
+    ]
@@ -0,0 +1,276 @@
+from .progress_bar import ProgressEvent
+from collections import namedtuple
+from typing import Protocol
+import contextlib
+import contextvars
+import threading
+import json
+import math
+import time
+import os
+
+DEFAULT_OPERATION = 'render'
+
+
+class MetricsSample(namedtuple(
+    'MetricsSample',
+    ['time', 'operation', 'frame', 'fps', 'speed', 'bitrate', 'total_size', 'out_time', 'is_end']
+)):
+    """
+    Throughput of a render at one progress event. Values which ffmpeg
+    reports as N/A are None
+    :param time: unix time of the event
+    :param operation: the operation which runs the render
+    :param frame: the number of frames written
+    :param fps: encoded frames per second
+    :param speed: realtime factor, seconds of the result written per second
+    :param bitrate: bitrate of the written result in kbit/s
+    :param total_size: bytes written
+    :param out_time: seconds of the result written
+    :param is_end: whether it is the last sample of the render
+    """
+    pass
+
+
+class OperationMetrics(namedtuple('OperationMetrics', ['operation', 'wall_time', 'samples'])):
+    """
+    Samples of all renders of one run of an operation
+    :param operation: name of the operation
+    :param wall_time: seconds from the start to the end of the operation
+    :param samples: the samples in the order of the events
+    """
+    pass
+
+
+class OperationSummary(namedtuple(
+    'OperationSummary',
+    ['operation', 'count', 'wall_time', 'renders', 'frames', 'bytes_written',
+     'mean_fps', 'p95_fps', 'mean_speed']
+)):
+    """
+    Throughput of one or several runs of an operation. The statistics are
+    None when no render of the operation reported them
+    :param operation: name of the operation
+    :param count: the number of runs
+    :param wall_time: total seconds of the runs
+    :param renders: the number of finished renders
+    :param frames: frames written by the finished renders
+    :param bytes_written: bytes written by the finished renders
+    :param mean_fps: mean of the reported frames per second
+    :param p95_fps: 95th percentile of the reported frames per second
+    :param mean_speed: mean of the reported realtime factor
+    """
+    pass
+
+
+def _mean(values: list[float]):
+    return sum(values) / len(values) if values else None
+
+
+def _percentile(values: list[float], percent: float):
+    """Percentile by the nearest rank"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def summarize(metrics: list[OperationMetrics]) -> list[OperationSummary]:
+    """
+    Summary of every operation over all its runs, in the order of the first
+    run of the operation. The percentiles are taken over the samples of all
+    runs, so summaries of a batch are exact and not averaged
+    """
+    groups = {}
+    for operation_metrics in metrics:
+        groups.setdefault(operation_metrics.operation, []).append(operation_metrics)
+    summaries = []
+    for operation, runs in groups.items():
+        samples = [sample for run in runs for sample in run.samples]
+        ends = [sample for sample in samples if sample.is_end]
+        fps = [sample.fps for sample in samples if sample.fps is not None]
+        speed = [sample.speed for sample in samples if sample.speed is not None]
+        summaries.append(OperationSummary(
+            operation=operation,
+            count=len(runs),
+            wall_time=sum(run.wall_time for run in runs),
+            renders=len(ends),
+            frames=sum(sample.frame or 0 for sample in ends),
+            bytes_written=sum(sample.total_size or 0 for sample in ends),
+            mean_fps=_mean(fps),
+            p95_fps=_percentile(fps, 95),
+            mean_speed=_mean(speed),
+        ))
+    return summaries
+
+
+class MetricsWriter(Protocol):
+    def write_sample(self, sample: MetricsSample) -> None:
+        ...
+
+    def write_summary(self, summary: OperationSummary) -> None:
+        ...
+
+
+class JsonLinesWriter:
+    """
+    Appends every sample and summary to the file as a JSON object on its own
+    line, "type" is "sample" or "summary". Lines are appended with one write,
+    so several processes can share the file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write_sample(self, sample: MetricsSample) -> None:
+        self._write({'type': 'sample', **sample._asdict()})
+
+    def write_summary(self, summary: OperationSummary) -> None:
+        self._write({'type': 'summary', **summary._asdict()})
+
+    def _write(self, record: dict) -> None:
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + '\n')
+
+
+class PrometheusWriter:
+    """
+    Keeps the file in the Prometheus text format for the textfile collector
+    of node_exporter: gauges of the last sample of every operation and the
+    totals of the finished operations. The file is replaced atomically on
+    every write and belongs to one process
+    """
+
+    PREFIX = 'video_editor'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._last_samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def write_sample(self, sample: MetricsSample) -> None:
+        with self._lock:
+            self._last_samples[sample.operation] = sample
+            self._flush()
+
+    def write_summary(self, summary: OperationSummary) -> None:
+        with self._lock:
+            previous = self._totals.get(summary.operation)
+            if previous is not None:
+                summary = summary._replace(
+                    count=previous.count + summary.count,
+                    wall_time=previous.wall_time + summary.wall_time,
+                    renders=previous.renders + summary.renders,
+                    frames=previous.frames + summary.frames,
+                    bytes_written=previous.bytes_written + summary.bytes_written,
+                )
+            self._totals[summary.operation] = summary
+            self._flush()
+
+    def _flush(self) -> None:
+        lines = []
+        self._add_metric(lines, 'render_fps', 'gauge', 'Encoded frames per second',
+                         self._last_samples, lambda sample: sample.fps)
+        self._add_metric(lines, 'render_speed', 'gauge', 'Realtime factor of the render',
+                         self._last_samples, lambda sample: sample.speed)
+        self._add_metric(lines, 'render_bitrate_kbits', 'gauge', 'Bitrate of the written result',
+                         self._last_samples, lambda sample: sample.bitrate)
+        self._add_metric(lines, 'render_written_bytes', 'gauge', 'Bytes written by the render',
+                         self._last_samples, lambda sample: sample.total_size)
+        self._add_metric(lines, 'operations_total', 'counter', 'Finished operations',
+                         self._totals, lambda summary: summary.count)
+        self._add_metric(lines, 'operation_wall_seconds_total', 'counter',
+                         'Wall time of the finished operations',
+                         self._totals, lambda summary: summary.wall_time)
+        self._add_metric(lines, 'operation_frames_total', 'counter',
+                         'Frames written by the finished operations',
+                         self._totals, lambda summary: summary.frames)
+        self._add_metric(lines, 'operation_written_bytes_total', 'counter',
+                         'Bytes written by the finished operations',
+                         self._totals, lambda summary: summary.bytes_written)
+        self._add_metric(lines, 'operation_mean_fps', 'gauge',
+                         'Mean frames per second of the last finished operation',
+                         self._totals, lambda summary: summary.mean_fps)
+        self._add_metric(lines, 'operation_p95_fps', 'gauge',
+                         '95th percentile of frames per second of the last finished operation',
+                         self._totals, lambda summary: summary.p95_fps)
+        temporary_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            file.write(''.join(lines))
+        os.replace(temporary_path, self.path)
+
+    @classmethod
+    def _add_metric(cls, lines: list[str], name: str, metric_type: str,
+                    description: str, values: dict, get_value) -> None:
+        values = {operation: get_value(value) for operation, value in values.items()}
+        values = {operation: value for operation, value in values.items() if value is not None}
+        if not values:
+            return
+        name = '{}_{}'.format(cls.PREFIX, name)
+        lines.append('# HELP {} {}\n'.format(name, description))
+        lines.append('# TYPE {} {}\n'.format(name, metric_type))
+        for operation, value in values.items():
+            lines.append('{}{{operation="{}"}} {}\n'.format(name, operation, value))
+
+
+def get_writer(path: str) -> MetricsWriter:
+    """Prometheus writer for the .prom files, JSON-lines writer otherwise"""
+    return PrometheusWriter(path) if path.endswith('.prom') else JsonLinesWriter(path)
+
+
+class MetricsRecorder:
+    """
+    Progress sink recording the throughput of the renders. Subscribe it to
+    progress_events and run the operations inside operation():
+
+        recorder = MetricsRecorder([JsonLinesWriter('metrics.jsonl')])
+        with progress_events.subscribed(recorder), recorder.operation('trim'):
+            trim_and_save_video(video_path, time_interval, path_to_save)
+
+    Renders outside of operation() are written to the time series as
+    DEFAULT_OPERATION but are not summarized. The operation is tracked in a
+    context variable, so renders of different threads and tasks are not mixed
+    """
+
+    def __init__(self, writers: list[MetricsWriter] = ()):
+        self.writers = list(writers)
+        self.metrics = []
+        self._operation = contextvars.ContextVar('operation', default=None)
+
+    def __call__(self, event: ProgressEvent) -> None:
+        current = self._operation.get()
+        sample = MetricsSample(
+            time=time.time(),
+            operation=DEFAULT_OPERATION if current is None else current[0],
+            frame=event.frame,
+            fps=event.fps,
+            speed=event.speed,
+            bitrate=event.bitrate,
+            total_size=event.total_size,
+            out_time=event.out_time,
+            is_end=event.is_end,
+        )
+        if current is not None:
+            current[1].append(sample)
+        for writer in self.writers:
+            writer.write_sample(sample)
+
+    @contextlib.contextmanager
+    def operation(self, name: str):
+        """Attribute the renders inside to the operation and summarize them at the end"""
+        samples = []
+        token = self._operation.set((name, samples))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._operation.reset(token)
+            operation_metrics = OperationMetrics(name, time.perf_counter() - start, samples)
+            self.metrics.append(operation_metrics)
+            summary, = summarize([operation_metrics])
+            for writer in self.writers:
+                writer.write_summary(summary)
+
+    def summarize(self) -> list[OperationSummary]:
+        return summarize(self.metrics)
@@ -0,0 +1,230 @@
+from collections import namedtuple
+from fractions import Fraction
+import struct
+import mmap
+
+Mp4Metadata = namedtuple(
+    'Mp4Metadata',
+    ['duration', 'width', 'height', 'frame_rate', 'sar', 'keyframes']
+)
+
+_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts'}
+_VISUAL_SAMPLE_ENTRY_SIZE = 86
+
+
+class Mp4ParseError(ValueError):
+    pass
+
+
+def read_mp4_metadata(path: str) -> Mp4Metadata:
+    """
+    Read the metadata of the first video track of MP4/MOV file without
+    spawning ffprobe. Only the boxes of the moov header are touched, the media
+    data is never read
+    :param path: path to the video
+    :return: duration in seconds, width, height, frame rate as 'num/den',
+     SAR as 'num:den' (None if not specified) and the presentation times of
+     the keyframes in seconds
+    """
+    with open(path, 'rb') as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            raise Mp4ParseError('{} is empty'.format(path)) from e
+        with data:
+            try:
+                return _parse_movie(data)
+            except struct.error as e:
+                raise Mp4ParseError('{} has truncated boxes'.format(path)) from e
+
+
+def _iterate_boxes(data, start: int, end: int):
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise Mp4ParseError('Box {} has invalid size {}'.format(box_type, size))
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _find_boxes(data, start: int, end: int, path: list[bytes]) -> list[tuple[int, int]]:
+    """Positions of the payloads of all boxes reachable by the path of box types"""
+    found = []
+    for box_type, payload_start, box_end in _iterate_boxes(data, start, end):
+        if box_type != path[0]:
+            continue
+        if len(path) == 1:
+            found.append((payload_start, box_end))
+        elif box_type in _CONTAINER_BOXES:
+            found.extend(_find_boxes(data, payload_start, box_end, path[1:]))
+    return found
+
+
+def _find_box(data, start: int, end: int, path: list[bytes]):
+    found = _find_boxes(data, start, end, path)
+    return found[0] if found else None
+
+
+def _read_times(data, offset: int) -> tuple[int, int]:
+    """Timescale and duration of the full box mvhd/mdhd"""
+    version = data[offset]
+    if version == 1:
+        return struct.unpack_from('>IQ', data, offset + 20)
+    return struct.unpack_from('>II', data, offset + 12)
+
+
+def _parse_movie(data) -> Mp4Metadata:
+    moov = _find_box(data, 0, len(data), [b'moov'])
+    if moov is None:
+        raise Mp4ParseError('There is no moov box')
+    if _find_box(data, *moov, [b'mvex']) is not None:
+        raise Mp4ParseError('Fragmented files are not supported')
+    mvhd = _find_box(data, *moov, [b'mvhd'])
+    if mvhd is None:
+        raise Mp4ParseError('There is no mvhd box')
+    movie_timescale, movie_duration = _read_times(data, mvhd[0])
+    if movie_timescale == 0 or movie_duration == 0:
+        raise Mp4ParseError('Movie duration is not specified')
+
+    for track in _find_boxes(data, *moov, [b'trak']):
+        handler = _find_box(data, *track, [b'mdia', b'hdlr'])
+        if handler is None or data[handler[0] + 8:handler[0] + 12] != b'vide':
+            continue
+        width, height, frame_rate, sar, keyframes = \
+            _parse_video_track(data, track, movie_timescale)
+        return Mp4Metadata(movie_duration / movie_timescale,
+                           width, height, frame_rate, sar, keyframes)
+    raise Mp4ParseError('There is no video track')
+
+
+def _parse_video_track(data, track: tuple[int, int], movie_timescale: int):
+    mdhd = _find_box(data, *track, [b'mdia', b'mdhd'])
+    stbl = _find_box(data, *track, [b'mdia', b'minf', b'stbl'])
+    if mdhd is None or stbl is None:
+        raise Mp4ParseError('Video track has no mdhd or stbl box')
+    timescale, media_duration = _read_times(data, mdhd[0])
+
+    width, height, sar = _parse_sample_description(data, stbl)
+    sample_deltas = _read_entries(data, _find_box(data, *stbl, [b'stts']), 2)
+    if timescale == 0 or media_duration == 0 or not sample_deltas:
+        raise Mp4ParseError('Video track has no timing information')
+    sample_count = sum(count for count, _ in sample_deltas)
+    frame_rate = Fraction(sample_count * timescale, media_duration)
+
+    composition_offsets = _read_entries(data, _find_box(data, *stbl, [b'ctts']), 2)
+    sync_samples = _find_box(data, *stbl, [b'stss'])
+    if sync_samples is None:
+        keyframe_numbers = range(1, sample_count + 1)
+    else:
+        keyframe_numbers = [number for number, in _read_entries(data, sync_samples, 1)]
+    keyframes = _get_presentation_times(
+        keyframe_numbers, sample_deltas, composition_offsets,
+        _read_media_start(data, track, movie_timescale, timescale), timescale
+    )
+    return (width, height,
+            '{}/{}'.format(frame_rate.numerator, frame_rate.denominator),
+            sar, keyframes)
+
+
+def _parse_sample_description(data, stbl: tuple[int, int]) -> tuple[int, int, str]:
+    stsd = _find_box(data, *stbl, [b'stsd'])
+    if stsd is None:
+        raise Mp4ParseError('Video track has no stsd box')
+    entries = list(_iterate_boxes(data, stsd[0] + 8, stsd[1]))
+    if not entries:
+        raise Mp4ParseError('stsd box is empty')
+    _, entry_start, entry_end = entries[0]
+    width, height = struct.unpack_from('>HH', data, entry_start + 24)
+    sar = None
+    children_start = entry_start - 8 + _VISUAL_SAMPLE_ENTRY_SIZE
+    try:
+        pasp = _find_box(data, children_start, entry_end, [b'pasp'])
+    except Mp4ParseError:
+        pasp = None
+    if pasp is not None:
+        h_spacing, v_spacing = struct.unpack_from('>II', data, pasp[0])
+        if h_spacing and v_spacing:
+            sar = '{}:{}'.format(h_spacing, v_spacing)
+    return width, height, sar
+
+
+def _read_entries(data, box, fields: int) -> list[tuple]:
+    """Entries of the full box consisting of entry count and table of uint32"""
+    if box is None:
+        return []
+    entry_count = struct.unpack_from('>I', data, box[0] + 4)[0]
+    entry_format = '>{}I'.format(fields)
+    entry_size = 4 * fields
+    if box[0] + 8 + entry_count * entry_size > box[1]:
+        raise Mp4ParseError('Sample table is truncated')
+    return list(struct.iter_unpack(
+        entry_format, data[box[0] + 8:box[0] + 8 + entry_count * entry_size]
+    ))
+
+
+def _read_media_start(data, track: tuple[int, int],
+                      movie_timescale: int, timescale: int) -> int:
+    """
+    Media time shown at zero presentation time according to the edit list
+    (empty edits delay the track, the first real edit skips the media start)
+    """
+    elst = _find_box(data, *track, [b'edts', b'elst'])
+    if elst is None:
+        return 0
+    version = data[elst[0]]
+    entry_count = struct.unpack_from('>I', data, elst[0] + 4)[0]
+    entry_format, entry_size = ('>Qq', 20) if version == 1 else ('>Ii', 12)
+    delay = 0
+    for index in range(entry_count):
+        segment_duration, media_time = struct.unpack_from(
+            entry_format, data, elst[0] + 8 + index * entry_size
+        )
+        if media_time == -1:
+            delay += segment_duration * timescale // movie_timescale
+        else:
+            return media_time - delay
+    return -delay
+
+
+def _get_presentation_times(sample_numbers,
+                            sample_deltas: list[tuple],
+                            composition_offsets: list[tuple],
+                            media_start: int,
+                            timescale: int) -> list[float]:
+    times = []
+    wanted = iter(sample_numbers)
+    number = next(wanted, None)
+    sample = 1
+    decode_time = 0
+    deltas = iter(sample_deltas)
+    offsets = _expand_runs(composition_offsets)
+    count, delta = next(deltas, (0, 0))
+    while number is not None:
+        while count == 0:
+            count, delta = next(deltas, (None, None))
+            if count is None:
+                return times
+        offset = next(offsets, 0)
+        if sample == number:
+            # ctts offsets are signed in version 1, reinterpret uint32
+            if offset >= 1 << 31:
+                offset -= 1 << 32
+            times.append(max(decode_time + offset - media_start, 0) / timescale)
+            number = next(wanted, None)
+        decode_time += delta
+        count -= 1
+        sample += 1
+    return times
+
+
+def _expand_runs(runs: list[tuple]):
+    for count, value in runs:
+        for _ in range(count):
+            yield value
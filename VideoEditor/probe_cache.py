@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from typing import Callable
+import threading
+import hashlib
+import ffmpeg
+import json
+import os
+
+PROBE_CACHE_DIR_ENV = 'VIDEO_EDITOR_PROBE_CACHE_DIR'
+
+
+def get_file_identity(path: str) -> tuple[str, int, int]:
+    """
+    Identity of the file content as seen by the file system
+    :param path: path to the file
+    :return: absolute path, size in bytes and modification time in nanoseconds
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class ProbeCache:
+    """
+    Cache of the metadata computed for media files. Entries are keyed by the
+    file identity (path, size, mtime_ns), so a changed file is probed again.
+    The in-memory part is an LRU, the optional on-disk part keeps entries
+    between runs as json files in the cache directory
+    """
+
+    def __init__(self, max_size: int = 256, cache_dir: str = None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def probe(self, path: str) -> dict:
+        """ffmpeg.probe of the file, computed at most once per file identity"""
+        return self.get(path, 'probe', ffmpeg.probe)
+
+    def get(self,
+            path: str,
+            kind: str,
+            compute: Callable[[str], object],
+            persistent: bool = True) -> object:
+        """
+        Get cached metadata of the given kind or compute and remember it
+        :param path: path to the media file
+        :param kind: name of the metadata (probe, keyframes, ...)
+        :param compute: function of the path computing the metadata
+        :param persistent: whether the entry should be kept in the on-disk store
+        :return: the metadata
+        """
+        try:
+            key = self._get_key(path, kind)
+        except (OSError, TypeError, ValueError):
+            # Nothing to key by, let the compute function report the problem
+            return compute(path)
+
+        value = self._lookup(key, persistent)
+        if value is not None:
+            return value
+
+        value = compute(path)
+        self._put(key, value, persistent)
+        return value
+
+    def lookup(self, path: str, kind: str, persistent: bool = True) -> object:
+        """Cached metadata of the given kind, None if it is not computed yet"""
+        try:
+            key = self._get_key(path, kind)
+        except (OSError, TypeError, ValueError):
+            return None
+        return self._lookup(key, persistent)
+
+    def put(self, path: str, kind: str, value: object, persistent: bool = True) -> None:
+        """Remember metadata computed outside of the cache, e.g. asynchronously"""
+        try:
+            key = self._get_key(path, kind)
+        except (OSError, TypeError, ValueError):
+            return
+        self._put(key, value, persistent)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_path_in_store(self, key: tuple) -> str:
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, '{}.{}.json'.format(name, key[0]))
+
+    @staticmethod
+    def _get_key(path: str, kind: str) -> tuple:
+        if not isinstance(path, (str, os.PathLike)):
+            raise TypeError(type(path))
+        return (kind, *get_file_identity(path))
+
+    def _lookup(self, key: tuple, persistent: bool) -> object:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = self._load(key) if persistent else None
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+                self._remember(key, value)
+        return value
+
+    def _put(self, key: tuple, value: object, persistent: bool) -> None:
+        with self._lock:
+            self.misses += 1
+            self._remember(key, value)
+        if persistent:
+            self._store(key, value)
+
+    def _remember(self, key: tuple, value: object) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: tuple) -> object:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.get_path_in_store(key), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: tuple, value: object) -> None:
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.get_path_in_store(key)
+            temp_path = '{}.{}.tmp'.format(path, os.getpid())
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(value, file)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError):
+            # The on-disk store is only an optimisation
+            pass
+
+
+probe_cache = ProbeCache(cache_dir=os.environ.get(PROBE_CACHE_DIR_ENV))
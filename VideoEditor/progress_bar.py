@@ -1,109 +1,194 @@
-from __future__ import unicode_literals, print_function
-from .utils import convert_time_to_seconds
-import PySimpleGUI as sg
-from tqdm import tqdm
+from collections import namedtuple
+from typing import BinaryIO, Callable, ContextManager
 from math import ceil
 import contextlib
-import tempfile
-import gevent
-import gevent.monkey
-import shutil
-import socket
-import os
+import threading
+import logging
+import queue
 
-gevent.monkey.patch_all(thread=False)
 
+class ProgressEvent(namedtuple(
+    'ProgressEvent',
+    ['frame', 'fps', 'out_time_us', 'speed', 'bitrate', 'total_size', 'is_end']
+)):
+    """
+    One block of ffmpeg -progress output. Values which ffmpeg reports as N/A
+    are None
+    :param frame: the number of frames written
+    :param fps: encoded frames per second
+    :param out_time_us: time of the written result in microseconds
+    :param speed: render speed relative to real time
+    :param bitrate: bitrate of the written result in kbit/s
+    :param total_size: the size of the written result in bytes
+    :param is_end: whether it is the last block of the render
+    """
 
-@contextlib.contextmanager
-def _tmpdir_scope():
-    tmpdir = tempfile.mkdtemp()
-    try:
-        yield tmpdir
-    finally:
-        shutil.rmtree(tmpdir)
+    @property
+    def out_time(self) -> float:
+        """Time of the written result in seconds"""
+        return None if self.out_time_us is None else max(self.out_time_us, 0) / 1_000_000
+
+
+ProgressSink = Callable[[ProgressEvent], None]
+
+# Views replacing the PySimpleGUI progress bar, set per thread
+_gui_views = threading.local()
 
 
-def _do_watch_progress(sock, handler):
-    """Function to run in a separate gevent greenlet to read progress
-    events from a unix-domain socket."""
-    connection, client_address = sock.accept()
-    data = b''
+def _parse_number(value: str, number_type: type, suffix: str = ''):
+    if value is None:
+        return None
     try:
-        while True:
-            more_data = connection.recv(16)
-            if not more_data:
-                break
-            data += more_data
-            lines = data.split(b'\n')
-            for line in lines[:-1]:
-                line = line.decode()
-                parts = line.split('=')
-                key = parts[0] if len(parts) > 0 else None
-                value = parts[1] if len(parts) > 1 else None
-                handler(key, value)
-            data = lines[-1]
-    finally:
-        connection.close()
+        return number_type(value.strip().removesuffix(suffix))
+    except ValueError:
+        return None
+
+
+class ProgressParser:
+    """Collects key=value lines of ffmpeg -progress into events"""
+
+    def __init__(self):
+        self._values = {}
+
+    def feed(self, line: str) -> ProgressEvent:
+        """
+        Take the next line of the progress
+        :return: the event if the line ends a block, None otherwise
+        """
+        key, _, value = line.strip().partition('=')
+        if key != 'progress':
+            self._values[key] = value
+            return None
+        values, self._values = self._values, {}
+        return ProgressEvent(
+            frame=_parse_number(values.get('frame'), int),
+            fps=_parse_number(values.get('fps'), float),
+            out_time_us=_parse_number(values.get('out_time_us'), int),
+            speed=_parse_number(values.get('speed'), float, 'x'),
+            bitrate=_parse_number(values.get('bitrate'), float, 'kbits/s'),
+            total_size=_parse_number(values.get('total_size'), int),
+            is_end=value == 'end',
+        )
+
+
+def read_progress(stream: BinaryIO, events: queue.Queue) -> threading.Thread:
+    """
+    Read ffmpeg -progress from the stream in a daemon thread and put the
+    events into the queue. None is put when the stream ends
+    """
+    def read() -> None:
+        parser = ProgressParser()
+        try:
+            for line in stream:
+                event = parser.feed(line.decode(errors='replace'))
+                if event is not None:
+                    events.put(event)
+        finally:
+            events.put(None)
 
+    thread = threading.Thread(target=read, name='ffmpeg-progress', daemon=True)
+    thread.start()
+    return thread
 
-@contextlib.contextmanager
-def _watch_progress(handler):
-    """Context manager for creating a unix-domain socket and listen for
-    ffmpeg progress events.
 
-    The socket filename is yielded from the context manager and the
-    socket is closed when the context manager is exited.
+class ProgressDispatcher:
+    """Sinks subscribed to the progress of every render"""
 
-    Args:
-        handler: a function to be called when progress events are
-            received; receives a ``key`` argument and ``value``
-            argument. (The example ``show_progress`` below uses tqdm)
+    def __init__(self):
+        self._sinks = []
+        self._lock = threading.Lock()
 
-    Yields:
-        socket_filename: the name of the socket file.
-    """
-    with _tmpdir_scope() as tmpdir:
-        socket_filename = os.path.join(tmpdir, 'sock')
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        with contextlib.closing(sock):
-            sock.bind(socket_filename)
-            sock.listen(1)
-            try:
-                child = gevent.spawn(_do_watch_progress, sock, handler)
-                yield socket_filename
-            except:
-                gevent.kill(child)
-                raise
+    def subscribe(self, sink: ProgressSink) -> None:
+        with self._lock:
+            self._sinks.append(sink)
+
+    def unsubscribe(self, sink: ProgressSink) -> None:
+        with self._lock:
+            self._sinks.remove(sink)
+
+    @contextlib.contextmanager
+    def subscribed(self, sink: ProgressSink):
+        self.subscribe(sink)
+        try:
+            yield sink
+        finally:
+            self.unsubscribe(sink)
+
+    def emit(self, event: ProgressEvent) -> None:
+        with self._lock:
+            sinks = list(self._sinks)
+        for sink in sinks:
+            sink(event)
+
+
+progress_events = ProgressDispatcher()
 
 
 @contextlib.contextmanager
-def show_progress_in_console(total_duration: float) -> None:
-    """Create a unix-domain socket to watch progress and render tqdm
-    progress bar."""
+def console_progress_sink(total_duration: float) -> None:
+    """Render tqdm progress bar, the yielded sink receives
+    the progress of the render."""
+    # Imported on use, so silent renders and the CLI startup do not pay for it
+    from tqdm import tqdm
+
     with tqdm(total=total_duration) as bar:
-        def console_handler(key: str, value: str) -> None:
-            if key == 'out_time':
-                time = convert_time_to_seconds(value)
-                bar.update(time - bar.n)
-            elif key == 'progress' and value == 'end':
+        def console_sink(event: ProgressEvent) -> None:
+            if event.is_end:
                 bar.update(bar.total - bar.n)
+            elif event.out_time is not None:
+                bar.update(min(event.out_time, bar.total) - bar.n)
 
-        with _watch_progress(console_handler) as socket_filename:
-            yield socket_filename
+        yield console_sink
 
 
 @contextlib.contextmanager
-def show_progress_in_gui(total_duration: float) -> None:
-    """Create a unix-domain socket to watch progress and render PuSimpleGUI
-        progress bar."""
+def gui_progress_view(view: Callable[[float], ContextManager[ProgressSink]]):
+    """
+    Show the progress of the GUI renders run by this thread inside in the view
+    instead of the PySimpleGUI progress bar, for example in the window of a
+    render running in the background
+    :param view: takes the duration of the result of a render and returns
+     the context manager of the sink receiving its progress
+    """
+    previous = getattr(_gui_views, 'view', None)
+    _gui_views.view = view
+    try:
+        yield view
+    finally:
+        _gui_views.view = previous
+
+
+@contextlib.contextmanager
+def gui_progress_sink(total_duration: float) -> None:
+    """Render PuSimpleGUI progress bar, the yielded sink receives
+    the progress of the render. The view of gui_progress_view
+    is used instead if it is set."""
+    view = getattr(_gui_views, 'view', None)
+    if view is not None:
+        with view(total_duration) as sink:
+            yield sink
+        return
+
+    import PySimpleGUI as sg
+
     total_duration = ceil(total_duration)
 
-    def gui_handler(key: str, value: str) -> None:
-        if key == 'out_time':
-            time = convert_time_to_seconds(value)
-            sg.one_line_progress_meter('Progress bar', time, total_duration)
-        elif key == 'progress' and value == 'end':
+    def gui_sink(event: ProgressEvent) -> None:
+        if event.is_end:
             sg.one_line_progress_meter('Progress bar', total_duration, total_duration)
+        elif event.out_time is not None:
+            sg.one_line_progress_meter('Progress bar', int(event.out_time), total_duration)
+
+    yield gui_sink
+
+
+def logging_progress_sink(logger: logging.Logger = None, level: int = logging.INFO) -> ProgressSink:
+    """Sink writing every event into the log"""
+    logger = logger or logging.getLogger(__name__)
+
+    def log_sink(event: ProgressEvent) -> None:
+        logger.log(level, 'frame=%s fps=%s out_time=%s speed=%s bitrate=%s total_size=%s%s',
+                   event.frame, event.fps, event.out_time, event.speed,
+                   event.bitrate, event.total_size, ' end' if event.is_end else '')
 
-    with _watch_progress(gui_handler) as socket_filename:
-        yield socket_filename
+    return log_sink
@@ -0,0 +1,176 @@
+from .video_editor import \
+    (copy_video, save_video, open_videos, TimeInterval, Point, FilterableStream)
+from .utils import Usage, check_paths_correctness, get_video_duration, get_video_parameters
+from .batch import OPERATIONS, prepare_arguments
+from .encoding_profile import EncodingProfile, PROFILES
+from .render_control import run_with_control
+from typing import Callable
+import inspect
+import tempfile
+import ffmpeg
+import sys
+import os
+
+# Videos higher than this are edited interactively on a low resolution copy
+PROXY_MAX_HEIGHT = 540
+
+# Placeholder of the video the operation is applied to, it differs between
+# the proxy and the original
+CURRENT_VIDEO = '<current video>'
+
+OPERATION_NAMES = {func: name for name, func in OPERATIONS.items()}
+
+
+def make_proxy(
+        input_path: str,
+        output_path: str,
+        max_height: int = PROXY_MAX_HEIGHT,
+        mode: Usage = Usage.GUI
+) -> tuple[float, float]:
+    """
+    Save a low resolution copy of the video for interactive editing. Videos not
+    higher than max_height are copied as is
+    :param input_path: absolute path to the original video
+    :param output_path: the absolute path to the proxy
+    :param max_height: the maximum height of the proxy
+    :param mode: where to display progress: in the console or in the GUI
+    :return: the scale of the original relative to the proxy by x and y axes
+    """
+    check_paths_correctness(input_path)
+    width, height, _, _ = get_video_parameters(input_path)
+    if height <= max_height:
+        copy_video(input_path, output_path)
+        return 1.0, 1.0
+    proxy_height = max_height - max_height % 2
+    proxy_width = max(round(width * proxy_height / height / 2) * 2, 2)
+    video = open_videos(input_path)
+    save_video(FilterableStream(video.video.filter('scale', proxy_width, proxy_height), video.audio),
+               output_path, is_overwrite=True, duration=get_video_duration(input_path),
+               mode=mode, profile=PROFILES['draft'])
+    return width / proxy_width, height / proxy_height
+
+
+def measure_proxy_scale(input_path: str, proxy_path: str) -> tuple[float, float]:
+    """The scale of the original relative to its proxy made by make_proxy"""
+    width, height, _, _ = get_video_parameters(input_path)
+    proxy_width, proxy_height, _, _ = get_video_parameters(proxy_path)
+    return width / proxy_width, height / proxy_height
+
+
+def make_media_proxy(input_path: str, output_path: str, scale: tuple[float, float]) -> None:
+    """
+    Downscale the video or image (for example, the one overlaid on the proxy)
+    by the scale of the proxy. Only the video stream is kept
+    """
+    scale_x, scale_y = scale
+    out = (ffmpeg
+           .input(input_path)
+           .filter('scale', 'max(trunc(iw/{}/2)*2,2)'.format(scale_x),
+                   'max(trunc(ih/{}/2)*2,2)'.format(scale_y))
+           .output(output_path))
+    try:
+        run_with_control(out, is_overwrite=True)
+    except ffmpeg.Error as e:
+        print(e.stderr.decode(), file=sys.stderr)
+        raise e
+
+
+def make_job(func: Callable, *args, **kwargs) -> dict:
+    """
+    Job in the format of batch.load_jobs for the call of the operation function.
+    The path to save is not recorded, the video the operation is applied to
+    should be given as CURRENT_VIDEO
+    """
+    arguments = inspect.signature(func).bind(*args, **kwargs).arguments
+    job = {'operation': OPERATION_NAMES[func]}
+    for key, value in arguments.items():
+        if key == 'path_to_save':
+            continue
+        if isinstance(value, TimeInterval):
+            value = [value.begin, value.end]
+        elif isinstance(value, Point):
+            value = [value.x, value.y]
+        job[key] = value
+    return job
+
+
+def scale_job(job: dict, scale: tuple[float, float]) -> dict:
+    """The job with coordinates on the proxy converted to coordinates on the original"""
+    scale_x, scale_y = scale
+    job = dict(job)
+    if job['operation'] == 'overlay':
+        job['x_shift'] = round(job.get('x_shift', 0) * scale_x)
+        job['y_shift'] = round(job.get('y_shift', 0) * scale_y)
+    elif job['operation'] == 'crop':
+        for key in ('point1', 'point2'):
+            x, y = job[key]
+            job[key] = [round(x * scale_x), round(y * scale_y)]
+    return job
+
+
+def _substitute_current_video(value, video_path: str):
+    if isinstance(value, list):
+        return [_substitute_current_video(item, video_path) for item in value]
+    return video_path if value == CURRENT_VIDEO else value
+
+
+def run_operation(
+        job: dict,
+        video_path: str,
+        path_to_save: str,
+        is_overwrite: bool = False,
+        mode: Usage = Usage.GUI,
+        profile: EncodingProfile = None
+) -> None:
+    """
+    Apply the recorded operation to the video
+    :param job: the job made by make_job
+    :param video_path: absolute path to the video in place of CURRENT_VIDEO
+    :param path_to_save: the absolute path to the result video
+    :param is_overwrite: overwrites the video even if there is already a video in the save path
+    :param mode: where to display progress: in the console or in the GUI
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
+    :return: None
+    """
+    func, arguments = prepare_arguments(
+        {key: _substitute_current_video(value, video_path) for key, value in job.items()}
+    )
+    arguments.update(path_to_save=path_to_save, is_overwrite=is_overwrite, mode=mode)
+    if profile is not None:
+        arguments['profile'] = profile
+    func(**arguments)
+
+
+def replay_operations(
+        original_path: str,
+        jobs: list[dict],
+        path_to_save: str,
+        scale: tuple[float, float],
+        is_overwrite: bool = False,
+        mode: Usage = Usage.GUI,
+        profile: EncodingProfile = None
+) -> None:
+    """
+    Apply the operations recorded on the proxy to the original video at full
+    resolution
+    :param original_path: absolute path to the original video
+    :param jobs: the jobs made by make_job in the order they were applied to the proxy
+    :param path_to_save: the absolute path to the result video
+    :param scale: the scale of the original relative to the proxy returned by make_proxy
+    :param is_overwrite: overwrites the video even if there is already a video in the save path
+    :param mode: where to display progress: in the console or in the GUI
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
+    :return: None
+    """
+    if not jobs:
+        copy_video(original_path, path_to_save, is_overwrite)
+        return
+    with tempfile.TemporaryDirectory() as tmpdir:
+        video_path = original_path
+        for index, job in enumerate(jobs):
+            is_last = index == len(jobs) - 1
+            step_path = path_to_save if is_last \
+                else os.path.join(tmpdir, 'step{}.mp4'.format(index))
+            run_operation(scale_job(job, scale), video_path, step_path,
+                          is_overwrite or not is_last, mode, profile)
+            video_path = step_path
@@ -0,0 +1,144 @@
+from .file_cache import FileCache
+from .utils import link_or_copy
+from .probe_cache import get_file_identity
+from .encoding_profile import EncodingProfile, get_profile
+from .batch import OPERATIONS
+from enum import Enum
+import threading
+import tempfile
+import hashlib
+import inspect
+import json
+import os
+
+RENDER_CACHE_DIR_ENV = 'VIDEO_EDITOR_RENDER_CACHE_DIR'
+RENDER_CACHE_SIZE_ENV = 'VIDEO_EDITOR_RENDER_CACHE_SIZE'
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'video_editor_renders')
+DEFAULT_CACHE_SIZE = 4 * 1024 * 1024 * 1024
+# Bytes read at once when a file is hashed
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Arguments which do not change the rendered video
+_IGNORED_ARGUMENTS = {'path_to_save', 'is_overwrite', 'mode'}
+
+# Content identities by the file identity, a file is hashed once until it changes
+_content_identities = {}
+_content_identities_lock = threading.Lock()
+
+
+class RenderCache(FileCache):
+    """
+    On-disk cache of the rendered videos keyed by get_render_key: the same
+    operation with the same parameters on the same input is rendered once.
+    The cached videos are hard linked where possible, so a result kept both
+    here and in the history of the editor takes the disk space once
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_SIZE):
+        super().__init__(cache_dir, max_bytes, '.mp4')
+
+    def contains(self, key: str) -> bool:
+        """Whether the result is cached, the statistics are not changed"""
+        return os.path.exists(self.get_key_path(key))
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """
+        Put the cached result to the output path
+        :return: False if the result is not cached
+        """
+        path = self.lookup_key(key)
+        if path is None:
+            return False
+        try:
+            link_or_copy(path, output_path)
+        except OSError:
+            # Evicted in between by another editor
+            return False
+        return True
+
+    def store(self, key: str, video_path: str) -> str:
+        """Cache the rendered video and evict the least recently used ones"""
+        path = self.put_file(key, video_path, is_linked=True)
+        self.evict(keep={path})
+        return path
+
+
+render_cache = RenderCache(os.environ.get(RENDER_CACHE_DIR_ENV, DEFAULT_CACHE_DIR),
+                           int(os.environ.get(RENDER_CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE)))
+
+
+def get_content_identity(path: str) -> str:
+    """
+    Fingerprint of the file content independent of its path: the sha1 of the
+    whole file. Samples of the file are not enough, files of the same size
+    may differ only between them (e.g. a metadata edit inside the file), and
+    a stale render would be taken for the result. A file is hashed once
+    until its size or modification time changes
+    """
+    file_identity = get_file_identity(path)
+    with _content_identities_lock:
+        if file_identity in _content_identities:
+            return _content_identities[file_identity]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    identity = digest.hexdigest()
+    with _content_identities_lock:
+        _content_identities[file_identity] = identity
+    return identity
+
+
+def _normalize_value(value):
+    """Value comparable between the calls: numbers as floats, files by their content"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, EncodingProfile):
+        return _normalize_value(value._asdict())
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, dict):
+        return {str(key): _normalize_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(item) for item in value]
+    if isinstance(value, str) and os.path.isfile(value):
+        return {'content': get_content_identity(value)}
+    return str(value)
+
+
+def normalize_job(job: dict) -> dict:
+    """
+    Job of make_job with the defaults of the operation filled in and without
+    the arguments which do not change the result, so equal calls give equal
+    jobs whichever arguments were given explicitly
+    """
+    arguments = {key: value for key, value in job.items() if key != 'operation'}
+    if job['operation'] in OPERATIONS:
+        bound = inspect.signature(OPERATIONS[job['operation']]).bind_partial(**arguments)
+        bound.apply_defaults()
+        arguments = bound.arguments
+    if isinstance(arguments.get('profile'), str):
+        arguments['profile'] = get_profile(arguments['profile'])
+    normalized = {key: _normalize_value(value) for key, value in arguments.items()
+                  if key not in _IGNORED_ARGUMENTS}
+    normalized['operation'] = job['operation']
+    return normalized
+
+
+def get_render_key(parent_key: str, job: dict, profile: EncodingProfile = None) -> str:
+    """
+    Content address of the result of the job
+    :param parent_key: key of the video the job is applied to (CURRENT_VIDEO),
+     None if the job reads only the files of its arguments
+    :param job: the job made by make_job
+    :param profile: settings of the encoder, unless the job has its own
+    :return: sha1 of the key of the input, the operation, its normalized
+     parameters and the encoder profile
+    """
+    if profile is not None and job.get('profile') is None:
+        job = dict(job, profile=profile)
+    key = {'input': parent_key, 'job': normalize_job(job)}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,174 @@
+from .progress_bar import ProgressSink, read_progress, progress_events
+import subprocess
+import contextlib
+import threading
+import tempfile
+import ffmpeg
+import queue
+import time
+import os
+
+# How often the running ffmpeg is checked
+POLL_INTERVAL = 0.1
+
+# Token of the cancellation scope of every thread
+_scopes = threading.local()
+
+
+class RenderInterruptedError(Exception):
+    """The render was stopped before the end, its partial result is removed"""
+    pass
+
+
+class RenderCancelledError(RenderInterruptedError):
+    pass
+
+
+class RenderTimeoutError(RenderInterruptedError):
+    pass
+
+
+class RenderStalledError(RenderInterruptedError):
+    pass
+
+
+class CancellationToken:
+    """Flag to stop a render from another thread"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+@contextlib.contextmanager
+def cancellation_scope(cancel_token: CancellationToken):
+    """
+    Cancel the renders run by this thread inside with the token, also the
+    renders of the functions which do not take a token, like the *_and_save
+    ones. A token given to run_with_control explicitly is used instead
+    """
+    previous = getattr(_scopes, 'cancel_token', None)
+    _scopes.cancel_token = cancel_token
+    try:
+        yield cancel_token
+    finally:
+        _scopes.cancel_token = previous
+
+
+def get_scope_token() -> CancellationToken:
+    """Token of the innermost cancellation scope of this thread, None outside of them"""
+    return getattr(_scopes, 'cancel_token', None)
+
+
+def run_with_control(
+        out: ffmpeg.nodes.OutputStream,
+        is_overwrite: bool = False,
+        cancel_token: CancellationToken = None,
+        timeout: float = None,
+        stall_timeout: float = None,
+        sinks: list[ProgressSink] = (),
+        is_log_shown: bool = False
+) -> None:
+    """
+    Run ffmpeg and pass its progress to the sinks and to the subscribers of
+    progress_events. ffmpeg is stopped on cancellation, when it runs too long
+    or when its output time does not advance. The progress is read from the
+    pipe by a thread, the sinks and the checks run in the calling thread
+    :param out: the output of the graph
+    :param is_overwrite: overwrites the video even if there is already a video in the save path
+    :param cancel_token: the token cancelling the render, by default the
+     token of the cancellation scope
+    :param timeout: the maximum duration of the render in seconds
+    :param stall_timeout: the maximum time in seconds without new output
+     frames. ffmpeg reports progress twice a second, so it should be longer
+    :param sinks: functions receiving the progress of this render
+    :param is_log_shown: show the log of ffmpeg instead of keeping it for the error
+    :return: None
+    """
+    if cancel_token is None:
+        cancel_token = get_scope_token()
+    output_path = out.node.kwargs['filename']
+    is_partial_result = is_overwrite or not os.path.exists(output_path)
+    args = out.global_args('-progress', 'pipe:1').compile(overwrite_output=is_overwrite)
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=None if is_log_shown else log)
+        events = queue.Queue()
+        reader = read_progress(process.stdout, events)
+        try:
+            _watch_process(process, events, cancel_token, timeout, stall_timeout, sinks)
+        except BaseException:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            if is_partial_result and os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        finally:
+            reader.join()
+            process.stdout.close()
+
+        if process.returncode != 0:
+            if is_partial_result and os.path.exists(output_path):
+                os.remove(output_path)
+            log.seek(0)
+            raise ffmpeg.Error('ffmpeg', b'', log.read())
+
+
+def _watch_process(
+        process: subprocess.Popen,
+        events: queue.Queue,
+        cancel_token: CancellationToken,
+        timeout: float,
+        stall_timeout: float,
+        sinks: list[ProgressSink]
+) -> None:
+    start = last_advance = time.monotonic()
+    out_time = None
+    while True:
+        try:
+            event = events.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            pass
+        else:
+            if event is None:
+                # ffmpeg closes the progress pipe on exit
+                process.wait()
+                return
+            for sink in sinks:
+                sink(event)
+            progress_events.emit(event)
+            if event.out_time_us != out_time:
+                out_time = event.out_time_us
+                last_advance = time.monotonic()
+
+        check_render_limits(cancel_token, timeout, stall_timeout, start, last_advance)
+
+
+def check_render_limits(
+        cancel_token: CancellationToken,
+        timeout: float,
+        stall_timeout: float,
+        start: float,
+        last_advance: float
+) -> None:
+    """
+    Raise RenderInterruptedError if the render is cancelled, runs too long or
+    its output time does not advance
+    :param start: time.monotonic() of the start of the render
+    :param last_advance: time.monotonic() of the last advance of the output time
+    """
+    now = time.monotonic()
+    if cancel_token is not None and cancel_token.is_cancelled:
+        raise RenderCancelledError('The render was cancelled')
+    if timeout is not None and now - start > timeout:
+        raise RenderTimeoutError('The render took longer than {} s'.format(timeout))
+    if stall_timeout is not None and now - last_advance > stall_timeout:
+        raise RenderStalledError('The output time has not advanced for {} s'
+                                 .format(stall_timeout))
@@ -0,0 +1,211 @@
+from .utils import check_paths_correctness, get_video_duration, read_chunk
+from .probe_cache import get_file_identity
+from .video_editor import TimeInterval
+from bisect import bisect_left
+from math import ceil, floor
+from typing import Iterator
+import numpy as np
+import ffmpeg
+import json
+import os
+
+# Frames per second analysed and the size they are scaled to
+ANALYSIS_FPS = 10
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+HISTOGRAM_BINS = 32
+# Frames read from ffmpeg and compared at once
+BATCH_FRAMES = 256
+# Score of a frame starting a new scene, see get_scene_scores
+THRESHOLD = 0.3
+# Cuts closer to the previous one are ignored, in seconds
+MIN_SCENE_LENGTH = 1.0
+# Boundaries of an interval farther from a cut are not snapped, in seconds
+SNAP_DISTANCE = 2.0
+
+
+def get_sidecar_path(video_path: str, sidecar_path: str = None) -> str:
+    return sidecar_path or video_path + '.scenes.json'
+
+
+def _get_histograms(frames: np.ndarray, bins: int) -> np.ndarray:
+    """Histogram of every frame, one bincount for the whole batch"""
+    count = len(frames)
+    values = frames.reshape(count, -1) // (256 // bins)
+    values = values.astype(np.intp) + (np.arange(count, dtype=np.intp) * bins)[:, None]
+    return np.bincount(values.ravel(), minlength=count * bins).reshape(count, bins)
+
+
+def get_scene_scores(frames: np.ndarray, bins: int = HISTOGRAM_BINS) -> np.ndarray:
+    """
+    Distance between every frame and the previous one: the mean of the mean
+    absolute difference of the pixels and of the histogram distance, both
+    from 0 to 1. The difference reacts to any change of the picture, the
+    histogram ignores motion, so a cut is high in both
+    :param frames: grayscale frames of shape (N, height, width)
+    :return: N - 1 scores, the score of the frame i + 1
+    """
+    pixels = frames[0].size
+    difference = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=(1, 2)) / 255
+    histograms = _get_histograms(frames, bins)
+    distance = np.abs(np.diff(histograms, axis=0)).sum(axis=1) / (2 * pixels)
+    return (difference + distance) / 2
+
+
+def _stream_scores(video_path: str, fps: float, width: int, height: int,
+                   batch_frames: int) -> Iterator[np.ndarray]:
+    """
+    Decode the first video stream scaled down to gray frames and yield the
+    scores of the frames batch by batch. The frames are read into one
+    preallocated buffer, its first frame is the last frame of the previous
+    batch, so the scores continue over the batches
+    """
+    process = (ffmpeg
+               .input(video_path)
+               .video
+               .filter('fps', fps)
+               .filter('scale', width, height)
+               .output('pipe:', f='rawvideo', pix_fmt='gray')
+               .global_args('-v', 'error', '-nostdin')
+               .run_async(pipe_stdout=True, pipe_stderr=True))
+    frames = np.empty((batch_frames + 1, height, width), dtype=np.uint8)
+    frame_size = width * height
+    buffer = memoryview(frames).cast('B')
+    try:
+        is_finished = read_chunk(process.stdout, buffer[:frame_size]) < frame_size
+        while not is_finished:
+            filled = read_chunk(process.stdout, buffer[frame_size:])
+            count = filled // frame_size
+            if count:
+                yield get_scene_scores(frames[:count + 1])
+                frames[0] = frames[count]
+            is_finished = filled < len(buffer) - frame_size
+        error = process.stderr.read()
+        process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+    if process.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', b'', error)
+
+
+def detect_scenes(
+        video_path: str,
+        threshold: float = THRESHOLD,
+        min_scene_length: float = MIN_SCENE_LENGTH,
+        fps: float = ANALYSIS_FPS,
+        batch_frames: int = BATCH_FRAMES
+) -> list[float]:
+    """
+    Find the hard cuts of the video in one decoding pass. Memory does not
+    depend on the length of the file: only a batch of small frames is kept
+    :param video_path: the absolute path to the video
+    :param threshold: score from 0 to 1 of a frame starting a new scene
+    :param min_scene_length: cuts closer to the previous cut are ignored, in seconds
+    :param fps: frames per second analysed, the precision of the cuts
+    :param batch_frames: frames compared at once
+    :return: times of the first frames of the scenes except the first one, in seconds
+    """
+    check_paths_correctness(video_path)
+    cuts = []
+    # The first frame has no score
+    index = 1
+    for scores in _stream_scores(video_path, fps, FRAME_WIDTH, FRAME_HEIGHT, batch_frames):
+        for position in np.flatnonzero(scores >= threshold):
+            time = (index + position) / fps
+            if not cuts and time >= min_scene_length or cuts and time - cuts[-1] >= min_scene_length:
+                cuts.append(round(float(time), 3))
+        index += len(scores)
+    return cuts
+
+
+def load_scene_cuts(video_path: str, sidecar_path: str = None, **kwargs) -> list[float]:
+    """
+    The cuts of the video from its sidecar, they are detected when the
+    sidecar is missing, made with other parameters or older than the video.
+    The sidecar is not written into read-only directories
+    :param kwargs: parameters of detect_scenes
+    """
+    sidecar_path = get_sidecar_path(video_path, sidecar_path)
+    _, size, mtime_ns = get_file_identity(video_path)
+    parameters = {'threshold': THRESHOLD, 'min_scene_length': MIN_SCENE_LENGTH,
+                  'fps': ANALYSIS_FPS, **kwargs}
+    parameters.pop('batch_frames', None)
+    try:
+        with open(sidecar_path, encoding='utf-8') as file:
+            description = json.load(file)
+        if (description['size'], description['mtime_ns']) == (size, mtime_ns) and \
+                description['parameters'] == parameters:
+            return description['cuts']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    cuts = detect_scenes(video_path, **kwargs)
+    description = {'size': size, 'mtime_ns': mtime_ns, 'parameters': parameters, 'cuts': cuts}
+    temp_path = '{}.{}.tmp'.format(sidecar_path, os.getpid())
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(description, file)
+        os.replace(temp_path, sidecar_path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return cuts
+
+
+def snap_time(time: float, cuts: list[float], max_distance: float = SNAP_DISTANCE) -> float:
+    """The nearest of the sorted cuts, the time itself if they are farther than max_distance"""
+    position = bisect_left(cuts, time)
+    nearest = min(cuts[max(position - 1, 0):position + 1], key=lambda cut: abs(cut - time),
+                  default=None)
+    if nearest is None or abs(nearest - time) > max_distance:
+        return time
+    return nearest
+
+
+def snap_interval(
+        time_interval: TimeInterval,
+        cuts: list[float],
+        max_distance: float = SNAP_DISTANCE,
+        is_kept: bool = True,
+        duration: float = None
+) -> TimeInterval:
+    """
+    Move the boundaries of the interval to the nearest cuts. TimeInterval has
+    whole seconds, so the boundaries are rounded to stay inside the scenes
+    which remain: into the interval if it is kept (trim), out of it if it is
+    removed (cut out)
+    :param time_interval: interval selected by the user
+    :param cuts: sorted times of the cuts
+    :param max_distance: boundaries farther from the cuts are not moved, in seconds
+    :param is_kept: whether the interval remains in the result or is removed
+    :param duration: duration of the video, the end is not snapped beyond it
+    :return: new interval, the given one if snapping would make it empty
+    """
+    round_begin, round_end = (ceil, floor) if is_kept else (floor, ceil)
+    begin = round_begin(snap_time(time_interval.begin, cuts, max_distance))
+    end = round_end(snap_time(time_interval.end, cuts, max_distance))
+    if duration is not None and end >= duration:
+        end = time_interval.end
+    if begin >= end:
+        return TimeInterval(time_interval.begin, time_interval.end)
+    return TimeInterval(begin, end)
+
+
+def snap_to_scenes(
+        video_path: str,
+        time_interval: TimeInterval,
+        max_distance: float = SNAP_DISTANCE,
+        is_kept: bool = True
+) -> TimeInterval:
+    """
+    Snap the interval of trim_and_save_video (is_kept) or of
+    cut_part_and_save_video (not is_kept) to the scene cuts of the video,
+    see snap_interval
+    """
+    return snap_interval(time_interval, load_scene_cuts(video_path), max_distance, is_kept,
+                         get_video_duration(video_path))
@@ -0,0 +1,125 @@
+from .utils import get_keyframes, get_information_about_stream, write_concat_list
+from .render_control import run_with_control
+from collections import namedtuple
+import ffmpeg
+import sys
+import os
+
+Segment = namedtuple('Segment', ['start', 'end', 'is_copy'])
+
+# Encoder and bitstream filter for every codec whose partial GOPs can be re-encoded
+SMART_CUT_CODECS = {
+    'h264': ('libx264', 'h264_mp4toannexb'),
+    'hevc': ('libx265', 'hevc_mp4toannexb'),
+}
+
+_X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+    'High 10': 'high10',
+    'High 4:2:2': 'high422',
+    'High 4:4:4 Predictive': 'high444',
+}
+
+# Shift of seek points so that a seek lands exactly on the wanted keyframe
+_SEEK_EPSILON = 0.001
+
+
+def plan_segments(keyframes: list[float],
+                  start: float,
+                  end: float,
+                  video_duration: float) -> list[Segment]:
+    """
+    Split the kept range of the video into segments: whole GOPs which can be
+    stream-copied and partial GOPs at the edges which have to be re-encoded
+    :param keyframes: presentation times of the keyframes
+    :param start: start of the kept range in seconds
+    :param end: end of the kept range in seconds
+    :param video_duration: duration of the whole video
+    :return: adjacent segments covering the range
+    """
+    boundaries = [time for time in [*keyframes, video_duration]
+                  if start - _SEEK_EPSILON <= time <= end + _SEEK_EPSILON]
+    if len(boundaries) < 2:
+        return [Segment(start, end, False)]
+    first, last = boundaries[0], boundaries[-1]
+    segments = []
+    if first - start > _SEEK_EPSILON:
+        segments.append(Segment(start, first, False))
+    segments.append(Segment(max(start, first), min(end, last), True))
+    if end - last > _SEEK_EPSILON:
+        segments.append(Segment(last, end, False))
+    return segments
+
+
+def get_encoder_parameters(video_path: str) -> dict:
+    """
+    Parameters of the encoder reproducing the video stream of the source,
+    None if the codec can not be smart cut
+    """
+    stream = get_information_about_stream(video_path, 'video')
+    if stream.get('codec_name') not in SMART_CUT_CODECS:
+        return None
+    encoder, bitstream_filter = SMART_CUT_CODECS[stream['codec_name']]
+    parameters = {'vcodec': encoder, 'bsf:v': bitstream_filter}
+    if 'pix_fmt' in stream:
+        parameters['pix_fmt'] = stream['pix_fmt']
+    if encoder == 'libx264' and stream.get('profile') in _X264_PROFILES:
+        parameters['profile:v'] = _X264_PROFILES[stream['profile']]
+    if 'bit_rate' in stream:
+        parameters['b:v'] = stream['bit_rate']
+    return parameters
+
+
+def render_segments(video_path: str,
+                    segments: list[Segment],
+                    tmpdir: str,
+                    encoder_parameters: dict) -> str:
+    """
+    Render the video stream of every segment into MPEG-TS parts (with in-band
+    codec parameters, so differently encoded parts can be joined) and write
+    the list of parts for the concat demuxer
+    :return: the path to the concat list
+    """
+    bitstream_filter = encoder_parameters['bsf:v']
+    part_paths = []
+    for index, segment in enumerate(segments):
+        part_path = os.path.join(tmpdir, 'part{}.ts'.format(index))
+        if segment.is_copy:
+            stream = ffmpeg.input(
+                video_path, ss=segment.start + _SEEK_EPSILON,
+                t=segment.end - segment.start - 2 * _SEEK_EPSILON
+            )
+            out = stream.video.output(part_path, vcodec='copy',
+                                      **{'bsf:v': bitstream_filter})
+        else:
+            stream = ffmpeg.input(video_path, ss=segment.start,
+                                  t=segment.end - segment.start)
+            out = stream.video.output(part_path, **encoder_parameters)
+        try:
+            # Silently, the cancellation scope of the caller applies
+            run_with_control(out, is_overwrite=True)
+        except ffmpeg.Error as e:
+            print(e.stderr.decode(), file=sys.stderr)
+            raise e
+        part_paths.append(part_path)
+    return write_concat_list(part_paths, os.path.join(tmpdir, 'segments.txt'))
+
+
+def plan_smart_cut(video_path: str,
+                   kept_ranges: list[tuple[float, float]],
+                   video_duration: float) -> list[Segment]:
+    """
+    Segments of all kept ranges of the video or None if nothing can be
+    stream-copied and the usual re-encoding is not slower
+    """
+    keyframes = get_keyframes(video_path)
+    segments = []
+    for start, end in kept_ranges:
+        if end - start > _SEEK_EPSILON:
+            segments.extend(plan_segments(keyframes, start, end, video_duration))
+    if not any(segment.is_copy for segment in segments):
+        return None
+    return segments
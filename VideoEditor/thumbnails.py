@@ -0,0 +1,228 @@
+from .utils import check_paths_correctness, get_video_duration, get_keyframes, write_concat_list
+from .probe_cache import get_file_identity
+from .file_cache import FileCache
+from bisect import bisect_right
+from math import ceil
+import tempfile
+import hashlib
+import shutil
+import ffmpeg
+import sys
+import re
+import os
+
+THUMBNAIL_CACHE_DIR_ENV = 'VIDEO_EDITOR_THUMBNAIL_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'video_editor_thumbnails')
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+DEFAULT_WIDTH = 160
+# Decoded after the last timestamp, so the frame showing it is surely read
+_DECODE_MARGIN = 1.0
+
+
+class ThumbnailCache(FileCache):
+    """
+    On-disk cache of the thumbnails keyed by the identity of the video file
+    (path, size, mtime_ns), the timestamp, the width and the extraction mode.
+    The modification time of an image is its last use, when the images take
+    more than max_bytes the least recently used ones are removed
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_SIZE):
+        super().__init__(cache_dir, max_bytes, '.jpg')
+
+    def get_path(self, video_path: str, timestamp: float, width: int, is_keyframe_only: bool) -> str:
+        return self.get_key_path(self._get_key(video_path, timestamp, width, is_keyframe_only))
+
+    @staticmethod
+    def _get_key(video_path: str, timestamp: float, width: int, is_keyframe_only: bool) -> str:
+        key = (*get_file_identity(video_path), round(timestamp, 3), width, is_keyframe_only)
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def lookup(self, video_path: str, timestamp: float, width: int, is_keyframe_only: bool = False):
+        """Path of the cached thumbnail, None if it is not extracted yet"""
+        return self.lookup_key(self._get_key(video_path, timestamp, width, is_keyframe_only))
+
+    def put(self, video_path: str, timestamp: float, width: int,
+            is_keyframe_only: bool, image_path: str) -> str:
+        """Copy the image into the cache, call evict after the puts"""
+        return self.put_file(self._get_key(video_path, timestamp, width, is_keyframe_only), image_path)
+
+
+thumbnail_cache = ThumbnailCache(os.environ.get(THUMBNAIL_CACHE_DIR_ENV, DEFAULT_CACHE_DIR))
+
+
+def get_interval_timestamps(duration: float, interval: float = None, count: int = None) -> list[float]:
+    """
+    Timestamps of a filmstrip: every interval seconds or count timestamps in
+    the middles of equal parts of the video
+    """
+    if (interval is None) == (count is None):
+        raise ValueError('Specify either interval or count of the thumbnails')
+    if interval is not None:
+        if interval <= 0:
+            raise ValueError('Interval should be positive, but given {}'.format(interval))
+        return [index * interval for index in range(ceil(duration / interval))]
+    if count <= 0:
+        raise ValueError('Count should be positive, but given {}'.format(count))
+    return [(index + 0.5) * duration / count for index in range(count)]
+
+
+def _get_keyframes_or_none(video_path: str):
+    try:
+        return get_keyframes(video_path) or None
+    except (ffmpeg.Error, OSError, KeyError, ValueError):
+        return None
+
+
+def _extract_frames(
+        video_path: str,
+        timestamps: list[float],
+        width: int,
+        directory: str,
+        is_keyframe_only: bool
+) -> dict[float, str]:
+    """
+    Extract the frames shown at the sorted timestamps with one ffmpeg process.
+    The decoding starts at the keyframe before the first timestamp and stops
+    after the last one, select keeps the first frame at or after every
+    timestamp
+    :return: image of every timestamp
+    """
+    keyframes = _get_keyframes_or_none(video_path)
+    start = timestamps[0]
+    if keyframes is not None:
+        start = keyframes[max(bisect_right(keyframes, timestamps[0]) - 1, 0)]
+    targets = {timestamp: timestamp - start for timestamp in timestamps}
+    input_kwargs = {'ss': start, 't': targets[timestamps[-1]] + _DECODE_MARGIN}
+    if is_keyframe_only:
+        # Only keyframes are decoded, with the index every timestamp gets the
+        # keyframe before it, otherwise the first keyframe after it
+        input_kwargs['skip_frame'] = 'nokey'
+        if keyframes is not None:
+            targets = {timestamp: keyframes[max(bisect_right(keyframes, timestamp) - 1, 0)] - start
+                       for timestamp in timestamps}
+    expression = '+'.join('gte(t,{0})*(isnan(prev_t)+lt(prev_t,{0}))'.format(target)
+                          for target in sorted(set(targets.values())))
+    out = (ffmpeg
+           .input(video_path, **input_kwargs)
+           .filter('select', expression)
+           .filter('scale', width, -2)
+           .filter('showinfo')
+           .output(os.path.join(directory, 'frame_%06d.jpg'), fps_mode='vfr', **{'q:v': 3}))
+    try:
+        _, error = out.run(capture_stdout=True, capture_stderr=True)
+    except ffmpeg.Error as e:
+        print(e.stderr.decode(), file=sys.stderr)
+        raise e
+    frame_times = [float(time) for time in
+                   re.findall(r'\bpts_time:\s*(-?[\d.]+)', error.decode(errors='replace'))]
+
+    images = {}
+    for timestamp, target in targets.items():
+        # The selected frames are exactly the frames crossing the targets
+        index = next((index for index, time in enumerate(frame_times) if time >= target - 1e-6),
+                     None)
+        if index is None:
+            raise ValueError('No frame at {} s in {}'.format(timestamp, video_path))
+        images[timestamp] = os.path.join(directory, 'frame_{:06d}.jpg'.format(index + 1))
+    return images
+
+
+def extract_thumbnails(
+        video_path: str,
+        timestamps: list[float],
+        width: int = DEFAULT_WIDTH,
+        output_dir: str = None,
+        is_keyframe_only: bool = False,
+        cache: ThumbnailCache = thumbnail_cache
+) -> list[str]:
+    """
+    Extract the frames at the timestamps in one decoding pass. Thumbnails
+    which are already in the cache are not extracted again
+    :param video_path: the absolute path to the video
+    :param timestamps: times of the frames in seconds
+    :param width: width of the thumbnails, the height keeps the aspect ratio
+    :param output_dir: directory to write thumbnail_0000.jpg, ... in the order
+     of the timestamps. Without it the paths point into the cache and stay
+     valid until they are evicted
+    :param is_keyframe_only: decode only the keyframes, every timestamp gets
+     the keyframe before it (after it if the video has no keyframe index).
+     Much faster for sparse filmstrips
+    :param cache: the cache of the thumbnails, None to extract all of them
+    :return: paths of the images in the order of the timestamps
+    """
+    check_paths_correctness(video_path)
+    if cache is None and output_dir is None:
+        raise ValueError('Without the cache the thumbnails need output_dir')
+    duration = get_video_duration(video_path)
+    for timestamp in timestamps:
+        if not 0 <= timestamp < duration:
+            raise ValueError('Time of the thumbnail ({}) beyond video duration({})'
+                             .format(timestamp, duration))
+
+    images = {}
+    if cache is not None:
+        for timestamp in set(timestamps):
+            images[timestamp] = cache.lookup(video_path, timestamp, width, is_keyframe_only)
+    missing = sorted(timestamp for timestamp in set(timestamps) if images.get(timestamp) is None)
+    with tempfile.TemporaryDirectory() as directory:
+        if missing:
+            extracted = _extract_frames(video_path, missing, width, directory, is_keyframe_only)
+            for timestamp, path in extracted.items():
+                images[timestamp] = path if cache is None else \
+                    cache.put(video_path, timestamp, width, is_keyframe_only, path)
+            if cache is not None:
+                cache.evict(keep=set(images.values()))
+
+        if output_dir is None:
+            return [images[timestamp] for timestamp in timestamps]
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for index, timestamp in enumerate(timestamps):
+            paths.append(os.path.join(output_dir, 'thumbnail_{:04d}.jpg'.format(index)))
+            shutil.copyfile(images[timestamp], paths[-1])
+        return paths
+
+
+def extract_filmstrip(
+        video_path: str,
+        count: int = None,
+        interval: float = None,
+        width: int = DEFAULT_WIDTH,
+        output_dir: str = None,
+        is_keyframe_only: bool = False,
+        cache: ThumbnailCache = thumbnail_cache
+) -> list[str]:
+    """
+    Thumbnails of the whole video every interval seconds or count thumbnails
+    evenly spaced, see extract_thumbnails for the other parameters
+    """
+    timestamps = get_interval_timestamps(get_video_duration(video_path), interval, count)
+    return extract_thumbnails(video_path, timestamps, width, output_dir, is_keyframe_only, cache)
+
+
+def make_sprite_sheet(image_paths: list[str], output_path: str, columns: int = 10) -> tuple[int, int]:
+    """
+    Tile the images of the same size into one image, row by row. Free tiles
+    of the last row are black
+    :param image_paths: paths to the images
+    :param output_path: the absolute path to the sprite sheet
+    :param columns: number of tiles in a row
+    :return: number of columns and rows
+    """
+    if not image_paths:
+        raise ValueError('No images for the sprite sheet')
+    columns = min(columns, len(image_paths))
+    rows = ceil(len(image_paths) / columns)
+    with tempfile.TemporaryDirectory() as directory:
+        list_path = write_concat_list(image_paths, os.path.join(directory, 'images.txt'))
+        try:
+            (ffmpeg
+             .input(list_path, f='concat', safe=0)
+             .filter('tile', '{}x{}'.format(columns, rows))
+             .output(output_path, vframes=1, **{'q:v': 3})
+             .run(overwrite_output=True, capture_stdout=True, capture_stderr=True))
+        except ffmpeg.Error as e:
+            print(e.stderr.decode(), file=sys.stderr)
+            raise e
+    return columns, rows
@@ -1,12 +1,18 @@
+from .mp4_reader import Mp4Metadata, Mp4ParseError, read_mp4_metadata
+from .probe_cache import probe_cache
 from collections.abc import Iterable
 from operator import floordiv
-from typing import Union
+from typing import Union, BinaryIO
 from enum import Enum
 import ffmpeg
+import shutil
 import sys
 import os
 
-Usage = Enum('Usage', ['GUI', 'CONSOLE'])
+# Bytes copied by one copy_file_range call
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+Usage = Enum('Usage', ['GUI', 'CONSOLE', 'SILENT'])
 
 
 class TimeIntervalError(Exception):
@@ -67,10 +73,21 @@ def scale_frame_in_bounds(
 ) -> tuple[int, int]:
     main_video_inf = get_information_about_stream(main_video_path, 'video')
     overlay_video_path = get_information_about_stream(overlay_path, 'video')
-    main_width, main_height = int(main_video_inf['width']), int(
-        main_video_inf['height'])
-    overlay_width, overlay_height = int(overlay_video_path['width']), int(
-        overlay_video_path['height'])
+    return fit_frame_in_bounds(
+        (int(main_video_inf['width']), int(main_video_inf['height'])),
+        (int(overlay_video_path['width']), int(overlay_video_path['height'])),
+        x_shift, y_shift
+    )
+
+
+def fit_frame_in_bounds(
+        main_size: tuple[int, int],
+        overlay_size: tuple[int, int],
+        x_shift: int = 0,
+        y_shift: int = 0
+) -> tuple[int, int]:
+    main_width, main_height = main_size
+    overlay_width, overlay_height = overlay_size
     if not 0 <= x_shift <= main_width or not 0 <= y_shift <= main_height:
         raise ValueError('Shifts go beyond the frame of the main video')
 
@@ -99,11 +116,26 @@ def try_scale(
     return base_value, scale_value
 
 
+def get_mp4_metadata(file: Union[str, ffmpeg.nodes.Node]) -> Union[Mp4Metadata, None]:
+    """Metadata read natively from MP4/MOV header, None if the file can not be read this way"""
+    if isinstance(file, ffmpeg.nodes.Node):
+        file = file.kwargs['filename']
+    if not isinstance(file, str):
+        return None
+    try:
+        return probe_cache.get(file, 'mp4', read_mp4_metadata, persistent=False)
+    except (Mp4ParseError, OSError):
+        return None
+
+
 def get_video_duration(file: Union[str, ffmpeg.nodes.Node]) -> float:
     if isinstance(file, ffmpeg.nodes.Node):
         file = file.kwargs['filename']
+    metadata = get_mp4_metadata(file)
+    if metadata is not None:
+        return metadata.duration
     try:
-        probe = ffmpeg.probe(file)
+        probe = probe_cache.probe(file)
         video_duration = float(probe['format']['duration'])
     except TypeError as e:
         raise TypeError('You can not get duration of {}'.format(type(file))) from e
@@ -115,12 +147,34 @@ def get_video_duration(file: Union[str, ffmpeg.nodes.Node]) -> float:
     return video_duration
 
 
+def get_keyframes(file: Union[str, ffmpeg.nodes.Node]) -> list[float]:
+    """Presentation times of the video keyframes in seconds, computed once per file"""
+    if isinstance(file, ffmpeg.nodes.Node):
+        file = file.kwargs['filename']
+    return probe_cache.get(file, 'keyframes', _read_keyframes)
+
+
+def _read_keyframes(file: str) -> list[float]:
+    metadata = get_mp4_metadata(file)
+    if metadata is not None:
+        return metadata.keyframes
+    try:
+        probe = ffmpeg.probe(file, select_streams='v:0',
+                             show_entries='packet=pts_time,flags')
+    except ffmpeg.Error as e:
+        print(e.stderr.decode(), file=sys.stderr)
+        raise e
+    return sorted(float(packet['pts_time']) for packet in probe.get('packets', [])
+                  if 'K' in packet.get('flags', '')
+                  and packet.get('pts_time', 'N/A') != 'N/A')
+
+
 def get_information_about_stream(file: Union[str, ffmpeg.nodes.Node],
                                  stream_name: str) -> dict:
     if isinstance(file, ffmpeg.nodes.Node):
         file = file.kwargs['filename']
     try:
-        probe = ffmpeg.probe(file)
+        probe = probe_cache.probe(file)
     except ffmpeg.Error as e:
         print(e.stderr.decode(), file=sys.stderr)
         raise e
@@ -134,13 +188,90 @@ def get_information_about_stream(file: Union[str, ffmpeg.nodes.Node],
     return video_stream
 
 
+def get_concat_signature(file: Union[str, ffmpeg.nodes.Node]) -> tuple:
+    """Stream parameters which must be equal for videos joined without re-encoding"""
+    video = get_information_about_stream(file, 'video')
+    try:
+        audio = get_information_about_stream(file, 'audio')
+    except FileNotFoundError:
+        audio = {}
+    return (
+        video.get('codec_name'), video.get('profile'), video.get('pix_fmt'),
+        video.get('width'), video.get('height'),
+        video.get('sample_aspect_ratio', '1:1'), video.get('avg_frame_rate'),
+        audio.get('codec_name'), audio.get('sample_rate'), audio.get('channels')
+    )
+
+
+def write_concat_list(paths: list[str], list_path: str, durations: list[float] = None) -> str:
+    """
+    Write the file list for ffmpeg concat demuxer. Durations (if given) set
+    the offsets of the next files instead of the durations read from the files
+    """
+    with open(list_path, 'w', encoding='utf-8') as concat_list:
+        for index, path in enumerate(paths):
+            concat_list.write("file '{}'\n".format(
+                os.path.abspath(path).replace("'", "'\\''")))
+            if durations is not None and index < len(durations):
+                concat_list.write('duration {}\n'.format(durations[index]))
+    return list_path
+
+
+def read_chunk(stream: BinaryIO, buffer: memoryview) -> int:
+    """Fill the buffer from the pipe, fewer bytes are read only at the end"""
+    filled = 0
+    while filled < len(buffer):
+        count = stream.readinto(buffer[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def copy_file(input_path: str, output_path: str) -> None:
+    """
+    Copy the file in the kernel: copy_file_range shares the blocks (a reflink)
+    on the file systems supporting it, like btrfs and XFS, and copies them
+    without passing through the user space on others
+    """
+    if not hasattr(os, 'copy_file_range'):
+        shutil.copyfile(input_path, output_path)
+        return
+    with open(input_path, 'rb') as input_file, open(output_path, 'wb') as output_file:
+        try:
+            while os.copy_file_range(input_file.fileno(), output_file.fileno(), COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError:
+            # Not supported between these file systems
+            output_file.seek(0)
+            output_file.truncate()
+    shutil.copyfile(input_path, output_path)
+
+
+def link_or_copy(input_path: str, output_path: str) -> None:
+    """Hard link the file, copy it if the link can not be made (other file system)"""
+    try:
+        os.link(input_path, output_path)
+    except OSError:
+        copy_file(input_path, output_path)
+
+
 def get_video_parameters(path_to_video: str,
                          width: int = None,
                          height: int = None,
                          sar: str = None,
                          fps: int = None,
                          ) -> tuple[int, int, int, str]:
-    video_information = get_information_about_stream(path_to_video, 'video')
+    metadata = get_mp4_metadata(path_to_video)
+    if metadata is not None:
+        video_information = {'width': metadata.width,
+                             'height': metadata.height,
+                             'avg_frame_rate': metadata.frame_rate}
+        if metadata.sar is not None:
+            video_information['sample_aspect_ratio'] = metadata.sar
+    else:
+        video_information = get_information_about_stream(path_to_video, 'video')
     width = video_information['width'] if width is None else width
     height = video_information['height'] if height is None else height
     fps = convert_ratio_to_int(video_information['avg_frame_rate']) if fps is None else fps
@@ -1,28 +1,61 @@
 from .utils import \
-    (check_paths_correctness, scale_frame_in_bounds, get_video_duration,
-     get_video_parameters, Usage, TimeIntervalError)
-from .progress_bar import \
-    show_progress_in_console, show_progress_in_gui
+    (check_paths_correctness, scale_frame_in_bounds, fit_frame_in_bounds,
+     get_video_duration, get_video_parameters, get_information_about_stream,
+     get_concat_signature, write_concat_list, copy_file, Usage, TimeIntervalError)
+from .progress_bar import ProgressEvent, console_progress_sink, gui_progress_sink
+from .render_control import CancellationToken, run_with_control
+from .smart_cut import plan_smart_cut, get_encoder_parameters, render_segments
+from .chunked_render import render_in_chunks
+from .encoding_profile import EncodingProfile
+from .merge_plan import \
+    (TRANSITION_DURATION, probe_stream_parameters, get_target_parameters, plan_merge)
 from collections import namedtuple
-from PyQt6.QtCore import QTime, QPointF
-from typing import Union
+from typing import Union, TYPE_CHECKING
+import contextlib
+import tempfile
 import ffmpeg
+import shlex
 import sys
+import os
+
+if TYPE_CHECKING:
+    from PyQt6.QtCore import QTime, QPointF
+    from .frame_filter import FrameFilter
+
+
+def _get_qt_class(name: str):
+    """
+    Class of PyQt6.QtCore if the module is already imported. Qt values can
+    exist only after the GUI imported it, so the headless usage never loads Qt
+    """
+    qt_core = sys.modules.get('PyQt6.QtCore')
+    return getattr(qt_core, name, None)
+
+
+def _is_qt_instance(value, name: str) -> bool:
+    qt_class = _get_qt_class(name)
+    return qt_class is not None and isinstance(value, qt_class)
 
 
 class TimeInterval:
     _begin = None
     _end = None
 
-    def __init__(self, start_time: Union[QTime, int], end_time: Union[QTime, int]):
+    def __init__(self, start_time: Union['QTime', int], end_time: Union['QTime', int]):
         try:
-            self._end = QTime(0, 0).secsTo(end_time) if isinstance(end_time, QTime) else end_time
-            self._begin = QTime(0, 0).secsTo(start_time) if isinstance(start_time, QTime) else start_time
+            self._end = self._to_seconds(end_time)
+            self._begin = self._to_seconds(start_time)
             self._check_interval_correctness()
         except TypeError:
             raise TypeError("In the values of the boundaries of the TimeInterval not PyQt6.QtCore.QTime or int:\n{}"
                             .format((type(start_time), type(end_time))))
 
+    @staticmethod
+    def _to_seconds(value: Union['QTime', int]) -> int:
+        if _is_qt_instance(value, 'QTime'):
+            return _get_qt_class('QTime')(0, 0).secsTo(value)
+        return value
+
     def get_duration_in_seconds(self) -> int:
         return self.end - self.begin
 
@@ -67,9 +100,10 @@ class Point:
     _x = None
     _y = None
 
-    def __init__(self, point: Union[QPointF, tuple[int, int]]):
-        self.x = int(point.x()) if isinstance(point, QPointF) else point[0]
-        self.y = int(point.y()) if isinstance(point, QPointF) else point[1]
+    def __init__(self, point: Union['QPointF', tuple[int, int]]):
+        is_qt_point = _is_qt_instance(point, 'QPointF')
+        self.x = int(point.x()) if is_qt_point else point[0]
+        self.y = int(point.y()) if is_qt_point else point[1]
 
     @property
     def x(self):
@@ -114,12 +148,16 @@ def merge_videos_and_save(
         sar: str = None,
         fps: int = None,
         is_overwrite: bool = False,
-        mode: Usage = Usage.GUI
+        mode: Usage = Usage.GUI,
+        with_transitions: bool = False,
+        is_dry_run: bool = False,
+        profile: EncodingProfile = None
 ) -> None:
     """
     Merge multiple videos and save result. If one of the options for the final
     video is not specified, this option is taken from the first video in the
-    list
+    list. Videos with the same codecs and stream parameters are joined without
+    re-encoding unless an encoding profile is given
     :param videos_paths: the absolute path to the videos which you want to merge
     :param path_to_save: the absolute path to the result video
     :param width: resulting video width
@@ -128,6 +166,11 @@ def merge_videos_and_save(
     :param sar: resulting video  SAR (Storage Aspect Ratio)
     :param is_overwrite: overwrites the video even if there is already a video in the save path
     :param mode: where to display progress: in the console or in the GUI
+    :param with_transitions: always render the merge through the filter graph
+     with fade transitions between videos
+    :param is_dry_run: print the chosen merge path and ffmpeg command instead of running it,
+     the list of videos of the stream copy is written next to the result video
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
     :return: None
     """
     if len(videos_paths) < 2:
@@ -136,13 +179,71 @@ def merge_videos_and_save(
             .format(len(videos_paths))
         )
 
-    width, height, fps, sar = get_video_parameters(videos_paths[0],
-                                                   width, height, fps, sar)
-    streams = open_videos(videos_paths)
-    merged_video = merge_videos(streams, width, height, fps, sar)
+    check_paths_correctness(videos_paths)
+    # The exact parameters of the first video, the frame rate stays a Fraction
+    # (30000/1001 is not rounded), only the given ones are overridden
+    first_video_parameters = probe_stream_parameters(ffmpeg.input(videos_paths[0]))
+    target_parameters = get_target_parameters(first_video_parameters, width, height, fps, sar)
     result_video_duration = sum(map(lambda v: get_video_duration(v), videos_paths))
+    reason = _get_reason_to_reencode(videos_paths, with_transitions,
+                                     first_video_parameters != target_parameters,
+                                     profile is not None)
+    if reason is None:
+        if is_dry_run:
+            print('Merge path: stream copy with concat demuxer')
+        _concat_and_save(videos_paths, path_to_save, is_overwrite,
+                         result_video_duration, mode, is_dry_run)
+        return
+
+    if is_dry_run:
+        print('Merge path: re-encoding filter graph ({})'.format(reason))
+    streams = open_videos(videos_paths)
+    merged_video = merge_videos(streams, width, height, fps, sar,
+                                transition_duration=TRANSITION_DURATION if with_transitions else 0)
     save_video(merged_video, path_to_save, is_overwrite=is_overwrite,
-               duration=result_video_duration, mode=mode)
+               duration=result_video_duration, mode=mode, is_dry_run=is_dry_run,
+               profile=profile)
+
+
+def _get_reason_to_reencode(
+        videos_paths: list[str],
+        with_transitions: bool,
+        is_changing_parameters: bool,
+        is_profile_given: bool = False
+) -> Union[str, None]:
+    if with_transitions:
+        return 'transitions are requested'
+    if is_profile_given:
+        return 'encoding profile is given'
+    if is_changing_parameters:
+        return 'resulting parameters differ from the videos'
+    signatures = set(map(get_concat_signature, videos_paths))
+    if len(signatures) > 1:
+        return 'videos have different codecs or stream parameters'
+    return None
+
+
+def _concat_and_save(
+        videos_paths: list[str],
+        path_to_save: str,
+        is_overwrite: bool,
+        duration: float,
+        mode: Usage,
+        is_dry_run: bool
+) -> None:
+    path_to_save = prepare_output_path(path_to_save)
+    with contextlib.ExitStack() as stack:
+        if is_dry_run:
+            # The list is kept next to the result, so the printed command can be run
+            concat_list_path = os.path.splitext(path_to_save)[0] + '_videos.txt'
+        else:
+            concat_list_path = os.path.join(
+                stack.enter_context(tempfile.TemporaryDirectory()), 'videos.txt')
+        write_concat_list(videos_paths, concat_list_path)
+        out = (ffmpeg
+               .input(concat_list_path, f='concat', safe=0)
+               .output(path_to_save, c='copy'))
+        run_output(out, is_overwrite, duration, mode, is_dry_run)
 
 
 def insert_video_and_save(
@@ -151,7 +252,8 @@ def insert_video_and_save(
         insert_time_in_seconds: int,
         path_to_save: str,
         is_overwrite: bool = False,
-        mode: Usage = Usage.GUI
+        mode: Usage = Usage.GUI,
+        profile: EncodingProfile = None
 ) -> None:
     """
     Insert one video in another and save result. If one of the options for the final
@@ -163,6 +265,7 @@ def insert_video_and_save(
     :param path_to_save: the absolute path to the result video
     :param is_overwrite: overwrites the video even if there is already a video in the save path
     :param mode: where to display progress: in the console or in the GUI
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
     :return: None
     """
     main_video_duration = get_video_duration(main_video_path)
@@ -177,19 +280,32 @@ def insert_video_and_save(
             [*insert_paths, main_video_path],
             path_to_save,
             is_overwrite=is_overwrite,
-            mode=mode)
+            mode=mode,
+            profile=profile)
         return
 
+    merged, result_video_duration = build_insert(main_video_path, insert_paths,
+                                                 insert_time_in_seconds, main_video_duration)
+    save_video(merged, path_to_save, is_overwrite, result_video_duration, mode,
+               profile=profile)
+
+
+def build_insert(
+        main_video_path: str,
+        insert_paths: list[str],
+        insert_time_in_seconds: int,
+        main_video_duration: float
+) -> tuple[ffmpeg.nodes.Node, float]:
+    """Graph of insert_video_and_save and the duration of its result"""
     result_video_parts = [
         open_videos(main_video_path, ss=0, t=insert_time_in_seconds),
         *open_videos(insert_paths),
         open_videos(main_video_path, ss=insert_time_in_seconds)
     ]
 
-    width, height, fps, sar = get_video_parameters(main_video_path)
     result_video_duration = main_video_duration + sum(map(lambda v: get_video_duration(v), insert_paths))
-    merged = merge_videos(result_video_parts, width, height, fps, sar)
-    save_video(merged, path_to_save, is_overwrite, result_video_duration, mode)
+    # The parameters of the merged video are the exact ones of the main video
+    return merge_videos(result_video_parts), result_video_duration
 
 
 def merge_videos(
@@ -198,37 +314,40 @@ def merge_videos(
         height: int = None,
         fps: int = None,
         sar: str = None,
-        unsafe_mod: bool = False
+        unsafe_mod: bool = False,
+        durations: list[float] = None,
+        transition_duration: float = 0
 ) -> ffmpeg.nodes.Node:
     """
-    Merge multiple videos and return its object representation
+    Merge multiple videos and return its object representation. The videos
+    are brought to the resulting parameters only by the filters which change
+    them, the filters are planned by merge_plan
     :param videos: video streams to concat
     :param width: resulting video width
     :param height: resulting video height
     :param fps: resulting video fps
     :param sar: resulting video  SAR (Storage Aspect Ratio)
-    :param unsafe_mod:
+    :param unsafe_mod: concat the streams as they are, for parts of one video
+    :param durations: durations of the videos, by default they are probed from
+     the input files
+    :param transition_duration: length of the fades between the videos in
+     seconds (TRANSITION_DURATION for the usual transitions), 0 for no fades
     :return: ffmpeg.nodes.Node
     """
-    concat_params = []
-    transition_duration = 0.25
-    for video in videos:
-        if unsafe_mod:
-            filtered_video = video.video
-        else:
-            filtered_video = (
-                ffmpeg.filter(video.video, 'scale', h=height, w=width)
-                .filter('setsar', sar=sar)
-                .filter('fps', fps=fps)
-            )
-            if video is not videos[0]:
-                filtered_video = ffmpeg.filter(filtered_video, 'fade', t="in",
-                                               st=transition_duration, d=transition_duration)
-            if video is not videos[-1]:
-                duration = get_video_duration(video.node)
-                filtered_video = ffmpeg.filter(filtered_video, 'fade', t="out",
-                                               st=duration - transition_duration, d=transition_duration)
+    if unsafe_mod:
+        parameters, target = [None] * len(videos), None
+    else:
+        parameters = list(map(probe_stream_parameters, videos))
+        target = get_target_parameters(parameters[0], width, height, fps, sar)
+    if transition_duration > 0 and durations is None:
+        durations = [get_video_duration(video.node) for video in videos[:-1]] + [None]
+    plan = plan_merge(parameters, target, durations, transition_duration)
 
+    concat_params = []
+    for video, filters in zip(videos, plan):
+        filtered_video = video.video
+        for name, kwargs in filters:
+            filtered_video = ffmpeg.filter(filtered_video, name, **kwargs)
         concat_params.extend((filtered_video, video.audio))
     return ffmpeg.concat(*concat_params, a=1).node
 
@@ -238,7 +357,9 @@ def trim_and_save_video(
         time_interval: TimeInterval,
         path_to_save: str,
         is_overwrite: bool = False,
-        mode: Usage = Usage.GUI
+        mode: Usage = Usage.GUI,
+        is_smart: bool = True,
+        profile: EncodingProfile = None
 ) -> None:
     """
     Trim the end and beginning of the video and save result
@@ -247,16 +368,24 @@ def trim_and_save_video(
     :param time_interval: time interval that should be included in the resulting video
     :param is_overwrite: overwrites the video even if there is already a video in the save path
     :param mode: where to display progress: in the console or in the GUI
+    :param is_smart: copy whole GOPs without re-encoding, only the partial GOPs
+     at the edges of the interval are re-encoded with the settings of the
+     source video. With an encoding profile the whole video is re-encoded
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
     :return: None
     """
     video_duration = get_video_duration(video_path)
     if not time_interval.in_range(video_duration):
         raise ValueError('Time to trim ({}) beyond video duration({})'
                          .format(time_interval.end, video_duration))
-    stream = open_videos(video_path)
     result_video_duration = time_interval.get_duration_in_seconds()
+    if is_smart and profile is None and smart_cut_and_save(
+            video_path, [(time_interval.begin, time_interval.end)], path_to_save,
+            video_duration, is_overwrite, result_video_duration, mode):
+        return
+    stream = open_videos(video_path)
     save_video(trim_video(stream, time_interval.begin, time_interval.end), path_to_save,
-               is_overwrite, result_video_duration, mode=mode)
+               is_overwrite, result_video_duration, mode=mode, profile=profile)
 
 
 def cut_part_and_save_video(
@@ -264,7 +393,9 @@ def cut_part_and_save_video(
         time_interval: TimeInterval,
         path_to_save: str,
         is_overwrite: bool = False,
-        mode: Usage = Usage.GUI
+        mode: Usage = Usage.GUI,
+        is_smart: bool = True,
+        profile: EncodingProfile = None
 ) -> None:
     """
     Cut part of the video and save result
@@ -273,25 +404,83 @@ def cut_part_and_save_video(
     :param time_interval: time interval that should be removed in given video
     :param is_overwrite: overwrites the video even if there is already a video in the save path
     :param mode: where to display progress: in the console or in the GUI
+    :param is_smart: copy whole GOPs without re-encoding, only the partial GOPs
+     at the edges of the interval are re-encoded with the settings of the
+     source video. With an encoding profile the whole video is re-encoded
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
     :return: None
     """
     video_duration = get_video_duration(video_path)
     if not time_interval.in_range(video_duration):
         raise ValueError('Time to cut beyond video duration')
     result_video_duration = video_duration - time_interval.get_duration_in_seconds()
+    kept_ranges = [(0, time_interval.begin), (time_interval.end, video_duration)]
+    if is_smart and profile is None and smart_cut_and_save(
+            video_path, kept_ranges, path_to_save,
+            video_duration, is_overwrite, result_video_duration, mode):
+        return
+    save_video(build_cut(video_path, time_interval),
+               path_to_save, is_overwrite, result_video_duration, mode, profile=profile)
+
+
+def build_cut(video_path: str, time_interval: TimeInterval) -> ffmpeg.nodes.Node:
+    """Graph of cut_part_and_save_video, the video without the interval"""
     video_parts_without_middle = [
         open_videos(video_path, ss=0, t=time_interval.begin),
         open_videos(video_path, ss=time_interval.end)
     ]
-    save_video(merge_videos(video_parts_without_middle, unsafe_mod=True),
-               path_to_save, is_overwrite, result_video_duration, mode)
+    return merge_videos(video_parts_without_middle, unsafe_mod=True)
+
+
+def smart_cut_and_save(
+        video_path: str,
+        kept_ranges: list[tuple[float, float]],
+        path_to_save: str,
+        video_duration: float,
+        is_overwrite: bool = False,
+        result_video_duration: float = None,
+        mode: Usage = Usage.GUI
+) -> bool:
+    """
+    Keep the given ranges of the video re-encoding only the partial GOPs at
+    their edges. The video stream of whole GOPs is copied, the audio is
+    re-encoded to stay in sync with the video
+    :param video_path: the absolute path to the source video
+    :param kept_ranges: ranges in seconds which should remain in the result
+    :param path_to_save: the absolute path to the result video
+    :param video_duration: duration of the source video
+    :param is_overwrite: overwrites the video even if there is already a video in the save path
+    :param result_video_duration: duration of the result to show progress
+    :param mode: where to display progress: in the console or in the GUI
+    :return: False if the video can not be smart cut and nothing was saved
+    """
+    check_paths_correctness(video_path)
+    encoder_parameters = get_encoder_parameters(video_path)
+    if encoder_parameters is None:
+        return False
+    segments = plan_smart_cut(video_path, kept_ranges, video_duration)
+    if segments is None:
+        return False
+
+    path_to_save = prepare_output_path(path_to_save)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        segments_list_path = render_segments(video_path, segments, tmpdir, encoder_parameters)
+        video = ffmpeg.input(segments_list_path, f='concat', safe=0).video
+        audio_parts = [open_videos(video_path, ss=start, t=end - start).audio
+                       for start, end in kept_ranges if end > start]
+        audio = audio_parts[0] if len(audio_parts) == 1 \
+            else ffmpeg.concat(*audio_parts, v=0, a=1)
+        out = ffmpeg.output(video, audio, path_to_save, vcodec='copy', acodec='aac')
+        run_output(out, is_overwrite, result_video_duration, mode)
+    return True
 
 
 def trim_video(
         input_video: ffmpeg.Stream,
         start_time: int,
         end_time: int,
-) -> ffmpeg.nodes.Node:
+        raw_format: bool = False
+) -> Union[ffmpeg.nodes.Node, tuple[ffmpeg.nodes.FilterableStream, ffmpeg.nodes.FilterableStream]]:
     pts = 'PTS-STARTPTS'
     video = (input_video.video
              .filter('trim', start=start_time, end=end_time)
@@ -299,7 +488,7 @@ def trim_video(
     audio = (input_video.audio
              .filter('atrim', start=start_time, end=end_time)
              .filter('asetpts', pts))
-    return ffmpeg.concat(video, audio, v=1, a=1).node
+    return (video, audio) if raw_format else ffmpeg.concat(video, audio, v=1, a=1).node
 
 
 def set_video_speed_and_save(
@@ -308,7 +497,8 @@ def set_video_speed_and_save(
         path_to_save: str,
         is_overwrite: bool = False,
         time_interval: TimeInterval = None,
-        mode: Usage = Usage.GUI
+        mode: Usage = Usage.GUI,
+        profile: EncodingProfile = None
 ) -> None:
     """
     Set speed of video and save result
@@ -319,8 +509,20 @@ def set_video_speed_and_save(
     :param mode: where to display progress: in the console or in the GUI
     :param time_interval: time interval of the video to which the playback
      speed change will be applied
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
     :return: None
     """
+    changed_speed_video, result_video_duration = build_speed_change(video_path, speed, time_interval)
+    save_video(changed_speed_video, path_to_save, is_overwrite,
+               result_video_duration, mode=mode, profile=profile)
+
+
+def build_speed_change(
+        video_path: str,
+        speed: Union[int, float, str],
+        time_interval: TimeInterval = None
+) -> tuple[ffmpeg.nodes.Node, float]:
+    """Graph of set_video_speed_and_save and the duration of its result"""
     speed = round(float(speed), 1) if isinstance(speed, str) else speed
     if speed < 0.5:
         raise ValueError('{} is very small'.format(speed))
@@ -346,8 +548,7 @@ def set_video_speed_and_save(
         result_video_duration = (time_interval.begin +
                                  time_interval.get_duration_in_seconds() * (1 / speed) +
                                  video_duration - time_interval.end)
-    save_video(changed_speed_video, path_to_save, is_overwrite,
-               result_video_duration, mode=mode)
+    return changed_speed_video, result_video_duration
 
 
 def set_video_speed(
@@ -369,7 +570,8 @@ def overlay_video_on_another_and_save(
         x_shift: int = 0,
         y_shift: int = 0,
         is_overwrite: bool = False,
-        mode: Usage = Usage.GUI
+        mode: Usage = Usage.GUI,
+        profile: EncodingProfile = None
 ) -> None:
     """
     Overlay one video or image in another video and save result
@@ -380,23 +582,44 @@ def overlay_video_on_another_and_save(
     :param y_shift: x-axis offset of the inserted video or image
     :param is_overwrite: overwrites the video even if there is already a video in the save path
     :param mode: where to display progress: in the console or in the GUI
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
     :return: None
     """
+    overlay_result, result_video_duration = build_overlay(main_video_path, overlay_path,
+                                                          x_shift, y_shift)
+    save_video(overlay_result, path_to_save, is_overwrite=is_overwrite,
+               duration=result_video_duration, mode=mode, profile=profile)
+
+
+def build_overlay(
+        main_video_path: str,
+        overlay_path: str,
+        x_shift: int = 0,
+        y_shift: int = 0
+) -> tuple[ffmpeg.nodes.Node, float]:
+    """Graph of overlay_video_on_another_and_save and the duration of its result"""
     overlay_height, overlay_width = scale_frame_in_bounds(main_video_path,
                                                           overlay_path,
                                                           x_shift, y_shift)
     main_video = open_videos(main_video_path)
     overlay_video = (open_videos(overlay_path, {'mp4', 'png', 'jpg'})
                      .filter('scale', overlay_width, overlay_height))
-    overlay_result = (
-        main_video
-        .overlay(overlay_video, x=x_shift, y=y_shift)
-        .concat(main_video.audio, a=1).node
-    )
+    overlay_result = overlay_video_on_another(main_video, overlay_video, x_shift, y_shift)
     result_video_duration = max(get_video_duration(main_video_path),
                                 get_video_duration(overlay_path))
-    save_video(overlay_result, path_to_save, is_overwrite=is_overwrite,
-               duration=result_video_duration, mode=mode)
+    return overlay_result, result_video_duration
+
+
+def overlay_video_on_another(
+        input_video: ffmpeg.Stream,
+        overlay_video: ffmpeg.Stream,
+        x_shift: int = 0,
+        y_shift: int = 0,
+        raw_format: bool = False
+) -> Union[ffmpeg.nodes.Node, tuple[ffmpeg.nodes.FilterableStream, ffmpeg.nodes.FilterableStream]]:
+    video = input_video.video.overlay(overlay_video, x=x_shift, y=y_shift)
+    return (video, input_video.audio) if raw_format \
+        else ffmpeg.concat(video, input_video.audio, v=1, a=1).node
 
 
 def crop_and_save(
@@ -405,7 +628,8 @@ def crop_and_save(
         point1: Point,
         point2: Point,
         is_overwrite: bool = False,
-        mode: Usage = Usage.GUI
+        mode: Usage = Usage.GUI,
+        profile: EncodingProfile = None
 ) -> None:
     """
     Crop video and save result
@@ -415,9 +639,24 @@ def crop_and_save(
     :param point2: bottom right corner coordinate of cropped video
     :param is_overwrite: overwrites the video even if there is already a video in the save path
     :param mode: where to display progress: in the console or in the GUI
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
     :return: None
     """
+    cropped, result_video_duration = build_crop(video_path, point1, point2)
+    save_video(cropped, path_to_save, is_overwrite, result_video_duration, mode, profile=profile)
+
+
+def build_crop(video_path: str, point1: Point, point2: Point) -> tuple[ffmpeg.nodes.Node, float]:
+    """Graph of crop_and_save and the duration of its result"""
     width, height, _, _ = get_video_parameters(video_path)
+    check_crop_boundaries(width, height, point1, point2)
+
+    stream = open_videos(video_path)
+    result_video_duration = get_video_duration(video_path)
+    return crop_video(stream, point1, point2), result_video_duration
+
+
+def check_crop_boundaries(width: int, height: int, point1: Point, point2: Point) -> None:
     if not((point2 - point1) >= 0):
         raise ValueError('Cropping boundaries are incorrectly specified:\nupper left: {}\nbottom right {}'
                          .format(point1, point2))
@@ -425,19 +664,52 @@ def crop_and_save(
         raise ValueError('The crop point extends beyond the boundaries of the video:\nupper left: {}\nbottom right {}'
                          .format(point1, point2))
 
-    stream = open_videos(video_path)
-    result_video_duration = get_video_duration(video_path)
-    cropped = (ffmpeg
-               .crop(stream, point1.x, point2.x, point2.x - point1.x, point2.y - point1.y)
-               .concat(stream.audio, a=1))
-    save_video(cropped, path_to_save, is_overwrite, result_video_duration, mode)
 
+def crop_video(
+        input_video: ffmpeg.Stream,
+        point1: Point,
+        point2: Point,
+        raw_format: bool = False
+) -> Union[ffmpeg.nodes.Node, tuple[ffmpeg.nodes.FilterableStream, ffmpeg.nodes.FilterableStream]]:
+    video = input_video.video.crop(point1.x, point1.y, point2.x - point1.x, point2.y - point1.y)
+    return (video, input_video.audio) if raw_format \
+        else ffmpeg.concat(video, input_video.audio, v=1, a=1).node
+
+
+def copy_video(
+        input_path: str,
+        output_path: str,
+        is_overwrite: bool = True,
+        mode: Usage = Usage.GUI
+) -> None:
+    """
+    Copy the video without re-encoding. A video of the same container is copied
+    by the kernel (see copy_file), a video of another container is remuxed with
+    the streams copied. The copy is never a hard link: a later write to one of
+    the paths would change the other one, e.g. a render kept in a cache
+    :param input_path: the absolute path to the video
+    :param output_path: the absolute path to the copy
+    :param is_overwrite: overwrites the video even if there is already a video in the save path
+    :param mode: where to display progress of the remuxing: in the console or in the GUI
+    :return: None
+    """
+    check_paths_correctness(input_path)
+    if not is_overwrite and os.path.exists(output_path):
+        raise FileExistsError('{} already exists'.format(output_path))
+
+    if os.path.splitext(input_path)[1].lower() == os.path.splitext(output_path)[1].lower():
+        # Written beside and renamed, so a failed copy leaves no partial video
+        temp_path = '{}.{}.tmp'.format(output_path, os.getpid())
+        try:
+            copy_file(input_path, temp_path)
+            os.replace(temp_path, output_path)
+            return
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
 
-def copy_video(input_path: str, output_path: str, is_overwrite: bool = True) -> None:
-    video = open_videos(input_path)
-    video_duration = get_video_duration(input_path)
-    save_video(video, output_path, duration=video_duration,
-               is_overwrite=is_overwrite, mode=Usage.GUI)
+    out = ffmpeg.input(input_path).output(output_path, c='copy')
+    run_output(out, is_overwrite, get_video_duration(input_path), mode)
 
 
 def generate_thumbnail(
@@ -468,35 +740,247 @@ def generate_thumbnail(
         raise e
 
 
+class EditPipeline:
+    """
+    Deferred chain of editing operations on one video. Operations are only
+    recorded, on save they are compiled into one filter graph and rendered by
+    one ffmpeg run, so there are no intermediate files and re-encodings
+    """
+
+    def __init__(self, video_path: str):
+        self.video_path = video_path
+        self.operations = []
+        self._video = None
+        self._duration = None
+        self._width, self._height, self._fps, self._sar = None, None, None, None
+
+    def trim(self, time_interval: TimeInterval) -> 'EditPipeline':
+        self.operations.append(('trim', (time_interval,)))
+        return self
+
+    def set_speed(self, speed: Union[int, float, str]) -> 'EditPipeline':
+        self.operations.append(('set_speed', (speed,)))
+        return self
+
+    def crop(self, point1: Point, point2: Point) -> 'EditPipeline':
+        self.operations.append(('crop', (point1, point2)))
+        return self
+
+    def overlay(self, overlay_path: str, x_shift: int = 0, y_shift: int = 0) -> 'EditPipeline':
+        self.operations.append(('overlay', (overlay_path, x_shift, y_shift)))
+        return self
+
+    def merge(self, videos_paths: Union[str, list[str]]) -> 'EditPipeline':
+        if isinstance(videos_paths, str):
+            videos_paths = [videos_paths]
+        self.operations.append(('merge', (videos_paths,)))
+        return self
+
+    def compile(self) -> tuple[FilterableStream, float]:
+        """
+        Build the filter graph of all recorded operations
+        :return: resulting video and audio streams and the resulting duration
+        """
+        stream = open_videos(self.video_path)
+        self._video = FilterableStream(stream.video, stream.audio)
+        self._duration = get_video_duration(self.video_path)
+        self._width, self._height, _, self._sar = get_video_parameters(self.video_path)
+        # get_video_parameters rounds the frame rate down, 30000/1001 would become 29
+        self._fps = probe_stream_parameters(stream).fps
+        for name, args in self.operations:
+            getattr(self, '_compile_{}'.format(name))(*args)
+        return self._video, self._duration
+
+    def save(
+            self,
+            path_to_save: str,
+            is_overwrite: bool = False,
+            mode: Usage = Usage.GUI,
+            is_dry_run: bool = False,
+            chunks: int = None,
+            profile: EncodingProfile = None,
+            frame_filter: 'FrameFilter' = None
+    ) -> None:
+        """
+        Render all recorded operations and save result
+        :param path_to_save: the absolute path to the result video
+        :param is_overwrite: overwrites the video even if there is already a video in the save path
+        :param mode: where to display progress: in the console or in the GUI
+        :param is_dry_run: print the ffmpeg command instead of running it
+        :param chunks: render in up to this number of parallel chunks (see save_video)
+        :param profile: settings of the video encoder, by default the ffmpeg defaults
+        :param frame_filter: Python function applied to the resulting frames (see save_video)
+        :return: None
+        """
+        video, duration = self.compile()
+        save_video(video, path_to_save, is_overwrite, duration, mode, is_dry_run, chunks, profile,
+                   frame_filter=frame_filter)
+
+    def _compile_trim(self, time_interval: TimeInterval) -> None:
+        if not time_interval.in_range(self._duration):
+            raise ValueError('Time to trim ({}) beyond video duration({})'
+                             .format(time_interval.end, self._duration))
+        self._video = FilterableStream(
+            *trim_video(self._video, time_interval.begin, time_interval.end, raw_format=True))
+        self._duration = time_interval.get_duration_in_seconds()
+
+    def _compile_set_speed(self, speed: Union[int, float, str]) -> None:
+        speed = round(float(speed), 1) if isinstance(speed, str) else speed
+        if speed < 0.5:
+            raise ValueError('{} is very small'.format(speed))
+        self._video = FilterableStream(*set_video_speed(self._video, speed, raw_format=True))
+        self._duration *= 1 / speed
+
+    def _compile_crop(self, point1: Point, point2: Point) -> None:
+        check_crop_boundaries(self._width, self._height, point1, point2)
+        self._video = FilterableStream(*crop_video(self._video, point1, point2, raw_format=True))
+        self._width, self._height = point2.x - point1.x, point2.y - point1.y
+
+    def _compile_overlay(self, overlay_path: str, x_shift: int, y_shift: int) -> None:
+        overlay_information = get_information_about_stream(overlay_path, 'video')
+        overlay_height, overlay_width = fit_frame_in_bounds(
+            (self._width, self._height),
+            (int(overlay_information['width']), int(overlay_information['height'])),
+            x_shift, y_shift
+        )
+        overlay_video = (open_videos(overlay_path, {'mp4', 'png', 'jpg'})
+                         .filter('scale', overlay_width, overlay_height))
+        self._video = FilterableStream(*overlay_video_on_another(
+            self._video, overlay_video, x_shift, y_shift, raw_format=True))
+        self._duration = max(self._duration, get_video_duration(overlay_path))
+
+    def _compile_merge(self, videos_paths: list[str]) -> None:
+        durations = [self._duration, *map(get_video_duration, videos_paths)]
+        merged = merge_videos([self._video, *open_videos(videos_paths)],
+                              self._width, self._height, self._fps, self._sar,
+                              durations=durations)
+        self._video = FilterableStream(merged[0], merged[1])
+        self._duration = sum(durations)
+
+
 def save_video(
-        video: Union[ffmpeg.Stream, ffmpeg.nodes.Node],
+        video: Union[ffmpeg.Stream, ffmpeg.nodes.Node, FilterableStream],
         output_path: str,
         is_overwrite: bool = False,
         duration: float = None,
         mode: Usage = Usage.CONSOLE,
+        is_dry_run: bool = False,
+        chunks: int = None,
+        profile: EncodingProfile = None,
+        cancel_token: CancellationToken = None,
+        timeout: float = None,
+        stall_timeout: float = None,
+        frame_filter: 'FrameFilter' = None,
 ) -> None:
+    """
+    Render the video and save it
+    :param video: the video (and audio) streams to render
+    :param output_path: the absolute path to the result video
+    :param is_overwrite: overwrites the video even if there is already a video in the save path
+    :param duration: duration of the result to show progress
+    :param mode: where to display progress: in the console or in the GUI
+    :param is_dry_run: print the ffmpeg command instead of running it
+    :param chunks: render in up to this number of chunks split at keyframes in
+     parallel ffmpeg processes. Only for graphs reading one video without
+     seeking and concatenation of parts, other graphs are rendered as usual
+    :param profile: settings of the video encoder, by default the ffmpeg defaults
+    :param cancel_token: stops the render when cancelled
+    :param timeout: stops the render if it takes longer, in seconds
+    :param stall_timeout: stops the render if ffmpeg does not output new
+     frames for so long, in seconds. A stopped render raises
+     RenderInterruptedError and its partial result is removed. With chunks
+     these three options apply to the whole render of all the chunks
+    :param frame_filter: Python function applied to the frames in a pool of
+     processes (see frame_filter.FrameFilter). The result is rendered without
+     the chunks, the progress and the control options
+    :return: None
+    """
+    if frame_filter is not None:
+        if is_dry_run:
+            raise ValueError('Render with a frame filter is not one ffmpeg command to show')
+        # NumPy and the frame pipes are loaded only for the frame filters
+        from .frame_filter import filter_and_save
+        filter_and_save(video, output_path, frame_filter, is_overwrite, profile)
+        return
+    output_path = prepare_output_path(output_path)
+    out = make_output(video, output_path, profile)
+
+    if chunks is not None and chunks > 1 and not is_dry_run:
+        with _get_lazy_progress_view(duration, mode) as sink:
+            is_rendered = render_in_chunks(out, output_path, chunks, is_overwrite,
+                                           cancel_token=cancel_token, timeout=timeout,
+                                           stall_timeout=stall_timeout, sinks=[sink])
+        if is_rendered:
+            return
+    run_output(out, is_overwrite, duration, mode, is_dry_run,
+               cancel_token, timeout, stall_timeout)
+
+
+def make_output(
+        video: Union[ffmpeg.Stream, ffmpeg.nodes.Node, FilterableStream],
+        output_path: str,
+        profile: EncodingProfile = None
+) -> ffmpeg.nodes.OutputStream:
+    output_kwargs = profile.get_output_kwargs() if profile is not None else {}
+
+    if isinstance(video, ffmpeg.Stream):
+        return ffmpeg.output(video, output_path, **output_kwargs)
+    elif isinstance(video, FilterableStream):
+        return ffmpeg.output(video.video, video.audio, output_path, **output_kwargs)
+    elif isinstance(video, ffmpeg.nodes.Node):
+        return ffmpeg.output(video[0], video[1], output_path, **output_kwargs)
+    raise ValueError(f'{type(video)} can not save')
+
+
+def prepare_output_path(output_path: str) -> str:
     if not output_path.endswith('.mp4'):
         output_path += '.mp4'
     check_paths_correctness(output_path, is_existing=False)
+    return output_path
 
-    if isinstance(video, ffmpeg.Stream):
-        out = ffmpeg.output(video, output_path)
-    elif isinstance(video, ffmpeg.nodes.Node):
-        out = ffmpeg.output(video[0], video[1], output_path)
-    else:
-        raise ValueError(f'{type(video)} can not save')
-
-    if duration is not None:
-        view = show_progress_in_console if mode is Usage.CONSOLE \
-            else show_progress_in_gui
-        with view(duration) as socket_filename:
-            (out
-             .global_args('-progress', 'unix://{}'.format(socket_filename))
-             .run(overwrite_output=is_overwrite, capture_stdout=mode is Usage.GUI,
-                  capture_stderr=mode is Usage.GUI)
-             )
-    else:
-        out.run(overwrite_output=is_overwrite)
+
+def run_output(
+        out: ffmpeg.nodes.OutputStream,
+        is_overwrite: bool = False,
+        duration: float = None,
+        mode: Usage = Usage.CONSOLE,
+        is_dry_run: bool = False,
+        cancel_token: CancellationToken = None,
+        timeout: float = None,
+        stall_timeout: float = None,
+) -> None:
+    if is_dry_run:
+        print(shlex.join(out.compile(overwrite_output=is_overwrite)))
+        return
+    with _get_progress_view(duration, mode) as sink:
+        run_with_control(out, is_overwrite, cancel_token, timeout, stall_timeout,
+                         [] if sink is None else [sink], is_log_shown=mode is Usage.CONSOLE)
+
+
+def _get_progress_view(duration: float, mode: Usage) -> contextlib.AbstractContextManager:
+    """Context manager of the sink showing the progress, the sink is None in silent mode"""
+    if mode is Usage.SILENT or duration is None:
+        return contextlib.nullcontext()
+    return console_progress_sink(duration) if mode is Usage.CONSOLE \
+        else gui_progress_sink(duration)
+
+
+@contextlib.contextmanager
+def _get_lazy_progress_view(duration: float, mode: Usage):
+    """
+    The sink of _get_progress_view opened on the first progress, so nothing
+    is shown for a render which falls back to another way before it starts
+    """
+    with contextlib.ExitStack() as stack:
+        opened_sinks = []
+
+        def sink(event: ProgressEvent) -> None:
+            if not opened_sinks:
+                opened_sinks.append(stack.enter_context(_get_progress_view(duration, mode)))
+            if opened_sinks[0] is not None:
+                opened_sinks[0](event)
+
+        yield sink
 
 
 def open_videos(input_paths: Union[list[str], str],
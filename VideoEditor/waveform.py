@@ -0,0 +1,247 @@
+from .utils import check_paths_correctness, read_chunk
+from .probe_cache import get_file_identity
+from typing import BinaryIO
+import numpy as np
+import tempfile
+import ffmpeg
+import json
+import os
+
+SAMPLE_RATE = 22050
+# Samples of the finest level per peak and the ratio between the levels
+BLOCK_SIZE = 64
+LEVEL_FACTOR = 4
+# Samples read from ffmpeg at once, a multiple of BLOCK_SIZE
+CHUNK_SAMPLES = BLOCK_SIZE * 8192
+# Groups of peaks reduced at once when the coarser levels are built
+_REDUCE_GROUPS = 65536
+
+
+def get_sidecar_paths(video_path: str, sidecar_path: str = None) -> tuple[str, str]:
+    """Paths of the .npy peaks and of their .json description"""
+    sidecar_path = sidecar_path or video_path + '.peaks.npy'
+    return sidecar_path, sidecar_path.removesuffix('.npy') + '.json'
+
+
+class WaveformPyramid:
+    """
+    Min/max peaks of the audio at several resolutions, memory-mapped from the
+    sidecar. Level 0 has a peak per block_size samples, every next level a
+    peak per level_factor peaks of the previous one. Peaks are int16 pairs
+    (min, max)
+    """
+
+    def __init__(self, peaks: np.ndarray, levels: list[tuple[int, int]],
+                 sample_rate: int, block_size: int, level_factor: int):
+        """
+        :param peaks: all levels one after another, shape (N, 2)
+        :param levels: offset and length of every level in peaks
+        :param sample_rate: sample rate of the decoded audio
+        :param block_size: samples per peak of level 0
+        :param level_factor: peaks of a level per peak of the next level
+        """
+        self.peaks = peaks
+        self.levels = levels
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.level_factor = level_factor
+
+    @property
+    def duration(self) -> float:
+        return self.levels[0][1] * self.block_size / self.sample_rate
+
+    def get_level(self, level: int) -> np.ndarray:
+        offset, length = self.levels[level]
+        return self.peaks[offset:offset + length]
+
+    def get_seconds_per_peak(self, level: int) -> float:
+        return self.block_size * self.level_factor ** level / self.sample_rate
+
+    def get_peaks(self, start_time: float, end_time: float, width: int) -> np.ndarray:
+        """
+        Peaks of the time range for drawing it in width columns. Only the
+        peaks of the coarsest level still finer than a column are read
+        :return: array of shape (width, 2) with min and max of every column
+        """
+        if width <= 0 or end_time <= start_time:
+            raise ValueError('Wrong range of the waveform: {}-{} s in {} columns'
+                             .format(start_time, end_time, width))
+        seconds_per_column = (end_time - start_time) / width
+        level = 0
+        while level + 1 < len(self.levels) and \
+                self.get_seconds_per_peak(level + 1) <= seconds_per_column:
+            level += 1
+        peaks = self.get_level(level)
+        seconds_per_peak = self.get_seconds_per_peak(level)
+        bounds = np.linspace(start_time, end_time, width + 1) / seconds_per_peak
+        bounds = np.clip(bounds.astype(np.int64), 0, len(peaks))
+        first, last = bounds[0], max(bounds[-1], bounds[0] + 1)
+        selected = np.asarray(peaks[first:min(last, len(peaks))])
+        result = np.zeros((width, 2), dtype=np.int16)
+        if len(selected) == 0:
+            return result
+        # A column narrower than a peak repeats the peak under it
+        starts = np.minimum(bounds[:-1] - first, len(selected) - 1)
+        result[:, 0] = np.minimum.reduceat(selected[:, 0], starts)
+        result[:, 1] = np.maximum.reduceat(selected[:, 1], starts)
+        return result
+
+
+def _reduce_blocks(samples: np.ndarray, block_size: int) -> np.ndarray:
+    """Min/max of every block of the samples, the last block may be partial"""
+    whole = len(samples) // block_size * block_size
+    blocks = samples[:whole].reshape(-1, block_size)
+    peaks = np.empty((len(blocks) + (whole < len(samples)), 2), dtype=np.int16)
+    peaks[:len(blocks), 0] = blocks.min(axis=1)
+    peaks[:len(blocks), 1] = blocks.max(axis=1)
+    if whole < len(samples):
+        peaks[-1] = samples[whole:].min(), samples[whole:].max()
+    return peaks
+
+
+def _reduce_peaks(peaks: np.ndarray, factor: int) -> np.ndarray:
+    """Coarser level of the peaks, the last group may be partial"""
+    whole = len(peaks) // factor * factor
+    groups = peaks[:whole].reshape(-1, factor, 2)
+    result = np.empty((len(groups) + (whole < len(peaks)), 2), dtype=np.int16)
+    result[:len(groups), 0] = groups[:, :, 0].min(axis=1)
+    result[:len(groups), 1] = groups[:, :, 1].max(axis=1)
+    if whole < len(peaks):
+        result[-1] = peaks[whole:, 0].min(), peaks[whole:, 1].max()
+    return result
+
+
+def _stream_finest_level(video_path: str, output: BinaryIO, sample_rate: int,
+                         block_size: int, chunk_samples: int) -> int:
+    """
+    Decode the first audio stream to mono PCM and write the peaks of level 0
+    to the file. Chunks are read into one preallocated buffer
+    :return: number of the peaks
+    """
+    process = (ffmpeg
+               .input(video_path)
+               .output('pipe:', map='0:a:0', f='s16le', acodec='pcm_s16le', ac=1, ar=sample_rate)
+               .global_args('-v', 'error', '-nostdin')
+               .run_async(pipe_stdout=True, pipe_stderr=True))
+    samples = np.empty(chunk_samples, dtype=np.int16)
+    buffer = memoryview(samples).cast('B')
+    count = 0
+    try:
+        while True:
+            filled = read_chunk(process.stdout, buffer)
+            if filled == 0:
+                break
+            peaks = _reduce_blocks(samples[:filled // 2], block_size)
+            output.write(peaks.tobytes())
+            count += len(peaks)
+            if filled < len(buffer):
+                break
+        error = process.stderr.read()
+        process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+    if process.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', b'', error)
+    return count
+
+
+def build_waveform(
+        video_path: str,
+        sidecar_path: str = None,
+        sample_rate: int = SAMPLE_RATE,
+        block_size: int = BLOCK_SIZE,
+        level_factor: int = LEVEL_FACTOR,
+        chunk_samples: int = CHUNK_SAMPLES
+) -> WaveformPyramid:
+    """
+    Decode the audio once and store its peak pyramid in the sidecar. Memory
+    does not depend on the length of the file: the audio is reduced chunk by
+    chunk and the coarser levels are built from the memory-mapped finer ones
+    :param video_path: the absolute path to the video
+    :param sidecar_path: path to the .npy file, by default next to the video
+    :param sample_rate: sample rate of the decoded audio
+    :param block_size: samples per peak of the finest level
+    :param level_factor: peaks of a level per peak of the next level
+    :param chunk_samples: samples read from ffmpeg at once, a multiple of block_size
+    :return: the pyramid memory-mapped from the sidecar
+    """
+    check_paths_correctness(video_path)
+    if chunk_samples % block_size:
+        raise ValueError('Chunk of {} samples is not a multiple of the block of {}'
+                         .format(chunk_samples, block_size))
+    sidecar_path, description_path = get_sidecar_paths(video_path, sidecar_path)
+    with tempfile.TemporaryFile() as finest:
+        finest_length = _stream_finest_level(video_path, finest, sample_rate,
+                                             block_size, chunk_samples)
+        if finest_length == 0:
+            raise ValueError('{} has no audio samples'.format(video_path))
+        levels = [(0, finest_length)]
+        while levels[-1][1] > 1:
+            offset, length = levels[-1]
+            levels.append((offset + length, -(-length // level_factor)))
+
+        temp_path = '{}.{}.tmp.npy'.format(sidecar_path.removesuffix('.npy'), os.getpid())
+        peaks = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.int16,
+                                          shape=(sum(length for _, length in levels), 2))
+        try:
+            finest.flush()
+            finest_peaks = np.memmap(finest, dtype=np.int16, mode='r', shape=(finest_length, 2))
+            chunk = level_factor * _REDUCE_GROUPS
+            for start in range(0, finest_length, chunk):
+                end = min(start + chunk, finest_length)
+                peaks[start:end] = finest_peaks[start:end]
+            del finest_peaks
+            for (previous_offset, previous_length), (offset, _) in zip(levels, levels[1:]):
+                # Chunks are multiples of the factor, so the groups never straddle them
+                for start in range(0, previous_length, chunk):
+                    part = peaks[previous_offset + start:
+                                 previous_offset + min(start + chunk, previous_length)]
+                    reduced = _reduce_peaks(np.asarray(part), level_factor)
+                    position = offset + start // level_factor
+                    peaks[position:position + len(reduced)] = reduced
+            peaks.flush()
+            del peaks
+            os.replace(temp_path, sidecar_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    _, size, mtime_ns = get_file_identity(video_path)
+    description = {'size': size, 'mtime_ns': mtime_ns, 'sample_rate': sample_rate,
+                   'block_size': block_size, 'level_factor': level_factor, 'levels': levels}
+    with open(description_path, 'w', encoding='utf-8') as file:
+        json.dump(description, file)
+    return WaveformPyramid(np.load(sidecar_path, mmap_mode='r'), levels,
+                           sample_rate, block_size, level_factor)
+
+
+def load_waveform(video_path: str, sidecar_path: str = None, **kwargs) -> WaveformPyramid:
+    """
+    The pyramid of the video from its sidecar, it is built when the sidecar is
+    missing, made with other parameters or older than the video
+    :param kwargs: parameters of build_waveform
+    """
+    sidecar_path, description_path = get_sidecar_paths(video_path, sidecar_path)
+    try:
+        with open(description_path, encoding='utf-8') as file:
+            description = json.load(file)
+        _, size, mtime_ns = get_file_identity(video_path)
+        parameters = {'sample_rate': SAMPLE_RATE, 'block_size': BLOCK_SIZE,
+                      'level_factor': LEVEL_FACTOR, **kwargs}
+        is_actual = (description['size'], description['mtime_ns']) == (size, mtime_ns) and all(
+            description[name] == parameters[name]
+            for name in ('sample_rate', 'block_size', 'level_factor'))
+        if is_actual:
+            return WaveformPyramid(np.load(sidecar_path, mmap_mode='r'),
+                                   [tuple(level) for level in description['levels']],
+                                   description['sample_rate'], description['block_size'],
+                                   description['level_factor'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_waveform(video_path, sidecar_path, **kwargs)
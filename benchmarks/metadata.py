@@ -0,0 +1,38 @@
+from VideoEditor.mp4_reader import read_mp4_metadata
+from typing import Callable
+import ffmpeg
+import time
+import glob
+import os
+
+
+def measure(func: Callable[[str], object], path: str, repeats: int) -> float:
+    """Mean time of one call in seconds"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func(path)
+    return (time.perf_counter() - start) / repeats
+
+
+def compare_metadata_readers(paths: list[str], repeats: int = 20) -> list[tuple[str, float, float]]:
+    """
+    Compare native MP4 header reader with ffprobe on the given files
+    :param paths: paths to the videos
+    :param repeats: number of calls for each file and reader
+    :return: file name, native reader time and ffprobe time in seconds
+    """
+    results = []
+    for path in paths:
+        native_time = measure(read_mp4_metadata, path, repeats)
+        ffprobe_time = measure(ffmpeg.probe, path, max(1, repeats // 10))
+        results.append((os.path.basename(path), native_time, ffprobe_time))
+    return results
+
+
+if __name__ == "__main__":
+    project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    video_paths = sorted(glob.glob(os.path.join(project_directory, 'resources', '*.mp4')))
+    print('{:<24}{:>14}{:>14}{:>10}'.format('file', 'native, us', 'ffprobe, us', 'speedup'))
+    for name, native, ffprobe in compare_metadata_readers(video_paths):
+        print('{:<24}{:>14.1f}{:>14.1f}{:>9.0f}x'
+              .format(name, native * 1e6, ffprobe * 1e6, ffprobe / native))
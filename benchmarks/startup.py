@@ -0,0 +1,55 @@
+import subprocess
+import sys
+import os
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cumulative import time of the CLI in seconds, checked by the tests
+STARTUP_BUDGET = 0.3
+# Modules which only the GUI and the progress views need
+HEAVY_MODULES = ('PyQt6', 'PySimpleGUI', 'gevent', 'tqdm', 'gui')
+
+
+def measure_imports(module: str = 'video_editor_parser') -> dict[str, float]:
+    """
+    Import the module in a new interpreter with -X importtime
+    :param module: name of the module to import from the project directory
+    :return: cumulative import time in seconds of every imported module
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        cwd=PROJECT_DIRECTORY, capture_output=True, text=True, check=True
+    )
+    imports = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip().isdigit():
+            imports[name.strip()] = int(cumulative) / 1_000_000
+    return imports
+
+
+def measure_startup(module: str = 'video_editor_parser', repeats: int = 5) -> tuple[float, dict[str, float]]:
+    """
+    The best import time of the module over several interpreters, the best
+    is the least disturbed by the other load of the machine
+    :return: import time of the module in seconds and all imports of that run
+    """
+    runs = [measure_imports(module) for _ in range(repeats)]
+    best = min(runs, key=lambda imports: imports[module])
+    return best[module], best
+
+
+def get_heavy_imports(imports: dict[str, float]) -> list[str]:
+    return sorted(name for name in imports if name.split('.')[0] in HEAVY_MODULES)
+
+
+if __name__ == "__main__":
+    startup, imports = measure_startup()
+    print('CLI import time {:.1f} ms (budget {:.0f} ms)'.format(startup * 1e3, STARTUP_BUDGET * 1e3))
+    print('Slowest imports:')
+    for name, seconds in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:15]:
+        print('{:<40}{:>10.1f} ms'.format(name, seconds * 1e3))
+    heavy = get_heavy_imports(imports)
+    if heavy:
+        print('GUI modules imported at startup: {}'.format(', '.join(heavy)))
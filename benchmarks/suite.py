@@ -0,0 +1,277 @@
+from VideoEditor.video_editor import \
+    (merge_videos_and_save, insert_video_and_save, trim_and_save_video,
+     cut_part_and_save_video, set_video_speed_and_save,
+     overlay_video_on_another_and_save, crop_and_save, generate_thumbnail,
+     TimeInterval, Point)
+from VideoEditor.utils import Usage
+from collections import namedtuple
+from typing import Callable
+import subprocess
+import platform
+import argparse
+import tempfile
+import ffmpeg
+import json
+import time
+import sys
+import os
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Allowed slowdown relative to the baseline before a result is a regression
+DEFAULT_TOLERANCE = 0.25
+RESOLUTIONS = [(320, 240), (1280, 720)]
+DURATIONS = [4, 20]
+QUICK_RESOLUTIONS = [(320, 240)]
+QUICK_DURATIONS = [4]
+
+
+class MediaCase(namedtuple('MediaCase', ['width', 'height', 'duration', 'main_path',
+                                         'second_path', 'image_path'])):
+    """
+    Synthetic inputs of one point of the matrix
+    :param width: width of the videos
+    :param height: height of the videos
+    :param duration: duration of the videos in seconds
+    :param main_path: testsrc video with a sine tone
+    :param second_path: another video with the same stream parameters
+    :param image_path: PNG image of a quarter of the frame size
+    """
+
+    @property
+    def name(self) -> str:
+        return '{}x{}_{}s'.format(self.width, self.height, self.duration)
+
+
+class BenchmarkResult(namedtuple('BenchmarkResult', ['operation', 'case', 'wall_time',
+                                                     'cpu_time', 'output_size'])):
+    """
+    Best run of an operation on one media case
+    :param operation: name of the operation
+    :param case: name of the media case
+    :param wall_time: seconds of the run
+    :param cpu_time: CPU seconds of this process and of the ffmpeg processes
+    :param output_size: size of the result in bytes
+    """
+    pass
+
+
+class Regression(namedtuple('Regression', ['operation', 'case', 'metric', 'baseline', 'value'])):
+    """Metric of the result which is worse than the baseline beyond the tolerance"""
+
+    @property
+    def ratio(self) -> float:
+        return self.value / self.baseline if self.baseline else float('inf')
+
+
+def generate_media(directory: str, width: int, height: int, duration: int) -> MediaCase:
+    """
+    Create the deterministic inputs with lavfi sources. The encoder is single
+    threaded and bitexact, so the same ffmpeg build always gives the same files
+    """
+    def render_video(path: str, pattern: str, frequency: int) -> str:
+        video = ffmpeg.input('{}=duration={}:size={}x{}:rate=25'
+                             .format(pattern, duration, width, height), f='lavfi')
+        audio = ffmpeg.input('sine=frequency={}:duration={}:sample_rate=44100'
+                             .format(frequency, duration), f='lavfi')
+        (ffmpeg
+         .output(video, audio, path, vcodec='libx264', acodec='aac', pix_fmt='yuv420p',
+                 g=50, threads=1, fflags='+bitexact', **{'flags:v': '+bitexact'})
+         .run(overwrite_output=True, capture_stdout=True, capture_stderr=True))
+        return path
+
+    name = '{}x{}_{}s'.format(width, height, duration)
+    main_path = render_video(os.path.join(directory, name + '_main.mp4'), 'testsrc', 440)
+    second_path = render_video(os.path.join(directory, name + '_second.mp4'), 'testsrc2', 880)
+    image_path = os.path.join(directory, name + '_image.png')
+    (ffmpeg
+     .input('rgbtestsrc=size={}x{}'.format(width // 4, height // 4), f='lavfi')
+     .output(image_path, vframes=1)
+     .run(overwrite_output=True, capture_stdout=True, capture_stderr=True))
+    return MediaCase(width, height, duration, main_path, second_path, image_path)
+
+
+def get_operations() -> dict[str, Callable[[MediaCase, str], None]]:
+    """Every public operation as a function of the media case and the output path"""
+    def middle(case: MediaCase) -> TimeInterval:
+        return TimeInterval(case.duration // 4, case.duration * 3 // 4)
+
+    arguments = {'is_overwrite': True, 'mode': Usage.SILENT}
+    return {
+        'merge': lambda case, output: merge_videos_and_save(
+            [case.main_path, case.second_path], output, **arguments),
+        'insert': lambda case, output: insert_video_and_save(
+            case.main_path, case.second_path, case.duration // 2, output, **arguments),
+        'trim': lambda case, output: trim_and_save_video(
+            case.main_path, middle(case), output, **arguments),
+        'cut': lambda case, output: cut_part_and_save_video(
+            case.main_path, middle(case), output, **arguments),
+        'speed': lambda case, output: set_video_speed_and_save(
+            case.main_path, 2, output, **arguments),
+        'overlay': lambda case, output: overlay_video_on_another_and_save(
+            case.main_path, case.image_path, output, case.width // 8, case.height // 8,
+            **arguments),
+        'crop': lambda case, output: crop_and_save(
+            case.main_path, output, Point((0, 0)),
+            Point((case.width // 2, case.height // 2)), **arguments),
+        'thumbnail': lambda case, output: generate_thumbnail(
+            case.main_path, output.rsplit('.', 1)[0] + '.png', case.duration // 2, 160),
+    }
+
+
+def _get_cpu_time() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def measure(operation: Callable[[MediaCase, str], None], case: MediaCase,
+            directory: str, repeats: int) -> tuple[float, float, int]:
+    """
+    The best wall time of the operation over the repeats with its CPU time and
+    output size. ffmpeg runs in child processes, which are waited for, so
+    their CPU time is included
+    """
+    best = None
+    for _ in range(repeats):
+        output_path = os.path.join(directory, 'result.mp4')
+        for path in (output_path, output_path.rsplit('.', 1)[0] + '.png'):
+            if os.path.exists(path):
+                os.remove(path)
+        cpu_start, start = _get_cpu_time(), time.perf_counter()
+        operation(case, output_path)
+        wall_time, cpu_time = time.perf_counter() - start, _get_cpu_time() - cpu_start
+        output_size = sum(os.path.getsize(path)
+                          for path in (output_path, output_path.rsplit('.', 1)[0] + '.png')
+                          if os.path.exists(path))
+        if best is None or wall_time < best[0]:
+            best = (wall_time, cpu_time, output_size)
+    return best
+
+
+def run_suite(resolutions: list[tuple[int, int]] = None,
+              durations: list[int] = None,
+              operations: list[str] = None,
+              repeats: int = 3,
+              on_result: Callable[[BenchmarkResult], None] = None) -> list[BenchmarkResult]:
+    """
+    Time the operations on the matrix of synthetic inputs
+    :param resolutions: sizes of the inputs, by default RESOLUTIONS
+    :param durations: durations of the inputs in seconds, by default DURATIONS
+    :param operations: names of the operations to run, by default all of them
+    :param repeats: runs of every operation, the best one is taken
+    :param on_result: function called with every result when it is measured
+    :return: results in the order of the matrix
+    """
+    all_operations = get_operations()
+    operations = operations or list(all_operations)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in resolutions or RESOLUTIONS:
+            for duration in durations or DURATIONS:
+                case = generate_media(directory, width, height, duration)
+                for name in operations:
+                    result = BenchmarkResult(name, case.name,
+                                             *measure(all_operations[name], case, directory, repeats))
+                    results.append(result)
+                    if on_result is not None:
+                        on_result(result)
+    return results
+
+
+def get_environment() -> dict:
+    try:
+        version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout
+    except OSError:
+        version = ''
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': version.splitlines()[0] if version else None,
+    }
+
+
+def save_results(results: list[BenchmarkResult], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'environment': get_environment(),
+                   'results': [result._asdict() for result in results]}, file, indent=2)
+
+
+def load_results(path: str) -> list[BenchmarkResult]:
+    with open(path, encoding='utf-8') as file:
+        return [BenchmarkResult(**result) for result in json.load(file)['results']]
+
+
+def compare(results: list[BenchmarkResult],
+            baseline: list[BenchmarkResult],
+            tolerance: float = DEFAULT_TOLERANCE) -> list[Regression]:
+    """
+    Results which are slower or larger than the baseline by more than the
+    tolerance. Results without a baseline are not compared
+    :param tolerance: allowed relative increase, 0.25 allows 25% more
+    """
+    baseline = {(result.operation, result.case): result for result in baseline}
+    regressions = []
+    for result in results:
+        expected = baseline.get((result.operation, result.case))
+        if expected is None:
+            continue
+        for metric in ('wall_time', 'cpu_time', 'output_size'):
+            value, base = getattr(result, metric), getattr(expected, metric)
+            if value > base * (1 + tolerance):
+                regressions.append(Regression(result.operation, result.case, metric, base, value))
+    return regressions
+
+
+def print_result(result: BenchmarkResult) -> None:
+    print('{:<10}{:<16}{:>10.3f}{:>10.3f}{:>12}'
+          .format(result.operation, result.case, result.wall_time,
+                  result.cpu_time, result.output_size), flush=True)
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the video editor operations')
+    parser.add_argument('-o', dest='output_path', type=str, default=None,
+                        help='Path to save the results in JSON')
+    parser.add_argument('--baseline', dest='baseline_path', type=str, default=BASELINE_PATH,
+                        help='Results to compare with (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', dest='is_baseline_saved', action='store_true',
+                        help='Store the results as the new baseline')
+    parser.add_argument('--no-baseline', dest='is_compared', action='store_false',
+                        help='Only measure, without comparing with the baseline')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed relative increase of time and size (default: 0.25)')
+    parser.add_argument('--quick', dest='is_quick', action='store_true',
+                        help='Only the smallest inputs')
+    parser.add_argument('--operations', dest='operations', type=str, nargs='+',
+                        choices=list(get_operations()), default=None,
+                        help='Operations to run (default: all)')
+    parser.add_argument('--repeats', dest='repeats', type=int, default=3,
+                        help='Runs of every operation, the best one is taken (default: 3)')
+    arg = parser.parse_args(args)
+
+    print('{:<10}{:<16}{:>10}{:>10}{:>12}'.format('operation', 'case', 'wall, s', 'cpu, s', 'size, B'))
+    results = run_suite(QUICK_RESOLUTIONS if arg.is_quick else RESOLUTIONS,
+                        QUICK_DURATIONS if arg.is_quick else DURATIONS,
+                        arg.operations, arg.repeats, print_result)
+    if arg.output_path is not None:
+        save_results(results, arg.output_path)
+    if arg.is_baseline_saved:
+        save_results(results, arg.baseline_path)
+        return 0
+    if not arg.is_compared:
+        return 0
+    if not os.path.exists(arg.baseline_path):
+        # A missing baseline is not a pass, the suite could never fail then
+        print('No baseline at {}, record it on the reference machine with --save-baseline '
+              'or run with --no-baseline'.format(arg.baseline_path), file=sys.stderr)
+        return 2
+    regressions = compare(results, load_results(arg.baseline_path), arg.tolerance)
+    for regression in regressions:
+        print('Regression: {} on {}: {} {:.3f} -> {:.3f} ({:.0%} of the baseline)'
+              .format(regression.operation, regression.case, regression.metric,
+                      regression.baseline, regression.value, regression.ratio))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
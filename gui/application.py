@@ -2,19 +2,23 @@ import sys
 from PyQt6.QtCore import Qt, QUrl
 from PyQt6.QtWidgets import \
     QApplication, QWidget, QVBoxLayout, QPushButton, QSlider, \
-    QStyle, QHBoxLayout, QMenu, QMenuBar, QSpacerItem, QSizePolicy
+    QStyle, QHBoxLayout, QMenu, QMenuBar, QSpacerItem, QSizePolicy, \
+    QProgressBar
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from VideoEditor.video_editor import \
     merge_videos_and_save, trim_and_save_video, \
-    set_video_speed_and_save, copy_video, cut_part_and_save_video, \
+    set_video_speed_and_save, cut_part_and_save_video, \
     insert_video_and_save, overlay_video_on_another_and_save, \
     crop_and_save, Point
+from VideoEditor.proxy import make_job, CURRENT_VIDEO, OPERATION_NAMES
+from VideoEditor.scene_index import snap_to_scenes
 from .supporting_windows import \
     run_trim_dialog_window, run_set_speed_dialog_window, \
     run_ask_confirmation_dialog_window, run_merge_into_dialog_window, \
     run_set_partial_speed_dialog_window, run_overlay_dialog_window, \
     run_crop_dialog_window
 from .cache_handler import cache_handler
+from .render_queue import RenderQueue, RenderTask
 from VideoEditor.utils import TimeIntervalError
 from .utils import \
     OperationType, OperationSystem, OS_TYPE, \
@@ -41,6 +45,7 @@ class VideoEditorWindow(QWidget):
         self.prefix_text = get_text_label(self, "00:00")
         self._set_up_video_slider()
         self._set_up_audio_slider()
+        self._set_up_render_queue()
         self._set_up_layouts()
         self._set_up_media_player()
         self._set_up_menu_bar()
@@ -96,6 +101,7 @@ class VideoEditorWindow(QWidget):
         history_submenu.addAction("Undo", self.undo)
         history_submenu.addAction("Redo", self.redo)
         history_submenu.addAction("Clear history", self.clear_history)
+        history_submenu.addAction("Render cache statistics", self.show_render_cache_stats)
 
     def _set_up_play_button(self):
         self.play_button = QPushButton()
@@ -117,6 +123,19 @@ class VideoEditorWindow(QWidget):
             lambda position: self.audio_output.setVolume(position / 100)
         )
 
+    def _set_up_render_queue(self):
+        self.render_queue = RenderQueue()
+        self.render_queue.started.connect(self._start_render)
+        self.render_queue.progress.connect(self._update_render_progress)
+        self.render_queue.idle.connect(self._finish_rendering)
+
+        self.render_label = get_text_label(self, "")
+        self.render_progress_bar = QProgressBar(self)
+        self.render_progress_bar.setRange(0, 100)
+        self.cancel_render_button = QPushButton("Cancel", self)
+        self.cancel_render_button.clicked.connect(self.render_queue.cancel)
+        self._set_render_widgets_visible(False)
+
     def _set_up_layouts(self):
         y_offset = 20 if OS_TYPE != OperationSystem.MACOS else 0
         spacer = QSpacerItem(
@@ -132,11 +151,17 @@ class VideoEditorWindow(QWidget):
         lower_control_layout.addWidget(self.prefix_text)
         lower_control_layout.addWidget(self.video_slider)
 
+        render_layout = QHBoxLayout()
+        render_layout.addWidget(self.render_label)
+        render_layout.addWidget(self.render_progress_bar)
+        render_layout.addWidget(self.cancel_render_button)
+
         main_layout = QVBoxLayout()
         main_layout.addItem(spacer)
         main_layout.addWidget(self.video_widget)
         main_layout.addLayout(upper_control_layout)
         main_layout.addLayout(lower_control_layout)
+        main_layout.addLayout(render_layout)
 
         self.setLayout(main_layout)
 
@@ -159,66 +184,105 @@ class VideoEditorWindow(QWidget):
         self.play_button.setEnabled(True)
 
     def undo(self):
+        if self.render_queue.is_busy():
+            raise_render_in_progress_error()
+            return
+
         text = "Are you sure you want to undo last action?"
         need_to_undo = run_ask_confirmation_dialog_window(text)
 
         if need_to_undo:
             try:
-                cache_handler.undo()
+                index = cache_handler.get_undo_index()
             except FileNotFoundError:
                 raise_nothing_to_undo_error()
-            except IOError as e:
-                raise_cache_error(e.__str__())
             else:
-                self.have_unsaved_changes = True
-                self._play_resulting_video()
+                self._submit_state_change("undo", index)
 
     def redo(self):
+        if self.render_queue.is_busy():
+            raise_render_in_progress_error()
+            return
+
         text = "Are you sure you want to redo previous action?"
         need_to_redo = run_ask_confirmation_dialog_window(text)
 
         if need_to_redo:
             try:
-                cache_handler.redo()
+                index = cache_handler.get_redo_index()
             except FileNotFoundError:
                 raise_nothing_to_redo_error()
             else:
-                self.have_unsaved_changes = True
-                self._play_resulting_video()
+                self._submit_state_change("redo", index)
+
+    def _submit_state_change(self, name: str, index: int):
+        """Go to the state of the history once it is restored
+        in the background, an evicted state is rendered again
+        """
+        def on_finished(_):
+            cache_handler.set_current_state(index)
+            self.have_unsaved_changes = True
+            self._play_resulting_video()
+
+        self.render_queue.submit(RenderTask(
+            name,
+            lambda: cache_handler.restore_state(index),
+            on_finished,
+            lambda error: self._process_render_error(error, {
+                IOError: lambda e: raise_cache_error(e.__str__())
+            })
+        ))
 
     def clear_history(self):
+        if self.render_queue.is_busy():
+            raise_render_in_progress_error()
+            return
+
         cache_handler.clear_cache()
         self.play_button.setEnabled(False)
         self.have_unsaved_changes = False
 
+    def show_render_cache_stats(self):
+        get_render_cache_stats_message(cache_handler.renders.stats())
+
     def open_file(self):
         user_file_path = get_open_file_name(self)
 
         if user_file_path == "":
             return
 
-        try:
+        def render():
             cache_handler.prepare_cache_folder(
                 cache_handler.current_index + 1
             )
 
-            copy_video(
-                user_file_path, cache_handler.get_current_path_to_save()
-            )
-        except IOError:
-            raise_open_error(user_file_path)
-        except ValueError:
-            raise_wrong_extension_error(user_file_path)
-        else:
+            return cache_handler.open_video(user_file_path)
+
+        def on_finished(scale: tuple[float, float]):
+            cache_handler.record_open(user_file_path, scale)
             cache_handler.update_current_index(OperationType.INCREASE)
             self.have_unsaved_changes = False
             self._play_resulting_video()
 
+        self.render_queue.submit(RenderTask(
+            "open",
+            render,
+            on_finished,
+            lambda error: self._process_render_error(error, {
+                IOError: lambda e: raise_open_error(user_file_path),
+                ValueError: lambda e: raise_wrong_extension_error(user_file_path)
+            })
+        ))
+
     def save_file(self):
-        if cache_handler.current_index == 0:
+        if self._has_no_file():
             raise_no_file_error()
             return
 
+        if self.render_queue.is_busy():
+            raise_render_in_progress_error()
+            return
+
         user_file_path = get_save_file_name(self)
 
         if user_file_path == "":
@@ -252,7 +316,7 @@ class VideoEditorWindow(QWidget):
         func_arg: object,
         merge_func: callable
     ):
-        if cache_handler.current_index == 0:
+        if self._has_no_file():
             raise_no_file_error()
             return
 
@@ -261,64 +325,71 @@ class VideoEditorWindow(QWidget):
         if user_data is None or len(user_data) == 0:
             return
 
-        args_for_merge = process_args_for_merge(
+        job = make_job(
+            merge_func,
+            *process_args_for_merge(user_data, CURRENT_VIDEO, None)
+        )
+
+        self._submit_operation(job, lambda: merge_func(*process_args_for_merge(
             user_data,
             cache_handler.get_current_path_to_look(),
             cache_handler.get_current_path_to_save()
-        )
-
-        try:
-            cache_handler.prepare_cache_folder(
-                cache_handler.current_index + 1
-            )
-
-            merge_func(*args_for_merge)
-        except IOError as e:
-            raise_open_error(e.__str__())
-        except ValueError:
-            raise_wrong_time_error()
-        else:
-            self._internal_operation_for_tools_function()
+        )), {
+            IOError: lambda e: raise_open_error(e.__str__()),
+            ValueError: lambda e: raise_wrong_time_error()
+        })
 
     def trim(self):
         main_text = "Select the fragment that will remain:"
-        self._base_cut(main_text, trim_and_save_video)
+        self._base_cut(main_text, trim_and_save_video, is_kept=True)
 
     def cut_out(self):
         main_text = "Select the fragment that will be deleted:"
-        self._base_cut(main_text, cut_part_and_save_video)
+        self._base_cut(main_text, cut_part_and_save_video, is_kept=False)
 
     def _base_cut(self,
                   main_text: str,
-                  cut_func: callable([str, int, int, str])
+                  cut_func: callable([str, int, int, str]),
+                  is_kept: bool
                   ) -> None:
-        if cache_handler.current_index == 0:
+        if self._has_no_file():
             raise_no_file_error()
             return
 
-        fragment_time = run_trim_dialog_window(
+        user_data = run_trim_dialog_window(
             self.video_slider.value(),
             main_text
         )
 
-        if fragment_time is None:
+        if user_data is None:
             return
+        *fragment_time, is_snapped = user_data
         time_interval = process_fragment_time(fragment_time)
 
-        try:
-            cache_handler.prepare_cache_folder(
-                cache_handler.current_index + 1
-            )
+        def render():
+            interval = time_interval
+            if is_snapped:
+                # The snapped interval is what the proxy job replays on the
+                # original. It is looked for in the video the cut is applied
+                # to, which is rendered by the previous tasks of the queue
+                interval = snap_to_scenes(
+                    cache_handler.get_current_path_to_look(),
+                    time_interval,
+                    is_kept=is_kept
+                )
 
-            cut_func(
-                cache_handler.get_current_path_to_look(),
-                time_interval,
-                cache_handler.get_current_path_to_save()
+            return self._render_operation(
+                make_job(cut_func, CURRENT_VIDEO, interval, None),
+                lambda: cut_func(
+                    cache_handler.get_current_path_to_look(),
+                    interval,
+                    cache_handler.get_current_path_to_save()
+                )
             )
-        except RuntimeError:
-            raise_wrong_time_error()
-        else:
-            self._internal_operation_for_tools_function()
+
+        self._submit_task(OPERATION_NAMES[cut_func], render, {
+            RuntimeError: lambda e: raise_wrong_time_error()
+        })
 
     def set_speed(self):
         self._base_set_speed(
@@ -333,7 +404,7 @@ class VideoEditorWindow(QWidget):
         )
 
     def _base_set_speed(self, set_speed_func: callable, func_arg: list):
-        if cache_handler.current_index == 0:
+        if self._has_no_file():
             raise_no_file_error()
             return
 
@@ -344,26 +415,24 @@ class VideoEditorWindow(QWidget):
 
         speed, interval = process_args_for_set_speed(user_args)
 
-        try:
-            cache_handler.prepare_cache_folder(
-                cache_handler.current_index + 1
-            )
+        job = make_job(
+            set_video_speed_and_save, CURRENT_VIDEO, speed, None,
+            time_interval=interval
+        )
 
-            set_video_speed_and_save(
-                cache_handler.get_current_path_to_look(),
-                speed,
-                cache_handler.get_current_path_to_save(),
-                time_interval=interval
-            )
-        except TimeIntervalError:
-            raise_wrong_time_error()
-        except (ZeroDivisionError, ValueError):
-            raise_wrong_speed_error()
-        else:
-            self._internal_operation_for_tools_function()
+        self._submit_operation(job, lambda: set_video_speed_and_save(
+            cache_handler.get_current_path_to_look(),
+            speed,
+            cache_handler.get_current_path_to_save(),
+            time_interval=interval
+        ), {
+            TimeIntervalError: lambda e: raise_wrong_time_error(),
+            ZeroDivisionError: lambda e: raise_wrong_speed_error(),
+            ValueError: lambda e: raise_wrong_speed_error()
+        })
 
     def overlay(self):
-        if cache_handler.current_index == 0:
+        if self._has_no_file():
             raise_no_file_error()
             return
 
@@ -377,25 +446,25 @@ class VideoEditorWindow(QWidget):
 
         print(point.x())
 
-        try:
-            cache_handler.prepare_cache_folder(
-                cache_handler.current_index + 1
-            )
+        job = make_job(
+            overlay_video_on_another_and_save, CURRENT_VIDEO, file_path,
+            None, point.x(), point.y()
+        )
 
-            overlay_video_on_another_and_save(
-                cache_handler.get_current_path_to_look(),
-                file_path,
-                cache_handler.get_current_path_to_save(),
-                point.x(),
-                point.y()
-            )
-        except IOError:
-            raise IOError
-        else:
-            self._internal_operation_for_tools_function()
+        def render():
+            with cache_handler.scale_for_proxy(file_path) as overlay_path:
+                overlay_video_on_another_and_save(
+                    cache_handler.get_current_path_to_look(),
+                    overlay_path,
+                    cache_handler.get_current_path_to_save(),
+                    point.x(),
+                    point.y()
+                )
+
+        self._submit_operation(job, render)
 
     def crop(self):
-        if cache_handler.current_index == 0:
+        if self._has_no_file():
             raise_no_file_error()
             return
 
@@ -404,23 +473,91 @@ class VideoEditorWindow(QWidget):
         if points is None:
             return
 
-        try:
-            cache_handler.prepare_cache_folder(
-                cache_handler.current_index + 1
-            )
+        job = make_job(
+            crop_and_save, CURRENT_VIDEO, None,
+            Point(points[0]), Point(points[1])
+        )
 
-            crop_and_save(
-                cache_handler.get_current_path_to_look(),
-                cache_handler.get_current_path_to_save(),
-                Point(points[0]),
-                Point(points[1])
-            )
-        except IOError:
-            raise IOError
-        else:
-            self._internal_operation_for_tools_function()
+        self._submit_operation(job, lambda: crop_and_save(
+            cache_handler.get_current_path_to_look(),
+            cache_handler.get_current_path_to_save(),
+            Point(points[0]),
+            Point(points[1])
+        ))
+
+    def _has_no_file(self) -> bool:
+        """There is no video yet and none is being opened"""
+        return cache_handler.current_index == 0 and \
+            not self.render_queue.is_busy()
+
+    def _submit_operation(
+        self, job: dict, render: callable, errors: dict = None
+    ) -> None:
+        """Render the job in the background on top of the
+        results of the tasks queued before it
+        """
+        self._submit_task(
+            job['operation'],
+            lambda: self._render_operation(job, render),
+            errors
+        )
 
-    def _internal_operation_for_tools_function(self):
+    def _submit_task(
+        self, name: str, render: callable, errors: dict = None
+    ) -> None:
+        """The render returns the job of the new state, the
+        history index advances once the render finishes
+        :param errors: the message of every exception type
+        """
+        if errors is None:
+            errors = {}
+
+        self.render_queue.submit(RenderTask(
+            name,
+            render,
+            self._internal_operation_for_tools_function,
+            lambda error: self._process_render_error(error, errors)
+        ))
+
+    @staticmethod
+    def _render_operation(job: dict, render: callable) -> dict:
+        """Runs in the worker thread"""
+        cache_handler.prepare_cache_folder(
+            cache_handler.current_index + 1
+        )
+        cache_handler.render_next_state(job, render)
+        return job
+
+    @staticmethod
+    def _process_render_error(error: Exception, errors: dict) -> None:
+        for error_type, raise_error in errors.items():
+            if isinstance(error, error_type):
+                raise_error(error)
+                return
+        raise_render_error(error.__str__())
+
+    def _start_render(self, name: str):
+        pending_count = self.render_queue.get_pending_count()
+        text = f"Rendering: {name}"
+        if pending_count:
+            text += f" ({pending_count} more queued)"
+        self.render_label.setText(text)
+        self.render_progress_bar.setValue(0)
+        self._set_render_widgets_visible(True)
+
+    def _update_render_progress(self, fraction: float):
+        self.render_progress_bar.setValue(round(fraction * 100))
+
+    def _finish_rendering(self):
+        self._set_render_widgets_visible(False)
+
+    def _set_render_widgets_visible(self, is_visible: bool):
+        self.render_label.setVisible(is_visible)
+        self.render_progress_bar.setVisible(is_visible)
+        self.cancel_render_button.setVisible(is_visible)
+
+    def _internal_operation_for_tools_function(self, job: dict):
+        cache_handler.record_operation(job)
         cache_handler.update_current_index(OperationType.INCREASE)
         self.have_unsaved_changes = True
         self._play_resulting_video()
@@ -458,11 +595,17 @@ class VideoEditorWindow(QWidget):
 
     def closeEvent(self, event):
         need_to_close_window = True
-        if self.have_unsaved_changes:
+        if self.render_queue.is_busy():
+            text = "The edits are still rendering.\n" \
+                   "Are you sure you want to cancel them and exit?"
+            need_to_close_window = run_ask_confirmation_dialog_window(text)
+        elif self.have_unsaved_changes:
             text = "You have unsaved changes.\nAre you sure you want to exit?"
             need_to_close_window = run_ask_confirmation_dialog_window(text)
 
         if need_to_close_window:
+            self.render_queue.cancel()
+            self.render_queue.wait()
             event.accept()
         else:
             event.ignore()
@@ -1,16 +1,41 @@
 import os
+import re
+import json
+import tempfile
+import ffmpeg
 from os import getcwd
 from pathlib import Path
+from contextlib import contextmanager
 from .utils import OperationType
 from VideoEditor.video_editor import copy_video
+from VideoEditor.proxy import \
+    make_proxy, make_media_proxy, replay_operations, run_operation, \
+    measure_proxy_scale, PROXY_MAX_HEIGHT
+from VideoEditor.encoding_profile import PROFILES
+from VideoEditor.render_cache import RenderCache, render_cache, get_render_key
 from .message import raise_cache_error, get_success_clear_cache_message
 
+CACHE_BUDGET_ENV = 'VIDEO_EDITOR_CACHE_BUDGET'
+# Bytes the rendered states may take on disk
+DEFAULT_CACHE_BUDGET = 4 * 1024 * 1024 * 1024
+
 
 class CacheHandler:
-    def __init__(self):
+    def __init__(self, max_bytes: int = None, renders: RenderCache = None):
         self.current_index = 0
         self.BASE_PATH_TO_SAVE = CacheHandler.get_base_path_to_save()
         self.index_from_previous_session = None
+        # The job that produced every state: the opening of the original
+        # video (with the scale of its proxy) or an operation made by
+        # make_job. The job of the state with index i is operations[i - 1]
+        self.operations = []
+        # The states farthest from the current one are removed above the
+        # budget, they are rendered again from their jobs when needed
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(os.environ.get(CACHE_BUDGET_ENV, DEFAULT_CACHE_BUDGET))
+        # Rendered results by their content address, shared by the branches
+        # of the history and by the sessions
+        self.renders = renders if renders is not None else render_cache
 
     def update_current_index(self, operation: OperationType) -> None:
         if operation == OperationType.INCREASE:
@@ -23,49 +48,325 @@ class CacheHandler:
         The 'additive' is an argument that is 1 if the
         method is called from a 'get_current_path_to_save'
         """
-        current_path = str(
-            self.BASE_PATH_TO_SAVE /
-            f'temp{self.current_index + additive}.mp4'
-        )
+        return self._get_state_path(self.current_index + additive)
 
-        return current_path
+    def _get_state_path(self, index: int) -> str:
+        return str(self.BASE_PATH_TO_SAVE / f'temp{index}.mp4')
 
     def get_current_path_to_save(self) -> str:
         return self.get_current_path_to_look(additive=1)
 
-    def save_from_cache(self, output_path: str) -> None:
+    def open_video(self, original_path: str) -> tuple[float, float]:
+        """Make the proxy of the original video as the
+        next state, or take it from the render cache
+        :return: the scale of the original relative to the proxy
+        """
+        path_to_save = self.get_current_path_to_save()
+        key = self._get_key(None, self._get_open_key_job(original_path))
+        if key is not None and self.renders.fetch(key, path_to_save):
+            return measure_proxy_scale(original_path, path_to_save)
+
+        scale = make_proxy(original_path, path_to_save)
+        if key is not None:
+            self.renders.store(key, path_to_save)
+        return scale
+
+    def render_next_state(self, job: dict, render: callable) -> bool:
+        """Make the next state: take the result of the job
+        from the render cache or call render, which saves
+        it to get_current_path_to_save, and cache it
+        :return: True if the result was in the cache
+        """
+        path_to_save = self.get_current_path_to_save()
+        key = self.get_state_key(self.current_index + 1, job)
+        if key is not None and self.renders.fetch(key, path_to_save):
+            return True
+
+        render()
+        if key is not None:
+            self.renders.store(key, path_to_save)
+        return False
+
+    def get_state_key(self, index: int, job: dict = None) -> str:
+        """Content address of the state: the jobs back to
+        the opening of the original video hashed in a chain.
+        The job of the state may be given before it is
+        recorded. None if the history is unknown
+        """
+        jobs = self.operations[:index - 1] + [job] \
+            if job is not None else self.operations[:index]
+        if index < 1 or len(jobs) < index:
+            return None
+
+        key = None
+        for state_job in jobs:
+            if state_job['operation'] == 'open':
+                key = self._get_key(None, self._get_open_key_job(state_job['video_path']))
+            elif key is not None:
+                key = self._get_key(key, state_job)
+        return key
+
+    @staticmethod
+    def _get_key(parent_key: str, job: dict) -> str:
         try:
-            copy_video(
-                self.get_current_path_to_look(),
-                self.get_current_path_to_save()
-            )
+            return get_render_key(parent_key, job)
+        except (OSError, TypeError, ValueError):
+            # An input file is gone or the job is not known
+            return None
 
-            self.update_current_index(OperationType.INCREASE)
+    @staticmethod
+    def _get_open_key_job(original_path: str) -> dict:
+        """The opening as it is rendered by make_proxy, its
+        scale is a result rather than a parameter
+        """
+        return {
+            'operation': 'open',
+            'video_path': original_path,
+            'max_height': PROXY_MAX_HEIGHT,
+            'profile': PROFILES['draft']
+        }
 
-            os.rename(
-                self.get_current_path_to_look(), output_path
-            )
+    def record_open(self, original_path: str, scale: tuple[float, float]) -> None:
+        self._record({
+            'operation': 'open',
+            'video_path': original_path,
+            'scale': list(scale)
+        })
+
+    def record_operation(self, job: dict) -> None:
+        self._record(job)
+
+    def _record(self, job: dict) -> None:
+        """Record the job of the next state, the jobs of the
+        undone states are dropped. The next state is already
+        rendered, the states far from it are evicted
+        """
+        self.operations = self.operations[:self.current_index] + [job]
+        self._write_history(self.current_index + 1)
+        self.evict(self.current_index + 1)
+
+    def get_proxy_scale(self, state_index: int = None) -> tuple[float, float]:
+        open_index = self._get_open_index(state_index)
+        if open_index is None:
+            return 1.0, 1.0
+        return tuple(self.operations[open_index]['scale'])
+
+    def _get_current_open_index(self) -> int:
+        return self._get_open_index()
+
+    def _get_open_index(self, state_index: int = None) -> int:
+        """Index of the job that opened the video of the
+        state (the current one by default), None if the
+        history is unknown
+        """
+        if state_index is None:
+            state_index = self.current_index
+        if len(self.operations) < state_index:
+            return None
+
+        for index in range(state_index - 1, -1, -1):
+            if self.operations[index]['operation'] == 'open':
+                return index
+        return None
+
+    @contextmanager
+    def scale_for_proxy(self, media_path: str, state_index: int = None):
+        """Path to the video or image downscaled like
+        the proxy of the state (the current one by default),
+        e.g. for overlaying on the proxy
+        """
+        scale = self.get_proxy_scale(state_index)
+        if scale == (1.0, 1.0):
+            yield media_path
+            return
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            proxy_path = os.path.join(tmpdir, os.path.basename(media_path))
+            make_media_proxy(media_path, proxy_path, scale)
+            yield proxy_path
+
+    def save_from_cache(self, output_path: str) -> None:
+        if self.get_proxy_scale() != (1.0, 1.0):
+            self._save_from_original(output_path)
+            return
+
+        try:
+            copy_video(self.get_current_path_to_look(), output_path)
         except (
             FileNotFoundError, PermissionError,
-            OSError, FileExistsError, IOError
+            OSError, FileExistsError, IOError,
+            ValueError, ffmpeg.Error
         ):
             raise IOError
-        else:
-            self.update_current_index(OperationType.DECREASE)
+
+    def _save_from_original(self, output_path: str) -> None:
+        """The cache holds the proxy, so the recorded
+        operations are applied to the original video
+        """
+        open_index = self._get_current_open_index()
+        open_job = self.operations[open_index]
+        jobs = self.operations[open_index + 1:self.current_index]
+
+        try:
+            replay_operations(
+                open_job['video_path'], jobs, output_path,
+                tuple(open_job['scale']), is_overwrite=True
+            )
+        except (OSError, ValueError, ffmpeg.Error):
+            raise IOError
 
     def undo(self) -> None:
+        """Go to the previous state, an evicted state is
+        rendered again (IOError if it can not be)
+        """
+        self._go_to_state(self.get_undo_index())
+
+    def redo(self) -> None:
+        self._go_to_state(self.get_redo_index())
+
+    def get_undo_index(self) -> int:
+        """Index of the previous state, FileNotFoundError
+        if there is nothing to undo
+        """
         if self.current_index == 1 or self.current_index == 0:
             raise FileNotFoundError
+        return self.current_index - 1
 
-        self.update_current_index(OperationType.DECREASE)
+    def get_redo_index(self) -> int:
+        """Index of the next state, FileNotFoundError
+        if there is nothing to redo
+        """
+        if self.current_index < len(self.operations) or \
+                self._is_cached(self.current_index + 1):
+            return self.current_index + 1
+        raise FileNotFoundError
 
-    def redo(self) -> None:
-        if os.path.exists(self.get_current_path_to_save()):
-            self.update_current_index(OperationType.INCREASE)
-        else:
-            raise FileNotFoundError
+    def _go_to_state(self, index: int) -> None:
+        self.restore_state(index)
+        self.set_current_state(index)
+
+    def set_current_state(self, index: int) -> None:
+        """Make the restored state (see restore_state) the
+        current one, the states far from it are evicted
+        """
+        self.current_index = index
+        self._write_history(index)
+        self.evict(index)
+
+    def _is_cached(self, index: int) -> bool:
+        return os.path.exists(self._get_state_path(index))
+
+    def get_cache_size(self) -> int:
+        """Bytes taken by the rendered states"""
+        return sum(size for _, size in self._get_cached_states())
+
+    def _get_cached_states(self) -> list[tuple[int, int]]:
+        """Index and size of every rendered state"""
+        states = []
+        try:
+            names = os.listdir(self.BASE_PATH_TO_SAVE)
+        except OSError:
+            return states
+        for name in names:
+            match = re.fullmatch(r'temp(\d+)\.mp4', name)
+            if match is None:
+                continue
+            try:
+                size = os.path.getsize(self.BASE_PATH_TO_SAVE / name)
+            except OSError:
+                continue
+            states.append((int(match.group(1)), size))
+        return states
+
+    def evict(self, center_index: int = None) -> list[int]:
+        """Remove the states farthest from the center (the
+        current state by default) while the cache is larger
+        than max_bytes. The center state is never removed,
+        neither are the states without a recorded job
+        :return: indexes of the removed states
+        """
+        if center_index is None:
+            center_index = self.current_index
+        states = self._get_cached_states()
+        total = sum(size for _, size in states)
+        evicted = []
+        for index, size in sorted(states, key=lambda state: -abs(state[0] - center_index)):
+            if total <= self.max_bytes:
+                break
+            if index == center_index or index > len(self.operations):
+                continue
+            try:
+                os.remove(self._get_state_path(index))
+            except OSError:
+                continue
+            total -= size
+            evicted.append(index)
+        return evicted
+
+    def restore_state(self, index: int) -> None:
+        """Render the evicted state again from its nearest
+        rendered ancestor, or from the original video if the
+        states back to its opening are evicted too. States
+        kept in the render cache are not rendered at all
+        """
+        if self._is_cached(index):
+            return
+        if not 0 < index <= len(self.operations):
+            raise FileNotFoundError(self._get_state_path(index))
+
+        chain = [index]
+        while self.operations[chain[-1] - 1]['operation'] != 'open' and \
+                not self._is_in_render_cache(chain[-1]) and \
+                not self._is_cached(chain[-1] - 1):
+            chain.append(chain[-1] - 1)
+            if chain[-1] == 0:
+                raise IOError('History of the state {} is unknown'.format(index))
+        try:
+            for state_index in reversed(chain):
+                self._render_state(state_index)
+        except (OSError, ValueError, ffmpeg.Error) as e:
+            raise IOError('Can not restore the state {}: {}'.format(index, e))
+
+    def _is_in_render_cache(self, index: int) -> bool:
+        key = self.get_state_key(index)
+        return key is not None and self.renders.contains(key)
+
+    def _render_state(self, index: int) -> None:
+        """Take the state from the render cache or apply
+        its job to the previous state and cache the result
+        """
+        path_to_save = self._get_state_path(index)
+        key = self.get_state_key(index)
+        if key is not None and self.renders.fetch(key, path_to_save):
+            return
+
+        self._apply_job(index)
+        if key is not None:
+            self.renders.store(key, path_to_save)
+
+    def _apply_job(self, index: int) -> None:
+        """Apply the job of the state to the previous state"""
+        job = self.operations[index - 1]
+        path_to_save = self._get_state_path(index)
+        if job['operation'] == 'open':
+            make_proxy(job['video_path'], path_to_save)
+            return
+
+        if job['operation'] == 'overlay':
+            with self.scale_for_proxy(job['overlay_path'], index) as overlay_path:
+                run_operation(dict(job, overlay_path=overlay_path),
+                              self._get_state_path(index - 1), path_to_save,
+                              is_overwrite=True)
+            return
+        run_operation(job, self._get_state_path(index - 1), path_to_save,
+                      is_overwrite=True)
 
     def is_empty(self) -> bool:
+        index = self._read_history_file().get('current_index')
+        if index is not None and self._is_cached(index):
+            self.index_from_previous_session = index
+            return False
+
         index = 1
 
         while True:
@@ -84,6 +385,29 @@ class CacheHandler:
 
     def restore_history(self) -> None:
         self.current_index = self.index_from_previous_session
+        self.operations = self._read_history()
+
+    def _write_history(self, current_index: int = None) -> None:
+        if current_index is None:
+            current_index = self.current_index
+        history = {'current_index': current_index, 'operations': self.operations}
+        with open(self._get_history_path(), 'w', encoding='utf-8') as file:
+            json.dump(history, file)
+
+    def _read_history(self) -> list[dict]:
+        return self._read_history_file().get('operations', [])
+
+    def _read_history_file(self) -> dict:
+        try:
+            with open(self._get_history_path(), encoding='utf-8') as file:
+                history = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        # The history of the older versions is only the list of the jobs
+        return {'operations': history} if isinstance(history, list) else history
+
+    def _get_history_path(self) -> str:
+        return str(self.BASE_PATH_TO_SAVE / 'history.json')
 
     def prepare_cache_folder(self, start_index=1) -> None:
         """If the program was terminated incorrectly, the
@@ -91,31 +415,29 @@ class CacheHandler:
         in a special way before starting work with it
         """
 
-        index = start_index
-
-        while True:
-            current_path_to_remove = str(
-                self.BASE_PATH_TO_SAVE /
-                f'temp{index}.mp4'
-            )
-
-            if os.path.exists(current_path_to_remove):
-                os.remove(current_path_to_remove)
-                index += 1
-            else:
-                break
+        # The evicted states leave gaps, so all later states are looked for
+        for index, _ in self._get_cached_states():
+            if index >= start_index:
+                os.remove(self._get_state_path(index))
 
     def clear_cache(self, end_index: int = None) -> None:
         if end_index is None:
             end_index = self.current_index
 
         for index in range(1, end_index + 1):
+            # The evicted states are not on disk any more
+            if index <= len(self.operations) and not self._is_cached(index):
+                continue
             try:
                 self._remove_video(index)
             except IOError as e:
                 raise_cache_error(e.__str__())
 
+        if os.path.exists(self._get_history_path()):
+            os.remove(self._get_history_path())
+
         self.current_index = 0
+        self.operations = []
         get_success_clear_cache_message()
 
     def _remove_video(self, index: int) -> None:
@@ -3,7 +3,7 @@ from PyQt6.QtCore import QLocale, QTime
 from PyQt6.QtWidgets import \
     QStyle, QLabel, QDialog, \
     QDialogButtonBox, QWidget, QPushButton, \
-    QDoubleSpinBox, QHBoxLayout, QSpinBox
+    QDoubleSpinBox, QHBoxLayout, QSpinBox, QCheckBox
 from typing import Union
 from .utils import process_time
 
@@ -46,6 +46,13 @@ def get_button(obj: QDialog, title: str, func: callable) -> QPushButton:
     return button
 
 
+def get_check_box(obj: QDialog, text: str) -> QCheckBox:
+    check_box = QCheckBox(text, obj)
+    check_box.setChecked(False)
+
+    return check_box
+
+
 def get_time_edit_widgets(
     obj: QDialog,
     current_time: int
@@ -45,6 +45,17 @@ def raise_nothing_to_redo_error():
     get_base_message(text, MessageType.ERROR)
 
 
+def raise_render_in_progress_error():
+    text = "Please wait until the edits are rendered or cancel them"
+    get_base_message(text, MessageType.ERROR)
+
+
+def raise_render_error(error_text):
+    text = f"""The edit could not be rendered:
+    {error_text}"""
+    get_base_message(text, MessageType.ERROR)
+
+
 def raise_cache_error(file_path):
     text = f"""An error occurred while clearing the cache.
     Please clear it manually. Problem with path: 
@@ -62,6 +73,13 @@ def get_success_clear_cache_message():
     get_base_message(text, MessageType.SUCCESS)
 
 
+def get_render_cache_stats_message(stats: dict):
+    text = f"""Operations taken from the render cache: {stats['hits']}
+    Operations rendered: {stats['misses']}
+    Hit rate: {stats['hit_rate']:.0%}"""
+    get_base_message(text, MessageType.SUCCESS)
+
+
 def get_base_message(text: str, mode: MessageType):
     base_message = QMessageBox()
     base_message.setWindowTitle("Error") \
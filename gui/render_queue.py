@@ -0,0 +1,160 @@
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from VideoEditor.progress_bar import ProgressEvent, gui_progress_view
+from VideoEditor.render_control import \
+    CancellationToken, RenderCancelledError, cancellation_scope
+
+# Updates of the progress shown in the window per second
+PROGRESS_REFRESH_RATE = 10
+
+
+class RenderTask(namedtuple(
+    'RenderTask',
+    ['name', 'render', 'on_finished', 'on_failed'],
+    defaults=[None]
+)):
+    """
+    Render run in the background
+    :param name: name of the operation shown with the progress
+    :param render: function rendering the result, runs in the worker thread
+    :param on_finished: takes the value returned by render, runs in the GUI
+     thread before the next task starts
+    :param on_failed: takes the exception raised by render, runs in the GUI thread
+    """
+
+
+class RenderSignals(QObject):
+    progress = pyqtSignal(float)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    cancelled = pyqtSignal()
+
+
+class RenderWorker(QRunnable):
+    def __init__(
+        self,
+        render: callable,
+        cancel_token: CancellationToken,
+        refresh_rate: float = PROGRESS_REFRESH_RATE
+    ):
+        super().__init__()
+        self.render = render
+        self.cancel_token = cancel_token
+        self.refresh_interval = 1 / refresh_rate
+        self.signals = RenderSignals()
+        self._last_progress_time = 0.0
+
+    @contextmanager
+    def _progress_view(self, duration: float):
+        """The progress of ffmpeg coalesced to the refresh rate"""
+        def sink(event: ProgressEvent) -> None:
+            now = time.monotonic()
+            if not event.is_end and \
+                    now - self._last_progress_time < self.refresh_interval:
+                return
+            self._last_progress_time = now
+
+            if event.is_end:
+                fraction = 1.0
+            elif event.out_time is None or not duration:
+                return
+            else:
+                fraction = min(event.out_time / duration, 1.0)
+            self.signals.progress.emit(fraction)
+
+        yield sink
+
+    def run(self) -> None:
+        try:
+            with cancellation_scope(self.cancel_token), \
+                    gui_progress_view(self._progress_view):
+                result = self.render()
+        except RenderCancelledError:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+
+class RenderQueue(QObject):
+    """
+    Renders of the GUI run one by one in a worker thread, so
+    the window stays responsive. Every task is started after
+    the previous one finished in the GUI thread, so it renders
+    on top of its result. A failed or cancelled task drops the
+    tasks queued after it
+    """
+    started = pyqtSignal(str)
+    progress = pyqtSignal(float)
+    idle = pyqtSignal()
+
+    def __init__(self, refresh_rate: float = PROGRESS_REFRESH_RATE):
+        super().__init__()
+        self.refresh_rate = refresh_rate
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(1)
+        self._tasks = deque()
+        self._running = None
+        self._worker = None
+
+    def submit(self, task: RenderTask) -> None:
+        self._tasks.append(task)
+        if self._running is None:
+            self._start_next()
+
+    def is_busy(self) -> bool:
+        return self._running is not None or len(self._tasks) > 0
+
+    def get_pending_count(self) -> int:
+        return len(self._tasks)
+
+    def cancel(self) -> None:
+        """Drop the queued tasks and stop the running one"""
+        self._tasks.clear()
+        if self._worker is not None:
+            self._worker.cancel_token.cancel()
+
+    def wait(self) -> None:
+        self.thread_pool.waitForDone()
+
+    def _start_next(self) -> None:
+        self._running = None
+        self._worker = None
+        if not self._tasks:
+            self.idle.emit()
+            return
+
+        self._running = self._tasks.popleft()
+        self._worker = RenderWorker(
+            self._running.render, CancellationToken(), self.refresh_rate
+        )
+        self._worker.signals.progress.connect(self.progress)
+        self._worker.signals.finished.connect(self._on_finished)
+        self._worker.signals.failed.connect(self._on_failed)
+        self._worker.signals.cancelled.connect(self._on_cancelled)
+        self.started.emit(self._running.name)
+        self.thread_pool.start(self._worker)
+
+    def _on_finished(self, result: object) -> None:
+        task = self._running
+        try:
+            if task.on_finished is not None:
+                task.on_finished(result)
+        finally:
+            self._start_next()
+
+    def _on_failed(self, error: Exception) -> None:
+        task = self._running
+        self._tasks.clear()
+        try:
+            if task.on_failed is not None:
+                task.on_failed(error)
+        finally:
+            self._start_next()
+
+    def _on_cancelled(self) -> None:
+        self._tasks.clear()
+        self._start_next()
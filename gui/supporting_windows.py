@@ -5,7 +5,7 @@ from .constructor import \
     get_speed_edit_widget, get_time_edit_widgets, \
     get_speed_edit_layout, get_time_edit_layout, \
     get_time_edit_widget, get_point_edit_layout, \
-    get_point_edit_widget
+    get_point_edit_widget, get_check_box
 from .my_async import MyAsyncDialogWindow
 from .qt_extensions import \
     MyDialogWindow, MyVideoWidget, \
@@ -24,6 +24,7 @@ class TrimDialogWindow(MyDialogWindow):
 
         self.start_edit, self.end_edit = \
             get_time_edit_widgets(self, current_time)
+        self.snap_check_box = get_check_box(self, "Snap to scene cuts")
 
         self._set_up_layouts(main_text, start_text, end_text)
 
@@ -40,12 +41,14 @@ class TrimDialogWindow(MyDialogWindow):
         main_layout.addWidget(main_text)
         main_layout.addLayout(start_layout)
         main_layout.addLayout(end_layout)
+        main_layout.addWidget(self.snap_check_box)
         main_layout.addWidget(self.choice_button)
 
         self.setLayout(main_layout)
 
-    def get_result(self) -> tuple[QTime, QTime]:
-        return self.start_edit.time(), self.end_edit.time()
+    def get_result(self) -> tuple[QTime, QTime, bool]:
+        return self.start_edit.time(), self.end_edit.time(), \
+            self.snap_check_box.isChecked()
 
 
 class SetSpeedDialogWindow(MyDialogWindow):
@@ -266,7 +269,7 @@ class CropDialogWindow(MyAsyncDialogWindow):
 
 def run_trim_dialog_window(
     current_time: int, main_text: str
-) -> tuple[QTime, QTime]:
+) -> tuple[QTime, QTime, bool]:
     window = TrimDialogWindow(current_time, main_text)
     return window.execute()
 
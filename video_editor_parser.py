@@ -1,10 +1,14 @@
 from VideoEditor.video_editor import \
     (merge_videos_and_save, trim_and_save_video, set_video_speed_and_save,
      overlay_video_on_another_and_save, insert_video_and_save,
-     cut_part_and_save_video, crop_and_save, TimeInterval, Point)
+     cut_part_and_save_video, crop_and_save, EditPipeline, TimeInterval, Point)
 from VideoEditor.utils import Usage, convert_time_to_seconds
-from gui.application import run_gui
+from VideoEditor.encoding_profile import PROFILES, get_profile
+from VideoEditor.batch import load_jobs, run_batch, print_result, print_summary
+from VideoEditor.metrics import MetricsRecorder, get_writer
+from VideoEditor.progress_bar import progress_events
 import argparse
+import time
 import sys
 
 
@@ -20,10 +24,21 @@ class Parser:
             "-o", dest="path_to_save", type=str,
             help="Path to save the result video"
         )
+        self.parser.add_argument(
+            "--profile", dest="profile", type=str, choices=PROFILES, default=None,
+            help="Encoding profile of the result video: draft (fast preview), "
+                 "balanced or archive (final export) (default: ffmpeg defaults)"
+        )
+        self.parser.add_argument(
+            "--metrics", dest="metrics_path", type=str, default=None,
+            help="Write the throughput of the renders (fps, realtime factor, bitrate, "
+                 "bytes written) and the summary of the operation to this file, "
+                 "in the Prometheus text format for .prom files and in JSON lines otherwise"
+        )
         self._create_subcommand_parsers()
 
     def _create_subcommand_parsers(self):
-        subparsers = self.parser.add_subparsers(required=True,
+        subparsers = self.parser.add_subparsers(required=True, dest='command',
                                                 help="Available commands for video processing")
         merge_parser = subparsers.add_parser(
             "merge",
@@ -41,14 +56,34 @@ class Parser:
         self._add_arguments_for_overlay_parser(overlay_parser)
         crop_parser = subparsers.add_parser('crop', help="Crop video")
         self._add_arguments_for_crop_parser(crop_parser)
+        pipeline_parser = subparsers.add_parser(
+            'pipeline', help="Apply several operations to the video with one rendering"
+        )
+        self._add_arguments_for_pipeline_parser(pipeline_parser)
+        batch_parser = subparsers.add_parser(
+            'batch', help="Run the jobs from JSON or JSON-lines file on a pool of processes"
+        )
+        self._add_arguments_for_batch_parser(batch_parser)
 
     def parse_args(self, args=None, namespace=None):
         parsed = self.parser.parse_args(args, namespace)
-        if ('gui' not in sys.argv[1:] and
+        if (getattr(parsed, 'need_paths', True) and
                 (parsed.path_to_save is None or parsed.videos is None)):
             raise ValueError('The following arguments are required: -v, -o')
+        parsed.profile = get_profile(parsed.profile) if parsed.profile is not None else None
+        if parsed.metrics_path is not None and parsed.command != 'batch':
+            parsed.func = self._with_metrics(parsed.func, parsed.command, parsed.metrics_path)
         return parsed
 
+    @staticmethod
+    def _with_metrics(func, operation: str, metrics_path: str):
+        def run_with_metrics(arg):
+            recorder = MetricsRecorder([get_writer(metrics_path)])
+            with progress_events.subscribed(recorder), recorder.operation(operation):
+                func(arg)
+
+        return run_with_metrics
+
     @staticmethod
     def _add_arguments_for_merge_parser(parser: argparse.ArgumentParser):
         def select_insert_or_merge(arg):
@@ -56,7 +91,10 @@ class Parser:
                 merge_videos_and_save(
                     arg.videos,
                     arg.path_to_save,
-                    mode=Usage.CONSOLE
+                    mode=Usage.CONSOLE,
+                    with_transitions=arg.with_transitions,
+                    is_dry_run=arg.is_dry_run,
+                    profile=arg.profile
                 )
             else:
                 insert_video_and_save(
@@ -64,7 +102,8 @@ class Parser:
                     arg.videos[1:],
                     convert_time_to_seconds(arg.start_time),
                     arg.path_to_save,
-                    mode=Usage.CONSOLE
+                    mode=Usage.CONSOLE,
+                    profile=arg.profile
                 )
 
         parser.add_argument(
@@ -72,17 +111,30 @@ class Parser:
             help="Start time of insertion into the first of all remaining ones in the format:"
                  " HH:MM:SS (default: video duration)"
         )
+        parser.add_argument('--transitions', dest='with_transitions', action='store_true',
+                            help='Add fade transitions between videos (the videos are always re-encoded)')
+        parser.add_argument('--dry-run', dest='is_dry_run', action='store_true',
+                            help='Print the chosen merge path and ffmpeg command without running it')
         parser.set_defaults(func=select_insert_or_merge)
 
     @staticmethod
     def _add_arguments_for_trim_parser(parser: argparse.ArgumentParser):
         def select_trim_or_cut(arg):
             func = trim_and_save_video if arg.is_core else cut_part_and_save_video
+            time_interval = TimeInterval(convert_time_to_seconds(arg.start_time),
+                                         convert_time_to_seconds(arg.end_time))
+            if arg.is_snapped:
+                # NumPy is loaded only when the cuts are needed
+                from VideoEditor.scene_index import SNAP_DISTANCE, snap_to_scenes
+                distance = SNAP_DISTANCE if arg.snap_distance is None else arg.snap_distance
+                time_interval = snap_to_scenes(arg.videos[0], time_interval, distance, arg.is_core)
+                print('Snapped to scene cuts: {}-{} s'.format(time_interval.begin, time_interval.end))
             func(
                 arg.videos[0],
-                TimeInterval(convert_time_to_seconds(arg.start_time), convert_time_to_seconds(arg.end_time)),
+                time_interval,
                 arg.path_to_save,
-                mode=Usage.CONSOLE
+                mode=Usage.CONSOLE,
+                profile=arg.profile
             )
 
         parser.add_argument(
@@ -97,6 +149,12 @@ class Parser:
                             help='Only the middle remains in the specified range')
         parser.add_argument('--c', dest='is_core', action='store_false',
                             help='Everything except the middle remains in the specified range')
+        parser.add_argument('--snap', dest='is_snapped', action='store_true',
+                            help='Move the start and the end to the nearest scene cuts, '
+                                 'the cuts are detected once and kept next to the video')
+        parser.add_argument('--snap-distance', dest='snap_distance', type=float, default=None,
+                            help='Maximum distance of a snapped boundary to the cut in seconds '
+                                 '(default: 2)')
         parser.set_defaults(func=select_trim_or_cut, is_core=True)
 
     @staticmethod
@@ -114,7 +172,8 @@ class Parser:
                 arg.speed,
                 arg.path_to_save,
                 time_interval=time_interval,
-                mode=Usage.CONSOLE)
+                mode=Usage.CONSOLE,
+                profile=arg.profile)
 
         parser.add_argument("-speed", dest="speed", type=float,
                             required=True, help="Speed of video")
@@ -130,7 +189,12 @@ class Parser:
 
     @staticmethod
     def _add_arguments_for_gui_parser(parser: argparse.ArgumentParser):
-        parser.set_defaults(func=lambda x: run_gui())
+        def run_gui_on_demand(arg):
+            # Qt and the GUI package are loaded only for this command
+            from gui.application import run_gui
+            run_gui()
+
+        parser.set_defaults(func=run_gui_on_demand, need_paths=False)
 
     @staticmethod
     def _add_arguments_for_overlay_parser(parser: argparse.ArgumentParser):
@@ -144,7 +208,8 @@ class Parser:
             x.path_to_save,
             x.shifts[0] if x.shifts is not None else None,
             x.shifts[1] if x.shifts is not None else None,
-            mode=Usage.CONSOLE
+            mode=Usage.CONSOLE,
+            profile=x.profile
         ))
 
     @staticmethod
@@ -160,5 +225,85 @@ class Parser:
             x.path_to_save,
             point1=Point((x.shifts[0], x.shifts[1])),
             point2=Point((x.shifts[0] + x.width, x.shifts[1] + x.height)),
-            mode=Usage.CONSOLE
+            mode=Usage.CONSOLE,
+            profile=x.profile
         ))
+
+    @staticmethod
+    def _add_arguments_for_pipeline_parser(parser: argparse.ArgumentParser):
+        def run_pipeline(arg):
+            pipeline = EditPipeline(arg.videos[0])
+            for operation in arg.operations:
+                Parser._add_operation_to_pipeline(pipeline, operation)
+            frame_filter = None
+            if arg.frame_filter is not None:
+                # NumPy and the process pool are loaded only for the frame filters
+                from VideoEditor.frame_filter import FrameFilter, load_function
+                frame_filter = FrameFilter(load_function(arg.frame_filter), arg.workers)
+            pipeline.save(arg.path_to_save, mode=Usage.CONSOLE, is_dry_run=arg.is_dry_run,
+                          chunks=arg.chunks, profile=arg.profile, frame_filter=frame_filter)
+
+        parser.add_argument(
+            '-op', dest='operations', type=str, nargs='+', action='append', required=True,
+            help="Operation in the order of application, one of: "
+                 "trim START END | speed SPEED | crop X Y WIDTH HEIGHT | "
+                 "overlay PATH X Y | merge PATH [PATH ...] (time in format HH:MM:SS)"
+        )
+        parser.add_argument('--dry-run', dest='is_dry_run', action='store_true',
+                            help='Print the ffmpeg command without running it')
+        parser.add_argument('--chunks', dest='chunks', type=int, default=None,
+                            help='Render in up to this number of chunks split at keyframes '
+                                 'in parallel ffmpeg processes')
+        parser.add_argument('--frame-filter', dest='frame_filter', type=str, default=None,
+                            help='Python function module:function applied to batches of RGB '
+                                 'frames (NumPy arrays) after all operations')
+        parser.add_argument('--workers', dest='workers', type=int, default=None,
+                            help='Number of processes running the frame filter '
+                                 '(default: number of CPUs)')
+        parser.set_defaults(func=run_pipeline)
+
+    @staticmethod
+    def _add_operation_to_pipeline(pipeline: EditPipeline, operation: list[str]):
+        name, values = operation[0], operation[1:]
+        expected_values_count = {'trim': 2, 'speed': 1, 'crop': 4, 'overlay': 3}
+        if name in expected_values_count and len(values) != expected_values_count[name] \
+                or name == 'merge' and len(values) == 0:
+            raise ValueError('Wrong number of values for pipeline operation: {}'
+                             .format(' '.join(operation)))
+        if name == 'trim':
+            pipeline.trim(TimeInterval(convert_time_to_seconds(values[0]),
+                                       convert_time_to_seconds(values[1])))
+        elif name == 'speed':
+            pipeline.set_speed(float(values[0]))
+        elif name == 'crop':
+            x, y, width, height = map(int, values)
+            pipeline.crop(Point((x, y)), Point((x + width, y + height)))
+        elif name == 'overlay':
+            pipeline.overlay(values[0], int(values[1]), int(values[2]))
+        elif name == 'merge':
+            pipeline.merge(values)
+        else:
+            raise ValueError('Unknown pipeline operation: {}'.format(name))
+
+    @staticmethod
+    def _add_arguments_for_batch_parser(parser: argparse.ArgumentParser):
+        def run_jobs(arg):
+            start = time.perf_counter()
+            jobs = load_jobs(arg.jobs_path)
+            if arg.profile is not None:
+                jobs = [{'profile': arg.profile, **job} for job in jobs]
+            results = run_batch(jobs, arg.workers, print_result, arg.metrics_path)
+            print_summary(results, time.perf_counter() - start)
+            if not all(result.is_success for result in results):
+                sys.exit(1)
+
+        parser.add_argument(
+            '-j', dest='jobs_path', type=str, required=True,
+            help='Path to JSON file with a list of jobs or JSON-lines file with a job on every line. '
+                 'Job is an object with "operation" (merge, insert, trim, cut, speed, overlay, crop) '
+                 'and the arguments of the operation function, "profile" is the name '
+                 'of the encoding profile (default: --profile)'
+        )
+        parser.add_argument('-w', dest='workers', type=int, default=None,
+                            help='Number of worker processes (default: number of CPUs)')
+        parser.set_defaults(func=run_jobs, need_paths=False)